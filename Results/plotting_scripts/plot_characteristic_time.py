@@ -1,110 +1,75 @@
 import numpy as np
-from scipy.integrate import odeint
 import matplotlib.pyplot as plt
 from matplotlib import cm
 from matplotlib.colors import Normalize
+import os, sys, inspect
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+parent2dir = os.path.dirname(parentdir)
+sys.path.insert(0, parent2dir)
+
+from trap_table import damage_traps
+from trap_evolution import saturation_time_maps
+from study_store import pack_study, load_study, select_cases, final_values, time_field
+from os.path import exists
 
 
 def get_data(dpa_values_traps, T_values_traps, dpa_values_inv, T_values_inv):
     # ##### trap saturation evaluation ##### #
 
-    k_B = 8.617333e-05
     fpy = 86400 * 365
     A_0 = 6.1838e-03
     E_A = 0.2792
-    n_0 = 0
-
-    t = np.geomspace(1e01, 1e09, int(1e04))
-
-    trap_densities = []
 
-    for T in T_values_traps:
-        traps_per_T = []
-        for dpa in dpa_values_traps:
-            phi = dpa / fpy
-
-            def numerical_trap_creation_model_trap_1(
-                n, t, phi=phi, A_0=A_0, E_A=E_A, T=T
-            ):
-                K = 1.5e28
-                n_max = 5.2e25
-                dndt = phi * K * (1 - (n / n_max)) - A_0 * np.exp(-E_A / (k_B * T)) * n
-                return dndt
-
-            trap_1 = odeint(
-                numerical_trap_creation_model_trap_1,
-                n_0,
-                t,
-            )
-            traps_per_T.append(trap_1)
-        trap_densities.append(traps_per_T)
-
-    normalised_traps = []
-    for T_case in trap_densities:
-        normalised_traps_per_T = []
-        for dpa_case in T_case:
-            norm_values = dpa_case / dpa_case[-1]
-            normalised_traps_per_T.append(norm_values)
-        normalised_traps.append(normalised_traps_per_T)
-
-    saturation_time_traps = []
-    for T_case in normalised_traps:
-        char_times_per_T = []
-        for dpa_case in T_case:
-            char_time = np.where(dpa_case > 0.99)
-            first = char_time[0][0]
-            char_times_per_T.append(t[first])
-        saturation_time_traps.append(char_times_per_T)
-
-    np.savetxt("saturation_times_traps.txt", saturation_time_traps)
-
-    inventories = []
-    inventories_steady = []
-    ts = []
+    saturation_time_maps(
+        T_values=T_values_traps,
+        phi_values=np.asarray(dpa_values_traps) / fpy,
+        traps=damage_traps,
+        threshold=0.99,
+        A_0=A_0,
+        E_A=E_A,
+        filename="saturation_times_trap_{}.txt",
+    )
 
     results_folder = "../parametric_studies/case_1e09s/"
     steady_results_folder = "../parametric_studies/case_steady/"
 
-    for T in T_values_inv:
-        invs_per_T = []
-        ts_per_T = []
-        steady_invs_per_T = []
-        for dpa in dpa_values_inv:
-            data_file = (
-                results_folder
-                + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, T)
-            )
-            steady_data_file = (
-                steady_results_folder
-                + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, T)
+    for folder in [results_folder, steady_results_folder]:
+        if not exists(folder + "store/"):
+            pack_study(
+                folder + "store/",
+                results_folder=folder,
+                dpa_values=dpa_values_inv,
+                T_values=T_values_inv,
             )
-            data = np.genfromtxt(data_file, delimiter=",", names=True)
-            steady_data = np.genfromtxt(steady_data_file, delimiter=",", names=True)
-            invs_per_T.append(data["Total_retention_volume_1"])
-            steady_invs_per_T.append(steady_data["Total_retention_volume_1"])
-            ts_per_T.append(data["ts"])
-        inventories.append(invs_per_T)
-        inventories_steady.append(steady_invs_per_T)
-        ts.append(ts_per_T)
-
-    normalised_inventories = []
-    for T_case, T_case_steady in zip(inventories, inventories_steady):
-        normalised_invs_per_T = []
-        for dpa_case, dpa_case_steady in zip(T_case, T_case_steady):
-            norm_values = dpa_case / dpa_case_steady
-            # norm_values = dpa_case / dpa_case[-1]
-            normalised_invs_per_T.append(norm_values)
-        normalised_inventories.append(normalised_invs_per_T)
-
-    characteristic_times = []
-    for T_case, T_t in zip(normalised_inventories, ts):
-        char_times_per_T = []
-        for dpa_case, t in zip(T_case, T_t):
-            char_time = np.where(dpa_case > 0.95)
-            # char_time = np.where(dpa_case > 0.99)
-            first = char_time[0][0]
-            char_times_per_T.append(t[first])
-        characteristic_times.append(char_times_per_T)
+    study = load_study(results_folder + "store/")
+    steady_study = load_study(steady_results_folder + "store/")
+
+    # (T, dpa, time step) arrays, nan padded
+    inventories = select_cases(
+        study, "Total_retention_volume_1", dpa_values_inv, T_values_inv
+    ).transpose(1, 0, 2)
+    ts = select_cases(study, time_field, dpa_values_inv, T_values_inv).transpose(
+        1, 0, 2
+    )
+    inventories_steady = final_values(
+        steady_study, "Total_retention_volume_1", dpa_values_inv, T_values_inv
+    ).T
+
+    normalised_inventories = inventories / inventories_steady[:, :, np.newaxis]
+    # normalised_inventories = inventories / inventories[:, :, -1:]
+
+    reached = normalised_inventories > 0.95
+    # reached = normalised_inventories > 0.99
+    first = np.argmax(reached, axis=-1)
+    characteristic_times = np.take_along_axis(ts, first[:, :, np.newaxis], axis=-1)
+    characteristic_times = characteristic_times[:, :, 0]
+    # nan for the cases that never reach the threshold (or were not run)
+    not_reached = ~reached.any(axis=-1)
+    characteristic_times[not_reached] = np.nan
+    if not_reached.any():
+        print("{} cases never reach the threshold".format(not_reached.sum()))
 
     np.savetxt("characteristic_times_invs.txt", characteristic_times)
 
@@ -123,7 +88,9 @@ T_values_inv = T_values_inv[:34]
 #     T_values_inv=T_values_inv,
 # )
 
-saturation_time_traps = np.loadtxt("../saturation_times_traps.txt")
+saturation_time_traps = np.loadtxt(
+    "../saturation_times_trap_{}.txt".format(damage_traps["name"][0])
+)
 characteristic_times = np.loadtxt("../characteristic_times_invs.txt")
 
 # ##### Plotting ##### #
@@ -3,58 +3,36 @@ import numpy as np
 from matplotlib import cm
 from matplotlib import ticker
 from matplotlib.colors import LogNorm, Normalize
+from os.path import exists
+import os, sys, inspect
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+parent2dir = os.path.dirname(parentdir)
+sys.path.insert(0, parent2dir)
+
+from study_store import pack_study, load_study, final_values
 
 
 def retrive_data_and_save(dpa_values, dpa_values_paper, T_values, T_values_paper):
     results_folder = "../parametric_studies/case_24h/"
 
-    # inventories = []
-    # for dpa in dpa_values:
-    #     invs_per_dpa = []
-    #     for T in T_values:
-    #         data_file = (
-    #             results_folder
-    #             + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, T)
-    #         )
-    #         data = np.genfromtxt(data_file, delimiter=",", names=True)
-    #         invs_per_dpa.append(data["Total_retention_volume_1"][-1])
-    #     inventories.append(invs_per_dpa)
-
-    # reference_inventories = []
-    # for T in T_values:
-    #     no_damage_results_file = (
-    #         results_folder + "dpa=0/T={:.0f}/derived_quantities.csv".format(T)
-    #     )
-    #     no_damage_data = np.genfromtxt(
-    #         no_damage_results_file, delimiter=",", names=True
-    #     )
-    #     reference_inventories.append(no_damage_data["Total_retention_volume_1"][-1])
-
-    # reference_inventories = reference_inventories
-
-    # normalised_inventories = []
-    # inventories = np.array(inventories)
-    # for inv in inventories:
-    #     normalised_inv = inv / np.array(reference_inventories)
-    #     normalised_inventories.append(normalised_inv)
-
-    # np.savetxt("reference_inventories_24h", reference_inventories)
-    # np.savetxt("normalised_inventories_24h", normalised_inventories)
-    # np.savetxt("inventories_24h", inventories)
-
-    inventories_paper = []
-    for dpa in dpa_values_paper:
-        invs_per_dpa = []
-        for T in T_values_paper:
-            data_file = (
-                results_folder
-                + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, T)
-            )
-            data = np.genfromtxt(data_file, delimiter=",", names=True)
-            invs_per_dpa.append(data["Total_retention_volume_1"][-1])
-        inventories_paper.append(invs_per_dpa)
-
-    inventories_paper = np.array(inventories_paper)
+    store_folder = results_folder + "store/"
+    if not exists(store_folder):
+        pack_study(
+            store_folder,
+            results_folder=results_folder,
+            dpa_values=dpa_values_paper,
+            T_values=T_values_paper,
+        )
+    study = load_study(store_folder)
+
+    inventories_paper = final_values(
+        study,
+        "Total_retention_volume_1",
+        dpa_values=dpa_values_paper,
+        T_values=T_values_paper,
+    )
 
     np.savetxt("inventories_24h_paper", inventories_paper)
 
@@ -27,6 +27,7 @@ from analytical_model import (
     dpa_range,
     dpa_range_contour,
     analytical_model,
+    analytical_reference_inventories,
     fpy,
 )
 
@@ -60,21 +61,16 @@ for dpa in dpa_range:
         inventories_no_damage.append(H_retention_no_damage)
     inventories.append(inventory_per_dpa)
 
+# computed once, not for every dpa
+inventories_no_damage_contour = analytical_reference_inventories(T_range_contour)
 for dpa in dpa_range_contour:
     phi = dpa / fpy
     inventory_contour_per_dpa = []
-    inventories_no_damage_contour = []
     for T in T_range_contour:
         (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
             phi=phi, T=T
         )
-        (
-            H_retention_no_damage,
-            trap_densities_no_damage,
-            trap_filling_ratios_no_damage,
-        ) = analytical_model(phi=0, T=T)
         inventory_contour_per_dpa.append(H_retention)
-        inventories_no_damage_contour.append(H_retention_no_damage)
     inventories_contour.append(inventory_contour_per_dpa)
 
 for inv in inventories_standard_temp:
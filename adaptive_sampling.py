@@ -0,0 +1,345 @@
+from os.path import exists
+
+import numpy as np
+
+from analytical_model import analytical_model_vectorised, fpy
+
+
+def analytical_log_inventories(dpa_values, T_values):
+    """
+    log10 of the steady state retention of analytical_model on a (dpa, T)
+    grid
+
+    Args:
+        dpa_values (array_like): damage rates (dpa fpy-1)
+        T_values (array_like): temperatures (K)
+
+    Returns:
+        numpy.ndarray: the log10 inventories, shape (n_dpa, n_T)
+    """
+    phi = np.asarray(dpa_values, dtype=float)[:, np.newaxis] / fpy
+    retention, _, _ = analytical_model_vectorised(phi=phi, T=T_values)
+
+    return np.log10(retention)
+
+
+def case_log_inventory(case, field="Total_retention_volume_1"):
+    """
+    log10 of the last value of a derived quantity of a festim_sim case
+
+    Args:
+        case (dict): the festim_sim keyword arguments
+        field (str, optional): the derived quantity. Defaults to
+            "Total_retention_volume_1"
+
+    Returns:
+        float: the log10 value, nan if the case has no results
+    """
+    data_file = case["results_folder_name"] + "derived_quantities.csv"
+    if not exists(data_file):
+        return np.nan
+    data = np.genfromtxt(data_file, delimiter=",", names=True)
+    value = np.atleast_1d(data[field])[-1]
+    if not value > 0:
+        return np.nan
+    return np.log10(value)
+
+
+def coarse_indices(n, spacing):
+    """Every spacing-th index of n values, the last one included"""
+    return np.unique(np.append(np.arange(0, n, spacing), n - 1))
+
+
+def _split(start, end):
+    """Splits an index interval in two, or not at all if it can't be split"""
+    if end - start < 2:
+        return [(start, end)]
+    middle = (start + end) // 2
+    return [(start, middle), (middle, end)]
+
+
+def _corners(cell):
+    i0, i1, j0, j1 = cell
+    return [(i0, j0), (i0, j1), (i1, j0), (i1, j1)]
+
+
+def _bilinear(corner_values, i0, i1, j0, j1):
+    """Bilinear interpolation in index space of the 4 corner values of a
+    cell, ordered as in _corners, on the grid points of the cell"""
+    u = (np.arange(i0, i1 + 1) - i0) / max(i1 - i0, 1)
+    v = (np.arange(j0, j1 + 1) - j0) / max(j1 - j0, 1)
+    u, v = u[:, np.newaxis], v[np.newaxis, :]
+    f00, f01, f10, f11 = corner_values
+    return f00 * (1 - u) * (1 - v) + f01 * (1 - u) * v + f10 * u * (1 - v) + f11 * u * v
+
+
+def _prior_error(cell, prior):
+    """Error of the bilinear interpolation of the prior inside a cell"""
+    i0, i1, j0, j1 = cell
+    prior_corners = [prior[corner] for corner in _corners(cell)]
+    return np.abs(
+        prior[i0 : i1 + 1, j0 : j1 + 1] - _bilinear(prior_corners, *cell)
+    ).max()
+
+
+def _surplus(cell, values, prior):
+    """Largest difference between the residuals values - prior computed
+    inside a cell and their bilinear interpolation from its corners"""
+    i0, i1, j0, j1 = cell
+    residuals = values[i0 : i1 + 1, j0 : j1 + 1] - prior[i0 : i1 + 1, j0 : j1 + 1]
+    corner_residuals = [values[corner] - prior[corner] for corner in _corners(cell)]
+    surplus = np.abs(residuals - _bilinear(corner_residuals, *cell))
+    if np.all(np.isnan(surplus)):
+        return 0
+    return np.nanmax(surplus)
+
+
+def cell_error(cell, values, prior, parent=None):
+    """
+    Error indicator of the reconstruction of a cell (see reconstruct).
+
+    For a cell of the coarse subgrid, it is the spread of the residual
+    values - prior over its corners. For a cell split from a parent, it is
+    the hierarchical surplus of the parent: the error, at the points
+    computed when the parent was split, of the reconstruction from the
+    parent's corners. In both cases, it is at least the error of the
+    bilinear interpolation of the prior inside the cell, which reveals the
+    variations of the inventory that the corners miss.
+
+    Args:
+        cell (tuple): (i0, i1, j0, j1) grid indices of the cell
+        values (numpy.ndarray): log10 inventories, known at the corners
+        prior (numpy.ndarray): log10 inventories of the prior on the grid
+        parent (tuple, optional): the cell split into cell. Defaults to None
+
+    Returns:
+        float: the indicator (decades), nan if a corner has no value
+    """
+    residuals = [values[corner] - prior[corner] for corner in _corners(cell)]
+    if np.any(np.isnan(residuals)):
+        return np.nan
+    if parent is None:
+        error = np.ptp(residuals)
+    else:
+        error = _surplus(parent, values, prior)
+
+    return max(error, _prior_error(cell, prior))
+
+
+def reconstruct(values, cells, prior):
+    """
+    log10 inventories on the whole grid: the prior plus the bilinear
+    interpolation of the residual values - prior in each cell
+
+    Args:
+        values (numpy.ndarray): log10 inventories, nan where not computed
+        cells (list): the (i0, i1, j0, j1) cells covering the grid
+        prior (numpy.ndarray): log10 inventories of the prior on the grid
+
+    Returns:
+        numpy.ndarray: the reconstructed log10 inventories
+    """
+    reconstruction = np.full_like(prior, np.nan)
+    # the finer cells overwrite the edges they share with coarser ones
+    for cell in sorted(cells, key=lambda c: -(c[1] - c[0]) * (c[3] - c[2])):
+        i0, i1, j0, j1 = cell
+        residuals = [values[corner] - prior[corner] for corner in _corners(cell)]
+        reconstruction[i0 : i1 + 1, j0 : j1 + 1] = prior[
+            i0 : i1 + 1, j0 : j1 + 1
+        ] + _bilinear(residuals, *cell)
+
+    computed = ~np.isnan(values)
+    reconstruction[computed] = values[computed]
+    return reconstruction
+
+
+def adaptive_study(
+    dpa_values,
+    T_values,
+    make_case,
+    run_cases,
+    tolerance=0.05,
+    initial_spacing=8,
+    case_value=case_log_inventory,
+    analytical_prior=True,
+):
+    """
+    Samples the inventory map of a (dpa, T) grid adaptively. The cases of a
+    coarse subgrid (every initial_spacing-th value) are run first, then
+    every cell whose error indicator (see cell_error) exceeds tolerance is
+    split in four and the new corners are run, until no cell needs to be
+    split. The inventory is reconstructed from the analytical model, so the
+    cases concentrate where the inventory departs from it in a way that the
+    interpolation doesn't capture. Without analytical_prior, the inventory
+    is interpolated and the cases concentrate where it changes fastest. The
+    cases are always points of the (dpa, T) grid, so that the case folders
+    and study stores are the same as for the full grid, and the inventories
+    of the other points are reconstructed (see reconstruct).
+
+    Args:
+        dpa_values (array_like): damage rates of the grid (dpa fpy-1),
+            geometrically spaced
+        T_values (array_like): temperatures of the grid (K), linearly spaced
+        make_case (callable): make_case(dpa, T) returns the festim_sim
+            keyword arguments of a case
+        run_cases (callable): runs a list of cases, e.g.
+            lambda cases: run_study(cases, manifest_file="manifest.json")
+        tolerance (float, optional): maximum error indicator of a cell
+            (decades of inventory). Defaults to 0.05
+        initial_spacing (int, optional): spacing of the coarse subgrid (grid
+            points). Defaults to 8
+        case_value (callable, optional): log10 inventory of a case that has
+            been run. Defaults to case_log_inventory
+        analytical_prior (bool, optional): use analytical_model as prior,
+            e.g. disabled for maps far from the steady state. Defaults to
+            True
+
+    Returns:
+        dict: the log10 inventories of the grid ("log_inventories"), the
+            cases that were run ("sampled", boolean (n_dpa, n_T)) and the
+            final cells
+    """
+    dpa_values = np.asarray(dpa_values, dtype=float)
+    T_values = np.asarray(T_values, dtype=float)
+    if analytical_prior:
+        prior = analytical_log_inventories(dpa_values, T_values)
+    else:
+        prior = np.zeros((len(dpa_values), len(T_values)))
+    values = np.full(prior.shape, np.nan)
+    sampled = np.zeros(prior.shape, dtype=bool)
+
+    rows = coarse_indices(len(dpa_values), initial_spacing)
+    columns = coarse_indices(len(T_values), initial_spacing)
+    # (cell, parent) pairs to check, and cells that needn't be split
+    final_cells = []
+    cells = [
+        ((i0, i1, j0, j1), None)
+        for i0, i1 in zip(rows[:-1], rows[1:])
+        for j0, j1 in zip(columns[:-1], columns[1:])
+    ]
+    new_points = [(i, j) for i in rows for j in columns]
+
+    while len(new_points) > 0:
+        cases = [make_case(dpa_values[i], T_values[j]) for i, j in new_points]
+        print("Running {} cases".format(len(cases)))
+        run_cases(cases)
+        for (i, j), case in zip(new_points, cases):
+            values[i, j] = case_value(case)
+            sampled[i, j] = True
+
+        refined_cells = []
+        new_points = set()
+        for cell, parent in cells:
+            i0, i1, j0, j1 = cell
+            splittable = i1 - i0 > 1 or j1 - j0 > 1
+            # cells with a failed corner are not refined
+            if not (splittable and cell_error(cell, values, prior, parent) > tolerance):
+                final_cells.append(cell)
+                continue
+            for rows_ in _split(i0, i1):
+                for columns_ in _split(j0, j1):
+                    child = rows_ + columns_
+                    refined_cells.append((child, cell))
+                    new_points.update(
+                        corner for corner in _corners(child) if not sampled[corner]
+                    )
+        cells = refined_cells
+        new_points = sorted(new_points)
+
+    print(
+        "{} cases run out of {} ({:.0%})".format(
+            sampled.sum(), sampled.size, sampled.mean()
+        )
+    )
+
+    return {
+        "log_inventories": reconstruct(values, final_cells, prior),
+        "sampled": sampled,
+        "cells": final_cells,
+    }
+
+
+def hybrid_study(
+    dpa_values,
+    T_values,
+    make_case,
+    run_cases,
+    threshold=0.05,
+    calibration_spacing=8,
+    case_value=case_log_inventory,
+):
+    """
+    Steady state inventory map of a (dpa, T) grid from analytical_model
+    where it is accurate enough, and from festim_sim elsewhere. The cases
+    of a coarse calibration subgrid (every calibration_spacing-th value) are
+    run first. The discrepancy log10(festim) - log10(analytical) of each
+    other point is estimated as the largest one at the corners of its
+    calibration cell, and the point is run only if it exceeds threshold.
+
+    Args:
+        dpa_values (array_like): damage rates of the grid (dpa fpy-1)
+        T_values (array_like): temperatures of the grid (K)
+        make_case (callable): make_case(dpa, T) returns the festim_sim
+            keyword arguments of a case, with transient_run=False
+        run_cases (callable): runs a list of cases, e.g.
+            study_runner.run_continuation
+        threshold (float, optional): maximum estimated discrepancy of the
+            analytical points (decades of inventory). Defaults to 0.05
+        calibration_spacing (int, optional): spacing of the calibration
+            subgrid (grid points). Defaults to 8
+        case_value (callable, optional): log10 inventory of a case that has
+            been run. Defaults to case_log_inventory
+
+    Returns:
+        dict: the log10 inventories of the grid ("log_inventories"), the
+            method of each point ("method", "festim", "analytical" or
+            "failed" for festim cases without results) and the estimated
+            discrepancy of each point ("discrepancy", the actual one for
+            the festim points)
+    """
+    dpa_values = np.asarray(dpa_values, dtype=float)
+    T_values = np.asarray(T_values, dtype=float)
+    analytical = analytical_log_inventories(dpa_values, T_values)
+    values = np.full(analytical.shape, np.nan)
+
+    def run(points):
+        cases = [make_case(dpa_values[i], T_values[j]) for i, j in points]
+        print("Running {} cases".format(len(cases)))
+        run_cases(cases)
+        for (i, j), case in zip(points, cases):
+            values[i, j] = case_value(case)
+
+    rows = coarse_indices(len(dpa_values), calibration_spacing)
+    columns = coarse_indices(len(T_values), calibration_spacing)
+    run([(i, j) for i in rows for j in columns])
+
+    # largest discrepancy at the corners of the calibration cell of each
+    # point, a failed corner making the whole cell uncertain
+    calibration = np.abs(values - analytical)[np.ix_(rows, columns)]
+    calibration[np.isnan(calibration)] = np.inf
+    discrepancy = np.zeros(analytical.shape)
+    for a, (i0, i1) in enumerate(zip(rows[:-1], rows[1:])):
+        for b, (j0, j1) in enumerate(zip(columns[:-1], columns[1:])):
+            cell = discrepancy[i0 : i1 + 1, j0 : j1 + 1]
+            np.maximum(cell, calibration[a : a + 2, b : b + 2].max(), out=cell)
+
+    computed = np.zeros(analytical.shape, dtype=bool)
+    computed[np.ix_(rows, columns)] = True
+    to_run = ~computed & (discrepancy > threshold)
+    run([tuple(point) for point in np.argwhere(to_run)])
+    computed |= to_run
+
+    method = np.where(computed, "festim", "analytical")
+    method[computed & np.isnan(values)] = "failed"
+    discrepancy[computed] = np.abs(values - analytical)[computed]
+    print(
+        "{} festim cases, {} analytical points".format(
+            computed.sum(), (~computed).sum()
+        )
+    )
+
+    return {
+        "log_inventories": np.where(computed, values, analytical),
+        "method": method,
+        "discrepancy": discrepancy,
+    }
@@ -1,4 +1,5 @@
 import numpy as np
+from trap_table import damage_traps
 
 # ##### test ranges ##### #
 
@@ -27,6 +28,12 @@ E_A = 0.28
 k_0 = 5.22e-17
 p_0 = 1e13
 trap_1_density = 2e22
+trap_1_E_p = 0.87
+
+# damage trap parameters
+damage_trap_K = damage_traps["K"]
+damage_trap_n_max = damage_traps["n_max"]
+damage_trap_E_p = damage_traps["E_p"]
 
 
 def trap_density(T, phi, K, n_max, A_0, E_A):
@@ -123,92 +130,140 @@ def retention(c_m, c_t, L):
 
 
 def analytical_model(phi=9 / fpy, T=700, L=0.002):
-    trap_d1_density = trap_density(
-        T=T, phi=phi, K=1.5e28, n_max=5.2e25, A_0=A_0, E_A=E_A
-    )
-    trap_d2_density = trap_density(
-        T=T, phi=phi, K=4.0e27, n_max=4.5e25, A_0=A_0, E_A=E_A
-    )
-    trap_d3_density = trap_density(
-        T=T, phi=phi, K=3.0e27, n_max=4.0e25, A_0=A_0, E_A=E_A
+    """
+    Evaluates the steady state retention, trap densities and trap filling
+    ratios for a single damage rate and temperature. See
+    analytical_model_vectorised for grids of values.
+
+    Args:
+        phi (float, int): damage rate (dpa s-1)
+        T (float, int): temperature (K)
+        L (float, int): Length of material (m)
+
+    return:
+        total_retention (float): total retention of H (m-2)
+        trap_densities (list): trap densities (m-3), intrinsic trap first
+        trap_filling_ratios (list): filling ratios of each trap
+    """
+    (
+        total_retention,
+        trap_densities,
+        trap_filling_ratios,
+    ) = analytical_model_vectorised(phi=phi, T=T, L=L)
+
+    return (
+        total_retention.tolist(),
+        trap_densities.tolist(),
+        trap_filling_ratios.tolist(),
     )
-    trap_d4_density = trap_density(
-        T=T, phi=phi, K=9.0e27, n_max=4.2e25, A_0=A_0, E_A=E_A
+
+
+def analytical_model_vectorised(
+    phi=9 / fpy,
+    T=700,
+    L=0.002,
+    K=damage_trap_K,
+    n_max=damage_trap_n_max,
+    E_p=damage_trap_E_p,
+):
+    """
+    Broadcasting version of analytical_model. phi, T and L can be arrays of
+    any mutually broadcastable shapes, the resulting grid shape being the
+    broadcast shape of the three. The damage trap parameters K, n_max and E_p
+    are 1D arrays with one value per damage trap.
+
+    Args:
+        phi (float, array_like): damage rate (dpa s-1)
+        T (float, array_like): temperature (K)
+        L (float, array_like): Length of material (m)
+        K (array_like): trap creation factors of damage traps (m-3 dpa-1)
+        n_max (array_like): maximum densities of damage traps (m-3)
+        E_p (array_like): detrapping activation energies of damage traps (eV)
+
+    return:
+        total_retention (numpy.ndarray): total retention of H (m-2), shape
+            (*grid)
+        trap_densities (numpy.ndarray): trap densities (m-3), shape
+            (n_traps, *grid), intrinsic trap first
+        trap_filling_ratios (numpy.ndarray): filling ratios of each trap, shape
+            (n_traps, *grid)
+    """
+    phi, T, L = np.broadcast_arrays(
+        np.asarray(phi, dtype=float),
+        np.asarray(T, dtype=float),
+        np.asarray(L, dtype=float),
     )
+    # add a leading trap axis to the damage trap parameters
+    trap_axis = (slice(None),) + (np.newaxis,) * T.ndim
+    K = np.asarray(K, dtype=float)[trap_axis]
+    n_max = np.asarray(n_max, dtype=float)[trap_axis]
+    E_p = np.asarray(E_p, dtype=float)[trap_axis]
+
+    # phi = 0 gives A / 0 = inf and thus a trap density of 0
+    A = A_0 * np.exp(-E_A / k_B / T)
+    with np.errstate(divide="ignore"):
+        damage_trap_densities = 1 / (A / (phi * K) + (1 / n_max))
 
     c_m = mobile_H_concentration(T=T, imp_flux=imp_flux, r_p=r_p, D_0=D_0, E_D=E_D)
 
     c_t_1, filling_ratio_1 = trapped_H_concentration(
-        c_m=c_m, k_0=k_0, E_k=E_D, p_0=p_0, E_p=0.87, n_i=trap_1_density, T=T
+        c_m=c_m, k_0=k_0, E_k=E_D, p_0=p_0, E_p=trap_1_E_p, n_i=trap_1_density, T=T
     )
-    c_t_d1, filling_ratio_d1 = trapped_H_concentration(
+    c_t_damage, filling_ratios_damage = trapped_H_concentration(
         c_m=c_m,
         k_0=k_0,
         E_k=E_D,
         p_0=p_0,
-        E_p=1.15,
+        E_p=E_p,
         A_0=A_0,
         E_A=E_A,
-        n_i=trap_d1_density,
+        n_i=damage_trap_densities,
         T=T,
     )
-    c_t_d2, filling_ratio_d2 = trapped_H_concentration(
-        c_m=c_m,
-        k_0=k_0,
-        E_k=E_D,
-        p_0=p_0,
-        E_p=1.35,
-        A_0=A_0,
-        E_A=E_A,
-        n_i=trap_d2_density,
-        T=T,
-    )
-    c_t_d3, filling_ratio_d3 = trapped_H_concentration(
-        c_m=c_m,
-        k_0=k_0,
-        E_k=E_D,
-        p_0=p_0,
-        E_p=1.65,
-        A_0=A_0,
-        E_A=E_A,
-        n_i=trap_d3_density,
-        T=T,
+
+    trap_densities = np.concatenate(
+        [np.full((1,) + T.shape, trap_1_density), damage_trap_densities]
     )
-    c_t_d4, filling_ratio_d4 = trapped_H_concentration(
-        c_m=c_m,
-        k_0=k_0,
-        E_k=E_D,
-        p_0=p_0,
-        E_p=1.85,
-        A_0=A_0,
-        E_A=E_A,
-        n_i=trap_d4_density,
-        T=T,
+    trap_filling_ratios = np.concatenate(
+        [filling_ratio_1[np.newaxis], filling_ratios_damage]
     )
 
-    trap_densities = [
-        trap_1_density,
-        trap_d1_density,
-        trap_d2_density,
-        trap_d3_density,
-        trap_d4_density,
-    ]
-
-    trap_filling_ratios = [
-        filling_ratio_1,
-        filling_ratio_d1,
-        filling_ratio_d2,
-        filling_ratio_d3,
-        filling_ratio_d4,
-    ]
-
-    total_trapped_H_concentration = c_t_1 + c_t_d1 + c_t_d2 + c_t_d3 + c_t_d4
+    total_trapped_H_concentration = c_t_1 + c_t_damage.sum(axis=0)
 
     total_retention = retention(c_m=c_m, c_t=total_trapped_H_concentration, L=L)
 
     return (total_retention, trap_densities, trap_filling_ratios)
 
 
+# undamaged retentions already computed in this process, see
+# analytical_reference_inventories
+analytical_references = {}
+
+
+def analytical_reference_inventories(T_values, L=0.002):
+    """
+    Steady state retention of analytical_model without damage, computed once
+    per temperature in a process and shared by all the normalisations
+
+    Args:
+        T_values (array_like): temperatures (K)
+        L (float, optional): length of the material (m). Defaults to 0.002
+
+    Returns:
+        numpy.ndarray: the retentions (m-2)
+    """
+    T_values = np.atleast_1d(np.asarray(T_values, dtype=float))
+    missing = sorted(
+        set(T for T in T_values.tolist() if (T, L) not in analytical_references)
+    )
+    if len(missing) > 0:
+        retentions, _, _ = analytical_model_vectorised(phi=0, T=missing, L=L)
+        for T, retention in zip(missing, retentions):
+            analytical_references[(T, L)] = float(retention)
+
+    return np.array([analytical_references[(T, L)] for T in T_values.tolist()])
+
+
 def de_trapping_rate(E_p, T):
     v_dt = p_0 * np.exp(-E_p / k_B / T)
 
@@ -225,33 +280,15 @@ def annealing_rate(T):
 
 
 def compare_annealing_and_detrapping(T_range):
-    trap_1_detrapping_rates = []
-    trap_d1_detrapping_rates = []
-    trap_d2_detrapping_rates = []
-    trap_d3_detrapping_rates = []
-    trap_d4_detrapping_rates = []
-    annealing_rates = []
-    for T in T_range:
-        trap_1_detrapping = de_trapping_rate(E_p=1.00, T=T)
-        trap_d1_detrapping = de_trapping_rate(E_p=1.15, T=T)
-        trap_d2_detrapping = de_trapping_rate(E_p=1.35, T=T)
-        trap_d3_detrapping = de_trapping_rate(E_p=1.65, T=T)
-        trap_d4_detrapping = de_trapping_rate(E_p=1.85, T=T)
-        annealing = annealing_rate(T=T)
-
-        trap_1_detrapping_rates.append(trap_1_detrapping)
-        trap_d1_detrapping_rates.append(trap_d1_detrapping)
-        trap_d2_detrapping_rates.append(trap_d2_detrapping)
-        trap_d3_detrapping_rates.append(trap_d3_detrapping)
-        trap_d4_detrapping_rates.append(trap_d4_detrapping)
-        annealing_rates.append(annealing)
+    trap_1_detrapping_rates = de_trapping_rate(E_p=1.00, T=np.asarray(T_range))
+    damage_traps_detrapping_rates = de_trapping_rate(
+        E_p=damage_trap_E_p[:, np.newaxis], T=np.asarray(T_range)
+    )
+    annealing_rates = annealing_rate(T=np.asarray(T_range))
 
     return (
         trap_1_detrapping_rates,
-        trap_d1_detrapping_rates,
-        trap_d2_detrapping_rates,
-        trap_d3_detrapping_rates,
-        trap_d4_detrapping_rates,
+        *damage_traps_detrapping_rates,
         annealing_rates,
     )
 
@@ -259,7 +296,7 @@ def compare_annealing_and_detrapping(T_range):
 def filling_ratio_evaluation(T_range):
     filling_ratios = []
     for T in T_range:
-        (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
+        H_retention, trap_densities, trap_filling_ratios = analytical_model(
             phi=10 / fpy, T=T
         )
         filling_ratios.append(trap_filling_ratios)
@@ -286,66 +323,28 @@ def filling_ratio_evaluation(T_range):
 def inventory_variation_with_damage_and_temperature(
     T_range, dpa_range, T_range_contour, dpa_range_contour
 ):
-    inventories = []
-    inventories_no_damage = []
-    inventories_normalised = []
-    inventories_standard_temp = []
-    inventories_standard_temp_normalised = []
-    inventories_contour = []
-    inventories_no_damage_contour = []
-    inventories_normalised_contour = []
+    phi_range = np.asarray(dpa_range)[:, np.newaxis] / fpy
+    phi_range_contour = np.asarray(dpa_range_contour)[:, np.newaxis] / fpy
 
-    for dpa in dpa_range:
-        phi = dpa / fpy
-        (
-            H_retention_standard_temp,
-            trap_densities_standard_temp,
-            trap_filling_ratios_standard_temp,
-        ) = analytical_model(phi=phi, T=700)
-        inventory_per_dpa = []
-        inventories_no_damage = []
-        inventories_standard_temp.append(H_retention_standard_temp)
-        for T in T_range:
-            (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
-                phi=phi, T=T
-            )
-            (
-                H_retention_no_damage,
-                trap_densities_no_damage,
-                trap_filling_ratios_no_damage,
-            ) = analytical_model(phi=phi, T=T)
-            inventory_per_dpa.append(H_retention)
-            inventories_no_damage.append(H_retention_no_damage)
-        inventories.append(inventory_per_dpa)
-
-    for dpa in dpa_range_contour:
-        phi = dpa / fpy
-        inventory_contour_per_dpa = []
-        inventories_no_damage_contour = []
-        for T in T_range_contour:
-            (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
-                phi=phi, T=T
-            )
-            (
-                H_retention_no_damage,
-                trap_densities_no_damage,
-                trap_filling_ratios_no_damage,
-            ) = analytical_model(phi=0, T=T)
-            inventory_contour_per_dpa.append(H_retention)
-            inventories_no_damage_contour.append(H_retention_no_damage)
-        inventories_contour.append(inventory_contour_per_dpa)
-
-    for inv in inventories:
-        normalised_values = np.array(inv) / np.array(inventories[0])
-        inventories_normalised.append(normalised_values)
-
-    for inv in inventories_standard_temp:
-        normalised_values = np.array(inv) / np.array(inventories_standard_temp[0])
-        inventories_standard_temp_normalised.append(normalised_values)
-
-    for case in inventories_contour:
-        inventory = case / np.array(inventories_no_damage_contour)
-        inventories_normalised_contour.append(inventory)
+    inventories, _, _ = analytical_model_vectorised(phi=phi_range, T=T_range)
+    inventories_standard_temp, _, _ = analytical_model_vectorised(
+        phi=phi_range[:, 0], T=700
+    )
+    # kept from the loop based version, which returned the values of the
+    # last dpa case
+    inventories_no_damage = inventories[-1]
+
+    inventories_contour, _, _ = analytical_model_vectorised(
+        phi=phi_range_contour, T=T_range_contour
+    )
+    # shared with the other normalisations
+    inventories_no_damage_contour = analytical_reference_inventories(T_range_contour)
+
+    inventories_normalised = inventories / inventories[0]
+    inventories_standard_temp_normalised = (
+        inventories_standard_temp / inventories_standard_temp[0]
+    )
+    inventories_normalised_contour = inventories_contour / inventories_no_damage_contour
 
     return (
         inventories,
@@ -367,47 +366,29 @@ def trap_density_variation_with_damage_and_temperature(
     trap_d4_densities = []
     trap_densities_by_T = []
     trap_densities_by_dpa = []
-    trap_d1_densities_contour = []
-    trap_d2_densities_contour = []
-    trap_d3_densities_contour = []
-    trap_d4_densities_contour = []
 
     for T in T_range:
-        (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
+        H_retention, trap_densities, trap_filling_ratios = analytical_model(
             phi=10 / fpy, T=T
         )
         trap_densities_by_T.append(trap_densities)
 
     for dpa in dpa_range:
         phi = dpa / fpy
-        (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
+        H_retention, trap_densities, trap_filling_ratios = analytical_model(
             phi=phi, T=700
         )
         trap_densities_by_dpa.append(trap_densities)
 
-    for dpa in dpa_range_contour:
-        phi = dpa / fpy
-        trap_d1_densities_per_dpa = []
-        trap_d2_densities_per_dpa = []
-        trap_d3_densities_per_dpa = []
-        trap_d4_densities_per_dpa = []
-        for T in T_range_contour:
-            (H_retention, trap_densities, trap_filling_ratios) = analytical_model(
-                phi=phi, T=T
-            )
-            trap_d1_densities_per_dpa.append(trap_densities[1])
-            trap_d2_densities_per_dpa.append(trap_densities[2])
-            trap_d3_densities_per_dpa.append(trap_densities[3])
-            trap_d4_densities_per_dpa.append(trap_densities[4])
-        trap_d1_densities_contour.append(trap_d1_densities_per_dpa)
-        trap_d2_densities_contour.append(trap_d2_densities_per_dpa)
-        trap_d3_densities_contour.append(trap_d3_densities_per_dpa)
-        trap_d4_densities_contour.append(trap_d4_densities_per_dpa)
-
-    trap_d1_densities_contour = np.array(trap_d1_densities_contour)
-    trap_d2_densities_contour = np.array(trap_d2_densities_contour)
-    trap_d3_densities_contour = np.array(trap_d3_densities_contour)
-    trap_d4_densities_contour = np.array(trap_d4_densities_contour)
+    _, trap_densities_contour, _ = analytical_model_vectorised(
+        phi=np.asarray(dpa_range_contour)[:, np.newaxis] / fpy, T=T_range_contour
+    )
+    (
+        trap_d1_densities_contour,
+        trap_d2_densities_contour,
+        trap_d3_densities_contour,
+        trap_d4_densities_contour,
+    ) = trap_densities_contour[1:]
 
     trap_d1_densities_contour_normalised = (
         trap_d1_densities_contour / trap_d1_densities_contour[-1]
@@ -0,0 +1,481 @@
+"""
+Benchmarks of the analytical, ODE, mesh and FEM paths of the repository.
+
+Run the suite and append the timings to the history:
+
+    python benchmarks/benchmarks.py run
+
+Compare the last two runs of the history, flagging regressions:
+
+    python benchmarks/benchmarks.py compare
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+default_history_file = os.path.join(currentdir, "history.json")
+
+# name: (function returning the callable to time, number of repeats, True if
+# the function takes a temporary folder)
+benchmarks = {}
+
+
+def benchmark(repeat=5, temporary_folder=False):
+    """
+    Registers a benchmark. The decorated function does the setup and returns
+    the callable to time, so that the setup is not part of the timings.
+
+    Args:
+        repeat (int, optional): number of timed calls. Defaults to 5
+        temporary_folder (bool, optional): if True, the decorated function
+            takes the path of a folder deleted after the benchmark. Defaults
+            to False
+    """
+
+    def register(setup):
+        benchmarks[setup.__name__] = (setup, repeat, temporary_folder)
+        return setup
+
+    return register
+
+
+@benchmark(repeat=3)
+def analytical_model_grid():
+    from analytical_model import analytical_model, fpy
+
+    T_values = np.linspace(400, 1300, num=20)
+    dpa_values = np.geomspace(1e-03, 1e03, num=20)
+
+    def run():
+        for dpa in dpa_values:
+            for T in T_values:
+                analytical_model(phi=dpa / fpy, T=T)
+
+    return run
+
+
+@benchmark(repeat=5)
+def analytical_model_vectorised_grid():
+    from analytical_model import analytical_model_vectorised, fpy
+
+    T_values = np.linspace(400, 1300, num=500)
+    dpa_values = np.geomspace(1e-03, 1e03, num=500)
+
+    def run():
+        analytical_model_vectorised(
+            phi=dpa_values[:, np.newaxis] / fpy, T=T_values[np.newaxis, :]
+        )
+
+    return run
+
+
+@benchmark(repeat=3)
+def trap_ode_sweep():
+    from scipy.integrate import odeint
+    from trap_evolution import A_0, E_A, k_B
+    from trap_table import damage_traps
+
+    fpy = 86400 * 365
+    t = np.linspace(0, 86400 * 365, num=1000)
+    dpa_values = np.geomspace(1e-03, 1e03, num=7)
+    T_values = np.linspace(1300, 400, num=10)
+    K = damage_traps["K"][0]
+    n_max = damage_traps["n_max"][0]
+
+    def dndt(n, t, phi, T):
+        return phi * K * (1 - n / n_max) - A_0 * np.exp(-E_A / (k_B * T)) * n
+
+    def run():
+        for dpa in dpa_values:
+            for T in T_values:
+                odeint(dndt, 0, t, args=(dpa / fpy, T))
+
+    return run
+
+
+@benchmark(repeat=5)
+def trap_closed_form_sweep():
+    from trap_evolution import trap_density_transient
+    from trap_table import damage_traps
+
+    fpy = 86400 * 365
+    t = np.linspace(0, 86400 * 365 * 7, num=100000)
+    dpa_values = np.geomspace(1e-03, 1e03, num=7)
+    T_values = np.linspace(1300, 400, num=50)
+
+    def run():
+        trap_density_transient(
+            t=t[np.newaxis, np.newaxis, :],
+            T=T_values[np.newaxis, :, np.newaxis],
+            phi=dpa_values[:, np.newaxis, np.newaxis] / fpy,
+            K=damage_traps["K"][0],
+            n_max=damage_traps["n_max"][0],
+        )
+
+    return run
+
+
+@benchmark(repeat=5)
+def trap_stream_sweep():
+    from trap_evolution import trap_density_stream
+    from trap_table import damage_traps
+
+    fpy = 86400 * 365
+    dpa_values = np.geomspace(1e-03, 1e03, num=7)
+    T_values = np.linspace(1300, 400, num=50)
+
+    def run():
+        for _ in trap_density_stream(
+            86400 * 365 * 7,
+            T=T_values[np.newaxis, :],
+            phi=dpa_values[:, np.newaxis] / fpy,
+            K=damage_traps["K"][0],
+            n_max=damage_traps["n_max"][0],
+        ):
+            pass
+
+    return run
+
+
+def _reference_traps():
+    """Trap parameters of neutron_induced_traps_model, without FESTIM"""
+    import properties
+    from trap_table import damage_traps
+
+    k_0 = properties.D_0_W / (1.1e-10**2 * 6 * properties.atom_density_W)
+    traps = [SimpleNamespace(k_0=k_0, E_k=properties.E_D_W, p_0=1e13, E_p=1.0)]
+    for damage_trap in damage_traps:
+        traps.append(
+            SimpleNamespace(
+                k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
+                E_k=properties.E_D_W,
+                p_0=1e13,
+                E_p=float(damage_trap["E_p"]),
+            )
+        )
+    return traps
+
+
+@benchmark(repeat=3)
+def automatic_vertices_cases():
+    from compute_profile_depth import automatic_vertices, vertices_cache
+
+    traps = _reference_traps()
+    cases = [(1e-02, 500), (1, 700), (1e02, 1000)]
+
+    def run():
+        vertices_cache.clear()
+        for dpa, T in cases:
+            automatic_vertices(dpa=dpa, T=T, implantation_time=86400, traps=traps)
+
+    return run
+
+
+@benchmark(repeat=3)
+def study_vertices_grid():
+    from compute_profile_depth import study_vertices, vertices_cache
+
+    traps = _reference_traps()
+    T_values = np.linspace(400, 1300, num=20)
+    dpa_values = np.geomspace(1e-03, 1e03, num=20)
+
+    def run():
+        vertices_cache.clear()
+        study_vertices(dpa_values, T_values, implantation_time=86400, traps=traps)
+
+    return run
+
+
+@benchmark(repeat=5)
+def r_d_calls():
+    from compute_profile_depth import r_d
+
+    rng = np.random.default_rng(0)
+    n = rng.uniform(1e22, 1e25, size=(5, 1))
+    k = rng.uniform(1e-18, 1e-16, size=5)
+    p = rng.uniform(1e-02, 1e02, size=5)
+
+    def run():
+        for c_max in np.geomspace(1e18, 1e22, num=1000):
+            r_d(c_max=c_max, t=86400, D=1e-10, n=n, k=k, p=p)
+
+    return run
+
+
+def _write_study(results_folder, dpa_values, T_values, n_steps):
+    """Writes a synthetic study of derived_quantities.csv files"""
+    rng = np.random.default_rng(0)
+    for dpa in dpa_values:
+        for T in T_values:
+            folder = results_folder + "dpa={:.2e}/T={:.0f}/".format(dpa, T)
+            os.makedirs(folder)
+            data = np.column_stack(
+                [
+                    np.geomspace(0.1, 1e09, num=n_steps),
+                    rng.uniform(1e15, 1e20, size=n_steps),
+                    rng.uniform(1e17, 1e23, size=n_steps),
+                ]
+            )
+            np.savetxt(
+                folder + "derived_quantities.csv",
+                data,
+                delimiter=",",
+                header="t(s),Total solute volume 1,Total retention volume 1",
+                comments="",
+            )
+
+
+@benchmark(repeat=3, temporary_folder=True)
+def csv_loading(results_folder):
+    dpa_values = np.geomspace(1e-03, 1e03, num=10)
+    T_values = np.linspace(400, 1300, num=10)
+    _write_study(results_folder, dpa_values, T_values, n_steps=200)
+
+    def run():
+        for dpa in dpa_values:
+            for T in T_values:
+                data_file = (
+                    results_folder
+                    + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, T)
+                )
+                data = np.genfromtxt(data_file, delimiter=",", names=True)
+                data["Total_retention_volume_1"][-1]
+
+    return run
+
+
+@benchmark(repeat=5, temporary_folder=True)
+def study_store_loading(results_folder):
+    from study_store import final_values, load_study, pack_study
+
+    dpa_values = np.geomspace(1e-03, 1e03, num=10)
+    T_values = np.linspace(400, 1300, num=10)
+    _write_study(results_folder, dpa_values, T_values, n_steps=200)
+    pack_study(results_folder + "store/", results_folder, dpa_values, T_values)
+
+    def run():
+        study = load_study(results_folder + "store/")
+        final_values(study, "Total_retention_volume_1")
+
+    return run
+
+
+@benchmark(repeat=1, temporary_folder=True)
+def festim_sim_reference(results_folder):
+    try:
+        from neutron_induced_traps_model import festim_sim
+    except ImportError:
+        return None
+
+    def run():
+        festim_sim(
+            dpa=1,
+            T=700,
+            results_folder_name=results_folder,
+            transient_run=True,
+            total_time=3600,
+        )
+
+    return run
+
+
+@benchmark(repeat=3)
+def cached_mesh_cases():
+    try:
+        import mesh_cache
+    except ImportError:
+        return None
+
+    vertices = np.linspace(0, 2e-03, num=500)
+
+    def run():
+        mesh_cache.meshes.clear()
+        for _ in range(20):
+            mesh_cache.CachedMeshFromVertices(vertices)
+
+    return run
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=parentdir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, history_file=default_history_file):
+    """
+    Runs benchmarks and appends their timings to the history
+
+    Args:
+        names (list, optional): names of the benchmarks to run. Defaults to
+            all of them
+        history_file (str, optional): path to the json history
+
+    Returns:
+        dict: the run, with the best and median time of each benchmark (s),
+            None for benchmarks that cannot run here (e.g. FESTIM missing)
+    """
+    if names is None:
+        names = list(benchmarks)
+
+    results = {}
+    for name in names:
+        setup, repeat, temporary_folder = benchmarks[name]
+        with ExitStack() as stack:
+            args = []
+            if temporary_folder:
+                folder = tempfile.TemporaryDirectory(prefix="benchmark-")
+                args.append(stack.enter_context(folder) + "/")
+            function = setup(*args)
+            if function is None:
+                print("{:<35} skipped".format(name))
+                results[name] = None
+                continue
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - start)
+        results[name] = {
+            "best": min(times),
+            "median": float(np.median(times)),
+            "repeat": repeat,
+        }
+        print("{:<35} {:.4e} s".format(name, results[name]["median"]))
+
+    run = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.node(),
+        "results": results,
+    }
+    history = load_history(history_file)
+    history.append(run)
+    with open(history_file + ".tmp", "w") as f:
+        json.dump(history, f, indent=2)
+    os.replace(history_file + ".tmp", history_file)
+
+    return run
+
+
+def load_history(history_file=default_history_file):
+    """
+    Reads the benchmark history
+
+    Args:
+        history_file (str, optional): path to the json history
+
+    Returns:
+        list: the runs, oldest first, empty if the file does not exist
+    """
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file, "r") as f:
+        return json.load(f)
+
+
+def compare_runs(base, head, threshold=1.2):
+    """
+    Compares the median timings of two runs
+
+    Args:
+        base (dict): the reference run
+        head (dict): the new run
+        threshold (float, optional): time ratio above which a benchmark is
+            flagged as a regression (below 1/threshold as an improvement).
+            Defaults to 1.2
+
+    Returns:
+        list: the names of the regressed benchmarks
+    """
+    regressions = []
+    print(
+        "{:<35} {:>11} {:>11} {:>7}".format(
+            "benchmark", "base (s)", "head (s)", "ratio"
+        )
+    )
+    for name, result in head["results"].items():
+        base_result = base["results"].get(name)
+        if result is None or base_result is None:
+            continue
+        ratio = result["median"] / base_result["median"]
+        flag = ""
+        if ratio > threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = "improvement"
+        print(
+            "{:<35} {:11.4e} {:11.4e} {:7.2f} {}".format(
+                name, base_result["median"], result["median"], ratio, flag
+            )
+        )
+
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--history", default=default_history_file)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("names", nargs="*", help="benchmarks to run")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument(
+        "--base", type=int, default=-2, help="index of the reference run"
+    )
+    compare_parser.add_argument(
+        "--head", type=int, default=-1, help="index of the new run"
+    )
+    compare_parser.add_argument("--threshold", type=float, default=1.2)
+
+    args = parser.parse_args(args)
+    if args.command == "run":
+        run_benchmarks(names=args.names or None, history_file=args.history)
+        return 0
+
+    history = load_history(args.history)
+    try:
+        base, head = history[args.base], history[args.head]
+    except IndexError:
+        print(
+            "{} run(s) in {}, two are needed to compare".format(
+                len(history), args.history
+            )
+        )
+        return 1
+    print("base: {} ({})".format(base["date"], base["commit"]))
+    print("head: {} ({})".format(head["date"], head["commit"]))
+    regressions = compare_runs(base, head, threshold=args.threshold)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Convergence benchmark of the graded meshes of graded_mesh against the
+two-zone meshes of the optimisation_tds compute_profile_depth variants.
+
+The implantation of each TDS experiment is simulated by a 1D
+diffusion-trapping solver (lumped linear finite elements, implicit Euler).
+The retention at the end of the implantation is compared with a reference
+computed on the finest graded mesh with each cell split in 8 (the two-zone
+meshes converge to the same value, but much more slowly):
+
+    python benchmarks/mesh_convergence.py --tolerances 1e-2 1e-3 1e-4
+
+The exit status is 1 if the retention of a graded mesh differs from the
+reference by more than its tolerance.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.linalg import solve_banded
+from scipy.special import expit
+
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from graded_mesh import graded_vertices  # noqa: E402
+
+k_B = 8.617333e-05
+atom_density_W = 6.3222e28
+
+
+def _trap(k_0, E_p, density, p_0=1e13, E_k=0.39):
+    return {"k_0": k_0, "E_k": E_k, "p_0": p_0, "E_p": E_p, "density": density}
+
+
+def _damaged(n, x_max, width=None):
+    """Density of a damaged layer, a sigmoid if width is given, else a step"""
+    if width is None:
+        return lambda x: n * (x < x_max)
+    return lambda x: n * expit(-(x - x_max) / width)
+
+
+# parameters of the sim.py of each experiment, with the fitted densities
+k_0_W = 4.1e-7 / (1.1e-10**2 * 6 * atom_density_W)
+cases = {
+    "schwartz_selinger_0.5_dpa": {
+        "size": 8e-04,
+        "T": 370,
+        "implantation_time": 72 * 3600,
+        "flux": 1.5e25 / (72 * 3600),
+        "nb_cells": 500,
+        "two_zone_tolerance": 1.2,
+        "traps": [
+            _trap(k_0_W, 1.0, lambda x: np.full_like(x, 2e22)),
+            _trap(k_0_W, 1.15, _damaged(4.7e25, 3e-06, 5e-07)),
+            _trap(k_0_W, 1.35, _damaged(3.6e25, 3e-06, 5e-07)),
+            _trap(k_0_W, 1.65, _damaged(3.2e25, 3e-06, 5e-07)),
+            _trap(
+                2.4e-7 / (1.1e-10**2 * 6 * atom_density_W),
+                1.85,
+                _damaged(3.8e25, 3e-06, 5e-07),
+            ),
+        ],
+    },
+    "pecovnik": {
+        "size": 8e-04,
+        "T": 370,
+        "implantation_time": 1.5e25 / 5.6e19,
+        "flux": 5.6e19,
+        "nb_cells": 1500,
+        "two_zone_tolerance": 1.6,
+        "traps": [
+            _trap(5.22e-17, 1.245, _damaged(1.31e26, 2.2e-06), p_0=2e13),
+            _trap(8.93e-17, 1.61, _damaged(4.72e25, 2.2e-06), p_0=4e13),
+            _trap(5.22e-17, 0.87, lambda x: np.full_like(x, 8.21886e25)),
+            _trap(8.93e-17, 1.0, lambda x: np.full_like(x, 2.7817e25)),
+        ],
+    },
+    "zaloznik": {
+        "size": 1.5e-04,
+        "T": 500,
+        "implantation_time": 1.3e25 / 2.6e19,
+        "flux": 2.6e19,
+        "nb_cells": 1500,
+        "two_zone_tolerance": 1.6,
+        "traps": [
+            _trap(5.22e-17, 1.2, _damaged(1e26, 2.4e-06)),
+            _trap(5.22e-17, 0.87, lambda x: np.full_like(x, 8.21886e25)),
+            _trap(8.93e-17, 1.0, lambda x: np.full_like(x, 2.7817e25)),
+        ],
+    },
+}
+
+# implantation profile and tungsten diffusivity of the sim.py files
+center = 0.7e-9
+width = 0.5e-9
+D_0 = 2.4e-07
+E_D = 0.39
+
+
+def _rates(case):
+    """Diffusivity, trapping and detrapping rates at the implantation T"""
+    T = case["T"]
+    D = D_0 * np.exp(-E_D / k_B / T)
+    k = np.array(
+        [trap["k_0"] * np.exp(-trap["E_k"] / k_B / T) for trap in case["traps"]]
+    )
+    p = np.array(
+        [trap["p_0"] * np.exp(-trap["E_p"] / k_B / T) for trap in case["traps"]]
+    )
+    return D, k, p
+
+
+def _densities(case):
+    return lambda x: np.array([trap["density"](x) for trap in case["traps"]])
+
+
+def penetration_depth(case):
+    """Penetration depth of compute_profile_depth.automatic_vertices"""
+    D, k, p = _rates(case)
+    c_max = center * case["flux"] / D
+    n = _densities(case)(np.array([center]))[:, 0]
+    R_d = (2 * D * c_max * case["implantation_time"]) / (
+        n / (1 + p / (k * c_max))
+    ).sum()
+    return center + R_d**0.5, c_max
+
+
+def two_zone_vertices(case):
+    """Mesh of the optimisation_tds compute_profile_depth variants"""
+    size = case["size"]
+    depth, _ = penetration_depth(case)
+    dx = 3e-6 / 300
+    tolerance = case["two_zone_tolerance"]
+    if depth * tolerance > size * 0.9:
+        zones = [
+            np.linspace(0, 3 * center, 100),
+            np.linspace(3 * center, size, int(round((size - 3 * center) / dx))),
+        ]
+    else:
+        zones = [
+            np.linspace(0, 3 * center, 100),
+            np.linspace(
+                3 * center,
+                depth * tolerance,
+                int(round((depth * tolerance - 3 * center) / dx)),
+            ),
+            np.linspace(depth * tolerance, size, case["nb_cells"]),
+        ]
+    return np.unique(np.concatenate(zones))
+
+
+def refine(vertices, n):
+    """Splits every cell in n"""
+    fractions = np.linspace(0, 1, n, endpoint=False)
+    cells = vertices[:-1, np.newaxis] + np.diff(vertices)[:, np.newaxis] * fractions
+    return np.append(cells.ravel(), vertices[-1])
+
+
+def case_graded_vertices(case, tolerance):
+    D, k, p = _rates(case)
+    depth, c_max = penetration_depth(case)
+    return graded_vertices(
+        r_p=center,
+        depth=depth,
+        size=case["size"],
+        c_max=c_max,
+        densities=_densities(case),
+        k=k,
+        p=p,
+        tolerance=tolerance,
+        h_max=case["size"] / case["nb_cells"],
+    )
+
+
+def implantation_retention(vertices, case, initial_stepsize=1e-03, ratio=1.2):
+    """
+    Simulates the implantation on a mesh
+
+    Args:
+        vertices (numpy.ndarray): the mesh vertices (m)
+        case (dict): the experiment, see cases
+        initial_stepsize (float, optional): initial time step (s). Defaults to
+            1e-03
+        ratio (float, optional): growth of the time step. Defaults to 1.2
+
+    Returns:
+        float: the retention at the end of the implantation (H m-2)
+    """
+    x = vertices
+    h = np.diff(x)
+    mass = np.zeros_like(x)
+    mass[:-1] += h / 2
+    mass[1:] += h / 2
+
+    D, k, p = _rates(case)
+    k, p = k[:, np.newaxis], p[:, np.newaxis]
+    n = _densities(case)(x)
+    distribution = np.exp(-0.5 * ((x - center) / width) ** 2) / (
+        width * (2 * np.pi) ** 0.5
+    )
+    source = case["flux"] * distribution
+
+    # stiffness matrix of the interior nodes, c = 0 on both surfaces
+    upper = np.zeros(len(x) - 2)
+    upper[1:] = -D / h[1:-1]
+    lower = np.zeros(len(x) - 2)
+    lower[:-1] = -D / h[1:-1]
+    stiffness_diagonal = D / h[:-1] + D / h[1:]
+
+    c = np.zeros_like(x)
+    c_t = np.zeros_like(n)
+    t, dt = 0, initial_stepsize
+    final_time = case["implantation_time"]
+    while t < final_time:
+        dt = min(dt, final_time - t)
+        c_new = c.copy()
+        for _ in range(30):
+            # the trap equations are solved exactly for a given c
+            denominator = 1 + dt * (k * c_new + p)
+            c_t_new = (c_t + dt * k * c_new * n) / denominator
+            dc_t = dt * k * (n - c_t_new) / denominator
+
+            trapping = (c_t_new - c_t).sum(axis=0) / dt
+            residual = mass * ((c_new - c) / dt + trapping - source)
+            residual[1:-1] += stiffness_diagonal * c_new[1:-1]
+            residual[1:-1] += -D / h[:-1] * c_new[:-2] - D / h[1:] * c_new[2:]
+
+            diagonal = mass * (1 + dc_t.sum(axis=0)) / dt
+            matrix = np.array([upper, diagonal[1:-1] + stiffness_diagonal, lower])
+            delta = solve_banded((1, 1), matrix, residual[1:-1])
+            c_new[1:-1] -= delta
+            c_new = np.maximum(c_new, 0)
+            if np.max(np.abs(delta)) <= 1e-08 * np.max(c_new):
+                break
+        else:
+            dt /= 2
+            continue
+        denominator = 1 + dt * (k * c_new + p)
+        c_t = (c_t + dt * k * c_new * n) / denominator
+        c = c_new
+        t += dt
+        dt *= ratio
+
+    return (mass * (c + c_t.sum(axis=0))).sum()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--tolerances", type=float, nargs="+", default=[1e-02, 1e-03, 1e-04]
+    )
+    parser.add_argument("--cases", nargs="+", default=list(cases))
+    parser.add_argument(
+        "--refinement",
+        type=int,
+        default=8,
+        help="refinement of the finest graded mesh giving the reference",
+    )
+    args = parser.parse_args(args)
+
+    failures = []
+    print(
+        "{:<28} {:>10} {:>7} {:>12} {:>10} {:>8}".format(
+            "case", "mesh", "cells", "retention", "rel. diff", "time (s)"
+        )
+    )
+    for name in args.cases:
+        case = cases[name]
+        finest = case_graded_vertices(case, min(args.tolerances))
+        meshes = [
+            ("reference", None, refine(finest, args.refinement)),
+            ("two-zone", None, two_zone_vertices(case)),
+        ]
+        for tolerance in args.tolerances:
+            meshes.append(
+                (
+                    "{:.0e}".format(tolerance),
+                    tolerance,
+                    case_graded_vertices(case, tolerance),
+                )
+            )
+
+        retentions, times = [], []
+        for _, _, vertices in meshes:
+            start = time.perf_counter()
+            retentions.append(implantation_retention(vertices, case))
+            times.append(time.perf_counter() - start)
+        reference = retentions[0]
+
+        for (label, tolerance, vertices), retention, elapsed in zip(
+            meshes, retentions, times
+        ):
+            difference = abs(retention - reference) / reference
+            if tolerance is not None and difference > tolerance:
+                failures.append((name, label))
+            print(
+                "{:<28} {:>10} {:>7} {:>12.4e} {:>10.2e} {:>8.2f}".format(
+                    name, label, len(vertices) - 1, retention, difference, elapsed
+                )
+            )
+
+    for name, label in failures:
+        print("{}: the {} mesh exceeds its tolerance".format(name, label))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
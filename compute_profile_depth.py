@@ -1,150 +1,182 @@
 import numpy as np
-from scipy.integrate import odeint
 import properties
+from trap_evolution import trap_density_transient
+from trap_table import damage_traps
 
 k_B = 8.6173303e-5
 
+r_p = 3e-09
+size = 2e-03
+A_0_W = 6.1838e-03
+E_A_W = 0.2792
+fpy = 3600 * 24 * 365.25
+flux = 1e20
+
+# vertices already generated, keyed on the case and the trap parameters
+vertices_cache = {}
 
-def automatic_vertices(dpa, T, implantation_time, traps):
-    """Generates an array of vertices for the TDS simulation
+
+def trap_densities(dpa, T, implantation_time):
+    """Computes the trap densities at the end of the implantation, the two
+    intrinsic traps followed by the damage traps of the trap table. dpa and T
+    broadcast against each other.
 
     Args:
-        dpa (float): the damage (dpa/fpy)
-        T (float): the temperature (K)
+        dpa (float, array_like): the damage (dpa/fpy)
+        T (float, array_like): the temperature (K)
+        implantation_time (float): implantation time
+
+    Returns:
+        numpy.ndarray: the densities (m-3), shape (*shape, 2 + n_damage_traps)
+    """
+    phi = np.asarray(dpa, dtype=float)[..., np.newaxis] / fpy
+    T = np.asarray(T, dtype=float)[..., np.newaxis]
+    n_damage = trap_density_transient(
+        t=implantation_time,
+        T=T,
+        phi=phi,
+        K=damage_traps["K"],
+        n_max=damage_traps["n_max"],
+        A_0=A_0_W,
+        E_A=E_A_W,
+    )
+
+    ns1 = 1.3e-3 * properties.atom_density_W
+    ns2 = 4e-4 * properties.atom_density_W
+    n_intrinsic = np.broadcast_to([ns1, ns2], n_damage.shape[:-1] + (2,))
+
+    return np.concatenate([n_intrinsic, n_damage], axis=-1)
+
+
+def max_penetration_depth(dpa, T, implantation_time, traps):
+    """Computes the maximum penetration depth (see r_d) of each case. dpa and
+    T broadcast against each other.
+
+    Args:
+        dpa (float, array_like): the damage (dpa/fpy)
+        T (float, array_like): the temperature (K)
         implantation_time (float): implantation time
         traps (list of FESTIM.Traps): the traps
 
     Returns:
-        numpy.array: the mesh vertices
+        numpy.ndarray: the penetration depth in m
     """
-    r_p = 3e-09
-    size = 2e-03
-    A_0_W = 6.1838e-03
-    E_A_W = 0.2792
-    fpy = 3600 * 24 * 365.25
-    phi = dpa / fpy
-    flux = 1e20
-    n_0 = 0
-    t = np.linspace(0, int(implantation_time), int(1000))
+    T = np.asarray(T, dtype=float)
+    D = properties.D_0_W * np.exp(-properties.E_D_W / k_B / T)
+    c_max = r_p * flux / D
 
-    def numerical_trap_creation_model_trap_1(n, t, phi=phi, A_0=A_0_W, E_A=E_A_W, T=T):
-        K = 1.5e28
-        n_max = 5.2e25
+    E_ps = np.array([trap.E_p for trap in traps])
+    E_ks = np.array([trap.E_k for trap in traps])
+    k_0s = np.array([trap.k_0 for trap in traps])
+    p_0s = np.array([trap.p_0 for trap in traps])
+    ps = p_0s * np.exp(-E_ps / k_B / T[..., np.newaxis])
+    ks = k_0s * np.exp(-E_ks / k_B / T[..., np.newaxis])
 
-        dndt = phi * K * (1 - (n / n_max)) - A_0 * np.exp(-E_A / (k_B * T)) * n
+    # as in r_d, every density is weighted by the filling ratio of every trap
+    ns = trap_densities(dpa, T, implantation_time)
+    filling_ratios = r_trap(c_max[..., np.newaxis], ks, ps)
+    trapped = ns.sum(axis=-1) * filling_ratios.sum(axis=-1)
 
-        return dndt
+    return r_p + (2 * D * c_max * implantation_time / trapped) ** 0.5
 
-    def numerical_trap_creation_model_trap_2(n, t, phi=phi, A_0=A_0_W, E_A=E_A_W, T=T):
-        K = 4.0e27
-        n_max = 4.5e25
 
-        dndt = phi * K * (1 - (n / n_max)) - A_0 * np.exp(-E_A / (k_B * T)) * n
+def mesh_tolerance(dpa, T):
+    """Correction factor of the penetration depth, suitable for the 24h case.
+    dpa and T broadcast against each other.
 
-        return dndt
+    Args:
+        dpa (float, array_like): the damage (dpa/fpy)
+        T (float, array_like): the temperature (K)
 
-    def numerical_trap_creation_model_trap_3(n, t, phi=phi, A_0=A_0_W, E_A=E_A_W, T=T):
-        K = 3.0e27
-        n_max = 4.0e25
+    Returns:
+        numpy.ndarray: the tolerance
+    """
+    dpa = np.asarray(dpa, dtype=float)
+    with np.errstate(divide="ignore"):
+        a = np.minimum(0.09 * dpa ** (-0.25), 0.8)
+        b = np.maximum(-0.2 * np.log(dpa) + 3.7, 2.74)
 
-        dndt = phi * K * (1 - (n / n_max)) - A_0 * np.exp(-E_A / (k_B * T)) * n
+    return a * (np.asarray(T, dtype=float) - 400) + b
 
-        return dndt
 
-    def numerical_trap_creation_model_trap_4(n, t, phi=phi, A_0=A_0_W, E_A=E_A_W, T=T):
-        K = 9.0e27
-        n_max = 4.2e25
+def vertices_from_depth(depth):
+    """Generates the vertices of a mesh refined down to depth
 
-        dndt = phi * K * (1 - (n / n_max)) - A_0 * np.exp(-E_A / (k_B * T)) * n
+    Args:
+        depth (float): depth of the refined zone (m)
 
-        return dndt
+    Returns:
+        numpy.array: the mesh vertices
+    """
+    if depth > size:
+        return np.linspace(0, size, 1000)
 
-    ns1 = 1.3e-3 * properties.atom_density_W
-    ns2 = 4e-4 * properties.atom_density_W
-    nsd1 = odeint(
-        numerical_trap_creation_model_trap_1,
-        n_0,
-        t,
-    )
-    nsd2 = odeint(
-        numerical_trap_creation_model_trap_2,
-        n_0,
-        t,
-    )
-    nsd3 = odeint(
-        numerical_trap_creation_model_trap_3,
-        n_0,
-        t,
-    )
-    nsd4 = odeint(
-        numerical_trap_creation_model_trap_4,
-        n_0,
-        t,
+    dx = 2e-3 / 100
+    number_of_cells_required = int(round((size - depth) / dx))
+    vertices = np.concatenate(
+        [
+            np.linspace(0, depth, 500),
+            np.linspace(depth, size, number_of_cells_required),
+        ]
     )
 
-    D = properties.D_0_W * np.exp(-properties.E_D_W / k_B / T)
+    return np.unique(vertices)
+
 
-    ns = np.array(
-        [np.array([ns1]), np.array([ns2]), nsd1[-1], nsd2[-1], nsd3[-1], nsd4[-1]]
+def _vertices_key(dpa, T, implantation_time, traps):
+    trap_parameters = tuple(
+        (float(trap.k_0), float(trap.E_k), float(trap.p_0), float(trap.E_p))
+        for trap in traps
     )
-    E_ps = np.array([trap.E_p for trap in traps])
-    E_ks = np.array([trap.E_k for trap in traps])
-    k_0s = np.array([trap.k_0 for trap in traps])
-    p_0s = np.array([trap.p_0 for trap in traps])
-    ps = p_0s * np.exp(-E_ps / k_B / T)
-    ks = k_0s * np.exp(-E_ks / k_B / T)
-    cmax = r_p * flux / D
-    max_penetration_depth = r_p + r_d(cmax, implantation_time, D, ns, ks, ps)
+    return float(dpa), float(T), float(implantation_time), trap_parameters
 
-    dx = 2e-3 / 100
 
-    # suitable for 24h case
-    a = 0.09 * dpa ** (-0.25)
-    if a > 0.8:
-        a = 0.8
-    b = -0.2 * np.log(dpa) + 3.7
-    if b < 2.74:
-        b = 2.74
-    tolerance = a * (T - 400) + b
-
-    print(
-        "The estimated maximum penetration depth is: {:.2e} m".format(
-            max_penetration_depth
-        )
-    )
+def study_vertices(dpa_values, T_values, implantation_time, traps):
+    """Generates the meshes of all the (dpa, T) cases of a study in one
+    batched evaluation. The meshes are cached for later calls of
+    study_vertices and automatic_vertices.
+
+    Args:
+        dpa_values (array_like): the damages (dpa/fpy)
+        T_values (array_like): the temperatures (K)
+        implantation_time (float): implantation time
+        traps (list of FESTIM.Traps): the traps
+
+    Returns:
+        dict: the mesh vertices of each (dpa, T) case
+    """
+    dpa_grid, T_grid = np.meshgrid(dpa_values, T_values, indexing="ij")
+    depths = max_penetration_depth(
+        dpa_grid, T_grid, implantation_time, traps
+    ) * mesh_tolerance(dpa_grid, T_grid)
+
+    meshes = {}
+    for dpa, T, depth in zip(dpa_grid.ravel(), T_grid.ravel(), depths.ravel()):
+        key = _vertices_key(dpa, T, implantation_time, traps)
+        if key not in vertices_cache:
+            vertices_cache[key] = vertices_from_depth(depth)
+        meshes[(dpa, T)] = vertices_cache[key].copy()
+
+    return meshes
+
+
+def automatic_vertices(dpa, T, implantation_time, traps):
+    """Generates an array of vertices for the TDS simulation
+
+    Args:
+        dpa (float): the damage (dpa/fpy)
+        T (float): the temperature (K)
+        implantation_time (float): implantation time
+        traps (list of FESTIM.Traps): the traps
+
+    Returns:
+        numpy.array: the mesh vertices
+    """
+    key = _vertices_key(dpa, T, implantation_time, traps)
+    if key not in vertices_cache:
+        study_vertices([dpa], [T], implantation_time, traps)
 
-    print("Tolerance = {:.1f}".format(tolerance))
-
-    print("With correction: {:.2e} m".format(max_penetration_depth * tolerance))
-
-    if max_penetration_depth * tolerance > size:
-        vertices = np.concatenate(
-            [
-                np.linspace(0, size, 1000),
-            ]
-        )
-    else:
-        number_of_cells_required = int(
-            round((size - (max_penetration_depth * tolerance)) / dx)
-        )
-        vertices = np.concatenate(
-            [
-                np.linspace(
-                    0,
-                    max_penetration_depth * tolerance,
-                    500,
-                ),
-                np.linspace(
-                    max_penetration_depth * tolerance, size, number_of_cells_required
-                ),
-            ]
-        )
-
-    vertices = np.sort(np.unique(vertices))
-
-    print("The mesh size is: {}".format(len(vertices)))
-
-    return vertices
+    return vertices_cache[key].copy()
 
 
 def r_trap(c, k, p):
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+def retention_profile(x, r_p, depth, c_max, densities, k, p):
+    """
+    Predicted hydrogen retention at the end of the implantation: the mobile
+    concentration rises linearly to c_max at the implantation depth then
+    decreases linearly to 0 at the penetration depth, and each trap is
+    filled at equilibrium with it (see compute_profile_depth.r_trap)
+
+    Args:
+        x (numpy.ndarray): depths (m)
+        r_p (float): the implantation depth (m)
+        depth (float): the penetration depth (m)
+        c_max (float): the maximum mobile concentration (H m-3)
+        densities (numpy.ndarray): the trap densities at x, shape
+            (n_traps, len(x)) (m-3)
+        k (numpy.ndarray): the trapping rates (m3 s-1)
+        p (numpy.ndarray): the detrapping rates (s-1)
+
+    Returns:
+        numpy.ndarray: the retention (H m-3)
+    """
+    c_m = c_max * np.interp(x, [0, r_p, depth], [0, 1, 0], right=0)
+    k = np.asarray(k)[:, np.newaxis]
+    p = np.asarray(p)[:, np.newaxis]
+    with np.errstate(divide="ignore"):
+        filling_ratios = 1 / (1 + p / (k * c_m))
+
+    return c_m + (densities * filling_ratios).sum(axis=0)
+
+
+def _second_derivative(x, y):
+    """Second derivative of samples on a non-uniform grid"""
+    dy = np.gradient(y, x)
+    return np.gradient(dy, x)
+
+
+def graded_vertices(
+    r_p,
+    depth,
+    size,
+    c_max,
+    densities,
+    k,
+    p,
+    tolerance=1e-03,
+    h_min=None,
+    h_front=3e-6 / 300,
+    h_max=None,
+    safety=1.2,
+    growth=None,
+):
+    """
+    Generates graded mesh vertices from the predicted retention profile (see
+    retention_profile). The local cell size is the one for which the linear
+    interpolation error of the profile, h**2 |c''| / 8, is tolerance times
+    its maximum. It is bounded by:
+        - h_front around the penetration depth, between depth / safety and
+          depth * safety, to follow the front wherever it actually is
+        - h_max elsewhere
+    and grows by at most a factor growth from a cell to the next, which
+    bounds the error where the profile is predicted to be linear.
+
+    Args:
+        r_p (float): the implantation depth (m)
+        depth (float): the penetration depth (m)
+        size (float): the size of the domain (m)
+        c_max (float): the maximum mobile concentration (H m-3)
+        densities (callable): trap densities at depths x, densities(x) of
+            shape (n_traps, len(x)) (m-3)
+        k (array_like): the trapping rates (m3 s-1)
+        p (array_like): the detrapping rates (s-1)
+        tolerance (float, optional): relative interpolation error of the
+            profile. Defaults to 1e-03
+        h_min (float, optional): minimum cell size (m). Defaults to
+            3 * r_p / 100
+        h_front (float, optional): maximum cell size around the penetration
+            depth (m). Defaults to 1e-08
+        h_max (float, optional): maximum cell size (m). Defaults to size / 500
+        safety (float, optional): relative uncertainty of the penetration
+            depth. Defaults to 1.2
+        growth (float, optional): maximum ratio of the sizes of neighbouring
+            cells. Defaults to min(1.2, 1 + 50 * tolerance)
+
+    Returns:
+        numpy.ndarray: the mesh vertices
+    """
+    if h_min is None:
+        h_min = 3 * r_p / 100
+    if h_max is None:
+        h_max = size / 500
+    if growth is None:
+        growth = min(1.2, 1 + 50 * tolerance)
+    depth = min(depth, size)
+
+    # samples of the error indicator, dense near the surface and the front
+    x = np.unique(
+        np.concatenate(
+            [
+                np.linspace(0, 3 * r_p, 100),
+                np.geomspace(r_p, size, 2000),
+                np.linspace(depth / safety, min(depth * safety, size), 2000),
+            ]
+        )
+    )
+    x = x[x <= size]
+    profile = retention_profile(x, r_p, depth, c_max, densities(x), k, p)
+    curvature = np.abs(_second_derivative(x, profile))
+    with np.errstate(divide="ignore"):
+        h = np.sqrt(8 * tolerance * profile.max() / curvature)
+
+    front = (x >= depth / safety) & (x <= depth * safety)
+    h[front] = np.minimum(h[front], h_front)
+    h = np.clip(h, h_min, h_max)
+
+    # limit the growth of the cells in both directions
+    slope = growth - 1
+    for i in range(1, len(x)):
+        h[i] = min(h[i], h[i - 1] + slope * (x[i] - x[i - 1]))
+    for i in range(len(x) - 2, -1, -1):
+        h[i] = min(h[i], h[i + 1] + slope * (x[i + 1] - x[i]))
+
+    vertices = [0.0]
+    while vertices[-1] < size:
+        vertices.append(vertices[-1] + np.interp(vertices[-1], x, h))
+    vertices = np.array(vertices)
+    # the last cell is merged with the previous one if too small
+    if size - vertices[-2] < 0.5 * (vertices[-2] - vertices[-3]):
+        vertices = np.delete(vertices, -2)
+    vertices[-1] = size
+
+    return vertices
@@ -0,0 +1,27 @@
+import festim as F
+import numpy as np
+
+# FEniCS meshes already built in this process, keyed on their vertices, the
+# oldest one being dropped beyond max_meshes
+meshes = {}
+max_meshes = 64
+
+
+class CachedMeshFromVertices(F.MeshFromVertices):
+    """
+    festim.MeshFromVertices reusing the FEniCS mesh of a previous simulation
+    of the same process when the vertices are identical, e.g. the cases of a
+    parametric study run one after the other. The mesh is only read by the
+    simulations (the markers and measures are created for each of them), and
+    its connectivity, computed by the first one, is reused by the others.
+    """
+
+    def generate_mesh_from_vertices(self):
+        key = np.asarray(self.vertices, dtype=float).tobytes()
+        if key in meshes:
+            self.mesh = meshes[key]
+            return
+        super().generate_mesh_from_vertices()
+        if len(meshes) >= max_meshes:
+            del meshes[next(iter(meshes))]
+        meshes[key] = self.mesh
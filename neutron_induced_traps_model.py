@@ -2,7 +2,36 @@ import festim as F
 import fenics as f
 import properties
 from compute_profile_depth import automatic_vertices
+from mesh_cache import CachedMeshFromVertices
+from trap_table import damage_traps, default_trap_table_file
+from result_cache import cache_key, cache_restore, cache_store
+from run_profile import (
+    ProfiledComputation,
+    ProfiledStepsize,
+    RunProfile,
+    count_newton_iterations,
+    newton_iterations,
+)
+from solution_state import analytical_state, load_state, save_state, set_state
 import numpy as np
+import inspect
+import os
+
+# files defining the model, any change in them invalidates cached results
+model_source_files = [
+    __file__,
+    inspect.getsourcefile(automatic_vertices),
+    inspect.getsourcefile(properties),
+    default_trap_table_file,
+]
+
+
+class Stepsize(ProfiledStepsize, F.Stepsize):
+    pass
+
+
+class DerivedQuantities(ProfiledComputation, F.DerivedQuantities):
+    pass
 
 
 def trap_conc_steady(A_0, E_A, phi, K, n_max, T):
@@ -22,7 +51,39 @@ def festim_sim(
     results_folder_name="Results/damaged_traps_testing/{:.0}_dpa/",
     transient_run=False,
     total_time=1e05,
+    initial_stepsize=0.1,
+    stepsize_change_ratio=1.05,
+    maximum_iterations=30,
+    initial_state=None,
+    cache_folder=None,
+    cache_max_size=None,
+    profile=True,
 ):
+    if cache_folder is not None:
+        source_files = list(model_source_files)
+        if initial_state not in [None, "analytical"]:
+            source_files.append(initial_state)
+        key = cache_key(
+            inputs={
+                "dpa": dpa,
+                "T": T,
+                "transient_run": transient_run,
+                "total_time": total_time,
+                "initial_stepsize": initial_stepsize,
+                "stepsize_change_ratio": stepsize_change_ratio,
+                "maximum_iterations": maximum_iterations,
+                "initial_state": initial_state,
+                "festim_version": getattr(F, "__version__", None),
+            },
+            source_files=source_files,
+        )
+        if cache_restore(cache_folder, key, results_folder_name):
+            # no simulation was run
+            return None
+
+    # written to results_folder_name + "profile.json" if profile is True
+    my_profile = RunProfile()
+
     my_model = F.Simulation(log_level=40)
 
     # define materials
@@ -45,144 +106,60 @@ def festim_sim(
         density=2e22,
         materials=tungsten,
     )
-    if transient_run:
-        trap_W_damage_1 = F.NeutronInducedTrap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.15,
-            A_0=A_0_W,
-            E_A=E_A_W,
-            phi=dpa / fpy,
-            K=1.5e28,
-            n_max=5.2e25,
-            materials=tungsten,
-            absolute_tolerance=defined_absolute_tolerance,
-            relative_tolerance=defined_relative_tolerance,
-            maximum_iterations=defined_maximum_iterations,
-        )
-        trap_W_damage_2 = F.NeutronInducedTrap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.35,
-            A_0=A_0_W,
-            E_A=E_A_W,
-            phi=dpa / fpy,
-            K=4.0e27,
-            n_max=4.5e25,
-            materials=tungsten,
-            absolute_tolerance=defined_absolute_tolerance,
-            relative_tolerance=defined_relative_tolerance,
-            maximum_iterations=defined_maximum_iterations,
-        )
-        trap_W_damage_3 = F.NeutronInducedTrap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.65,
-            A_0=A_0_W,
-            E_A=E_A_W,
-            phi=dpa / fpy,
-            K=3.0e27,
-            n_max=4.0e25,
-            materials=tungsten,
-            absolute_tolerance=defined_absolute_tolerance,
-            relative_tolerance=defined_relative_tolerance,
-            maximum_iterations=defined_maximum_iterations,
-        )
-        trap_W_damage_4 = F.NeutronInducedTrap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.85,
-            A_0=A_0_W,
-            E_A=E_A_W,
-            phi=dpa / fpy,
-            K=9.0e27,
-            n_max=4.2e25,
-            materials=tungsten,
-            absolute_tolerance=defined_absolute_tolerance,
-            relative_tolerance=defined_relative_tolerance,
-            maximum_iterations=defined_maximum_iterations,
-        )
-    else:
-        trap_W_damage_1 = F.Trap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.15,
-            density=trap_conc_steady(
-                A_0=A_0_W, E_A=E_A_W, phi=dpa / fpy, K=1.5e28, n_max=5.2e25, T=T
-            ),
-            materials=tungsten,
-        )
-        trap_W_damage_2 = F.Trap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.35,
-            density=trap_conc_steady(
-                A_0=A_0_W, E_A=E_A_W, phi=dpa / fpy, K=4.0e27, n_max=4.5e25, T=T
-            ),
-            materials=tungsten,
-        )
-        trap_W_damage_3 = F.Trap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.65,
-            density=trap_conc_steady(
+    damage_traps_W = []
+    for damage_trap in damage_traps:
+        if transient_run:
+            trap_W_damage = F.NeutronInducedTrap(
+                k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
+                E_k=properties.E_D_W,
+                p_0=1e13,
+                E_p=float(damage_trap["E_p"]),
                 A_0=A_0_W,
                 E_A=E_A_W,
                 phi=dpa / fpy,
-                K=3.0e27,
-                n_max=4.0e25,
-                T=T,
-            ),
-            materials=tungsten,
-        )
-        trap_W_damage_4 = F.Trap(
-            k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
-            E_k=properties.E_D_W,
-            p_0=1e13,
-            E_p=1.85,
-            density=trap_conc_steady(
-                A_0=A_0_W,
-                E_A=E_A_W,
-                phi=dpa / fpy,
-                K=9.0e27,
-                n_max=4.2e25,
-                T=T,
-            ),
-            materials=tungsten,
-        )
+                K=float(damage_trap["K"]),
+                n_max=float(damage_trap["n_max"]),
+                materials=tungsten,
+                absolute_tolerance=defined_absolute_tolerance,
+                relative_tolerance=defined_relative_tolerance,
+                maximum_iterations=defined_maximum_iterations,
+            )
+        else:
+            trap_W_damage = F.Trap(
+                k_0=4.1e-7 / (1.1e-10**2 * 6 * properties.atom_density_W),
+                E_k=properties.E_D_W,
+                p_0=1e13,
+                E_p=float(damage_trap["E_p"]),
+                density=trap_conc_steady(
+                    A_0=A_0_W,
+                    E_A=E_A_W,
+                    phi=dpa / fpy,
+                    K=float(damage_trap["K"]),
+                    n_max=float(damage_trap["n_max"]),
+                    T=T,
+                ),
+                materials=tungsten,
+            )
+        damage_traps_W.append(trap_W_damage)
 
-    my_model.traps = F.Traps(
-        [
-            trap_W_1,
-            trap_W_damage_1,
-            trap_W_damage_2,
-            trap_W_damage_3,
-            trap_W_damage_4,
-        ]
-    )
+    my_model.traps = F.Traps([trap_W_1, *damage_traps_W])
 
     implantation_depth = 3e-09
     implantation_flux = 1e20
 
     simple = True
 
-    if dpa == 0:
-        vertices = np.linspace(0, 2e-03, num=500)
-    elif simple is True:
-        vertices = np.linspace(0, 2e-03, num=500)
-    else:
-        vertices = automatic_vertices(
-            dpa=dpa, T=T, implantation_time=total_time, traps=my_model.traps.traps
-        )
+    with my_profile.phase("mesh"):
+        if dpa == 0:
+            vertices = np.linspace(0, 2e-03, num=500)
+        elif simple is True:
+            vertices = np.linspace(0, 2e-03, num=500)
+        else:
+            vertices = automatic_vertices(
+                dpa=dpa, T=T, implantation_time=total_time, traps=my_model.traps.traps
+            )
 
-    my_model.mesh = F.MeshFromVertices(vertices)
+        my_model.mesh = CachedMeshFromVertices(vertices)
 
     # define temperature
     my_model.T = F.Temperature(value=T)
@@ -201,8 +178,8 @@ def festim_sim(
 
     # define exports
     results_folder = results_folder_name
-    my_derived_quantities = F.DerivedQuantities(
-        filename=results_folder + "derived_quantities.csv"
+    my_derived_quantities = DerivedQuantities(
+        filename=results_folder + "derived_quantities.csv", profile=my_profile
     )
     my_derived_quantities.derived_quantities = [
         F.TotalVolume("solute", volume=1),
@@ -262,28 +239,28 @@ def festim_sim(
             #     mode=1,
             # ),
             # F.TrapDensityXDMF(
-            #     trap_W_damage_1,
+            #     damage_traps_W[0],
             #     label="trap_damaged_1_density",
             #     folder=results_folder,
             #     checkpoint=False,
             #     mode=1,
             # ),
             # F.TrapDensityXDMF(
-            #     trap_W_damage_2,
+            #     damage_traps_W[1],
             #     label="trap_damaged_2_density",
             #     folder=results_folder,
             #     checkpoint=False,
             #     mode=1,
             # ),
             # F.TrapDensityXDMF(
-            #     trap_W_damage_3,
+            #     damage_traps_W[2],
             #     label="trap_damaged_3_density",
             #     folder=results_folder,
             #     checkpoint=False,
             #     mode=1,
             # ),
             # F.TrapDensityXDMF(
-            #     trap_W_damage_4,
+            #     damage_traps_W[3],
             #     label="trap_damaged_4_density",
             #     folder=results_folder,
             #     checkpoint=False,
@@ -296,29 +273,60 @@ def festim_sim(
 
     # define settings
     if transient_run:
-        my_model.dt = F.Stepsize(
-            initial_value=0.1,
-            stepsize_change_ratio=1.05,
+        my_model.dt = Stepsize(
+            initial_value=initial_stepsize,
+            stepsize_change_ratio=stepsize_change_ratio,
             dt_min=1e-8,
+            profile=my_profile,
         )
         my_model.settings = F.Settings(
             transient=True,
             final_time=total_time,
             absolute_tolerance=1e10,
             relative_tolerance=1e-10,
-            maximum_iterations=30,
+            maximum_iterations=maximum_iterations,
         )
     else:
         my_model.settings = F.Settings(
             transient=False,
             absolute_tolerance=1e10,
             relative_tolerance=1e-10,
-            maximum_iterations=30,
+            maximum_iterations=maximum_iterations,
         )
 
     # run simulation
-    my_model.initialise()
-    my_model.run()
+    try:
+        with my_profile.phase("initialise"):
+            my_model.initialise()
+        count_newton_iterations(my_model)
+
+        # warm start from the analytical steady state or from the state of a
+        # previous run (e.g. a neighbouring dpa, T case)
+        if initial_state == "analytical":
+            set_state(my_model, analytical_state(dpa=dpa, T=T))
+        elif initial_state is not None:
+            set_state(my_model, load_state(initial_state))
+
+        with my_profile.phase("run"):
+            my_model.run()
+        if not transient_run:
+            my_profile.record_attempt(None, None, newton_iterations(my_model), True)
+        save_state(my_model, results_folder + "state.npz")
+    finally:
+        # written for failed runs too
+        if profile:
+            os.makedirs(results_folder, exist_ok=True)
+            my_profile.save(results_folder + "profile.json")
+
+    if cache_folder is not None:
+        cache_store(
+            cache_folder,
+            key,
+            [results_folder + "derived_quantities.csv", results_folder + "state.npz"],
+            max_size=cache_max_size,
+        )
+
+    return my_model
 
 
 if __name__ == "__main__":
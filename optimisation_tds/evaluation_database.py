@@ -0,0 +1,202 @@
+import io
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+def _connect(filename):
+    """Opens the database, creating it if needed"""
+    folder = os.path.dirname(filename)
+    if folder != "":
+        os.makedirs(folder, exist_ok=True)
+    connection = sqlite3.connect(filename, timeout=60)
+    # write-ahead logging lets the pool workers read while another one writes
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""CREATE TABLE IF NOT EXISTS evaluations (
+            key TEXT PRIMARY KEY,
+            parameters TEXT NOT NULL,
+            error REAL NOT NULL,
+            tds BLOB,
+            date REAL NOT NULL
+        )""")
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS evaluations_error ON evaluations (error)"
+    )
+    return connection
+
+
+def evaluation_key(p):
+    """
+    Key of a parameter vector, with 12 significant digits so that points
+    computed twice by the optimiser are found despite round-off errors
+
+    Args:
+        p (array_like): the parameters
+
+    Returns:
+        str: the key
+    """
+    return ",".join("{:.11e}".format(float(prm)) for prm in p)
+
+
+def store_evaluation(filename, p, err, T=None, flux=None):
+    """
+    Stores an evaluated parameter vector, its error and the simulated TDS
+
+    Args:
+        filename (str): path to the sqlite database
+        p (array_like): the parameters
+        err (float): the error
+        T (array_like, optional): temperatures of the simulated TDS (K).
+            Defaults to None
+        flux (array_like, optional): simulated desorption flux. Defaults to
+            None
+    """
+    tds = None
+    if T is not None and flux is not None:
+        buffer = io.BytesIO()
+        np.save(buffer, np.array([T, flux], dtype=float))
+        tds = buffer.getvalue()
+
+    connection = _connect(filename)
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)",
+            (
+                evaluation_key(p),
+                json.dumps([float(prm) for prm in p]),
+                float(err),
+                tds,
+                time.time(),
+            ),
+        )
+    connection.close()
+
+
+def lookup_evaluation(filename, p):
+    """
+    Finds the error of a parameter vector evaluated earlier. The lookup uses
+    the primary key index of the database.
+
+    Args:
+        filename (str): path to the sqlite database
+        p (array_like): the parameters
+
+    Returns:
+        float: the error, None if p was never evaluated
+    """
+    if not os.path.exists(filename):
+        return None
+    connection = _connect(filename)
+    row = connection.execute(
+        "SELECT error FROM evaluations WHERE key = ?", (evaluation_key(p),)
+    ).fetchone()
+    connection.close()
+
+    return None if row is None else row[0]
+
+
+def load_tds(filename, p):
+    """
+    Reads the simulated TDS of a parameter vector evaluated earlier
+
+    Args:
+        filename (str): path to the sqlite database
+        p (array_like): the parameters
+
+    Returns:
+        numpy.ndarray: the temperatures (K) and desorption flux, shape (2, n),
+            None if not stored
+    """
+    if not os.path.exists(filename):
+        return None
+    connection = _connect(filename)
+    row = connection.execute(
+        "SELECT tds FROM evaluations WHERE key = ?", (evaluation_key(p),)
+    ).fetchone()
+    connection.close()
+
+    if row is None or row[0] is None:
+        return None
+    return np.load(io.BytesIO(row[0]))
+
+
+def best_simplex(filename, n_parameters):
+    """
+    Builds a simplex from the best points of the database, to restart the
+    optimisation where it stopped. Points are taken by increasing error,
+    skipping those that would make the simplex degenerate.
+
+    Args:
+        filename (str): path to the sqlite database
+        n_parameters (int): number of parameters
+
+    Returns:
+        numpy.ndarray: the (n_parameters + 1, n_parameters) simplex, None if
+            the database does not hold enough independent points
+    """
+    if not os.path.exists(filename):
+        return None
+    connection = _connect(filename)
+    rows = connection.execute("SELECT parameters FROM evaluations ORDER BY error")
+
+    simplex = []
+    for (parameters,) in rows:
+        point = np.array(json.loads(parameters))
+        if len(point) != n_parameters:
+            continue
+        candidate = np.array(simplex + [point])
+        edges = candidate[1:] - candidate[0]
+        # relative rank test, the parameters can have very different scales
+        scale = np.max(np.abs(candidate), axis=0)
+        scale[scale == 0] = 1
+        if np.linalg.matrix_rank(edges / scale) == len(edges):
+            simplex.append(point)
+        if len(simplex) == n_parameters + 1:
+            break
+    connection.close()
+
+    if len(simplex) < n_parameters + 1:
+        return None
+    return np.array(simplex)
+
+
+def load_evaluations(filename, n_parameters):
+    """
+    Reads the evaluated points whose simulated TDS is stored, e.g. to fit a
+    surrogate model
+
+    Args:
+        filename (str): path to the sqlite database
+        n_parameters (int): number of parameters, points of other fits are
+            ignored
+
+    Returns:
+        numpy.ndarray: the points, shape (n_points, n_parameters)
+        numpy.ndarray: the errors, shape (n_points,)
+        numpy.ndarray: the simulated desorption fluxes, shape
+            (n_points, n_temperatures)
+    """
+    points, errors, fluxes = [], [], []
+    if os.path.exists(filename):
+        connection = _connect(filename)
+        rows = connection.execute(
+            "SELECT parameters, error, tds FROM evaluations WHERE tds IS NOT NULL"
+        )
+        for parameters, err, tds in rows:
+            point = json.loads(parameters)
+            if len(point) != n_parameters:
+                continue
+            points.append(point)
+            errors.append(err)
+            fluxes.append(np.load(io.BytesIO(tds))[1])
+        connection.close()
+
+    return (
+        np.array(points, dtype=float).reshape(-1, n_parameters),
+        np.array(errors, dtype=float),
+        np.array(fluxes, dtype=float),
+    )
@@ -0,0 +1,246 @@
+import multiprocessing
+from functools import partial
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+
+def pool_evaluator(function, n_workers=None, **kwargs):
+    """
+    Builds a batch evaluator running function on each point of a batch in a
+    process pool. The pool is created by the caller's context manager, e.g.
+
+        with pool_evaluator(error, n_workers=4, norms=norms) as evaluate_batch:
+            parallel_nelder_mead(evaluate_batch, x0)
+
+    Args:
+        function (callable): the function to evaluate, f(p, **kwargs),
+            picklable (i.e. defined at module level)
+        n_workers (int, optional): number of processes. Defaults to the number
+            of CPUs
+        **kwargs: keyword arguments passed to function
+
+    Returns:
+        PoolEvaluator: the batch evaluator
+    """
+    return PoolEvaluator(partial(function, **kwargs), n_workers=n_workers)
+
+
+class PoolEvaluator:
+    """Evaluates a function on batches of points in a process pool"""
+
+    def __init__(self, function, n_workers=None):
+        self.function = function
+        self.n_workers = n_workers
+        self.pool = None
+
+    def __enter__(self):
+        self.pool = multiprocessing.Pool(self.n_workers)
+        return self
+
+    def __exit__(self, *args):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __call__(self, points, bound=None):
+        function = self.function
+        if bound is not None:
+            function = partial(function, bound=bound)
+        return np.array(self.pool.map(function, points, chunksize=1))
+
+
+def _initial_simplex(x0, initial_step):
+    """Simplex of scipy's Nelder-Mead: x0 and a relative step along each axis"""
+    simplex = [x0]
+    for i in range(len(x0)):
+        vertex = np.array(x0, dtype=float)
+        if vertex[i] != 0:
+            vertex[i] *= 1 + initial_step
+        else:
+            vertex[i] = 0.00025
+        simplex.append(vertex)
+    return np.array(simplex)
+
+
+def parallel_nelder_mead(
+    evaluate_batch,
+    x0,
+    n_parallel=None,
+    speculative=False,
+    initial_simplex=None,
+    initial_step=0.05,
+    xatol=1e-04,
+    fatol=1e-04,
+    maxiter=None,
+    early_termination=False,
+    disp=True,
+):
+    """
+    Nelder-Mead minimisation updating the n_parallel worst vertices of the
+    simplex at each iteration (Lee and Wiswall, 2007), so that the points of
+    each step are evaluated concurrently. With n_parallel=1 and
+    speculative=False this is the standard Nelder-Mead algorithm (same
+    coefficients, initial simplex and stopping criteria as scipy).
+
+    Each iteration evaluates the reflections of the worst vertices in one
+    batch, then the expansions or contractions they call for in a second
+    batch. With speculative=True, reflections, expansions and contractions
+    are evaluated in a single batch of 4 * n_parallel points, trading extra
+    evaluations for fewer sequential steps when enough cores are available.
+
+    With early_termination=True, the error of the worst vertex is passed to
+    evaluate_batch as bound for all the points but those of the initial
+    simplex and of shrinks. Their only use is to be compared with the
+    vertices they may replace, so an evaluation can stop as soon as its error
+    is known to exceed bound and return any value above bound.
+
+    Args:
+        evaluate_batch (callable): returns the objective values of a list of
+            points, e.g. a PoolEvaluator. Called as
+            evaluate_batch(points, bound=bound) if early_termination is True
+        x0 (array_like): initial guess
+        n_parallel (int, optional): number of vertices updated at each
+            iteration, between 1 and len(x0) - 1. Defaults to len(x0) // 2
+        speculative (bool, optional): evaluate all candidate points of an
+            iteration in one batch. Defaults to False
+        initial_simplex (array_like, optional): (len(x0) + 1, len(x0)) initial
+            simplex, overriding x0 and initial_step. Defaults to None
+        initial_step (float, optional): relative size of the initial simplex.
+            Defaults to 0.05
+        xatol (float, optional): absolute tolerance on the vertices. Defaults
+            to 1e-04
+        fatol (float, optional): absolute tolerance on the objective values.
+            Defaults to 1e-04
+        maxiter (int, optional): maximum number of iterations. Defaults to
+            200 * len(x0)
+        early_termination (bool, optional): pass the error of the worst vertex
+            to evaluate_batch. Defaults to False
+        disp (bool, optional): print the progress. Defaults to True
+
+    Returns:
+        scipy.optimize.OptimizeResult: the result, with the fields x, fun,
+            nit, nfev, success, message and final_simplex
+    """
+    alpha, gamma, beta, delta = 1, 2, 0.5, 0.5
+
+    if initial_simplex is None:
+        simplex = _initial_simplex(np.asarray(x0, dtype=float), initial_step)
+    else:
+        simplex = np.array(initial_simplex, dtype=float)
+    n = simplex.shape[1]
+    if n_parallel is None:
+        n_parallel = max(1, n // 2)
+    # the centroid of a single vertex makes the simplex degenerate
+    if not 1 <= n_parallel <= max(1, n - 1):
+        raise ValueError("n_parallel must be between 1 and {}".format(max(1, n - 1)))
+    if maxiter is None:
+        maxiter = 200 * n
+
+    values = np.asarray(evaluate_batch(list(simplex)), dtype=float)
+    nfev = len(simplex)
+
+    nit = 0
+    success = False
+    while nit < maxiter:
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if (
+            np.max(np.abs(simplex[1:] - simplex[0])) <= xatol
+            and np.max(np.abs(values[1:] - values[0])) <= fatol
+        ):
+            success = True
+            break
+        nit += 1
+
+        worst = np.arange(n + 1 - n_parallel, n + 1)
+        centroid = simplex[: n + 1 - n_parallel].mean(axis=0)
+        # worst of the vertices that are kept in this iteration
+        f_kept = values[n - n_parallel]
+
+        # points worse than every vertex are rejected whatever their value
+        batch_kwargs = {"bound": values[-1]} if early_termination else {}
+
+        reflections = centroid + alpha * (centroid - simplex[worst])
+        expansions = centroid + gamma * (reflections - centroid)
+        outside = centroid + beta * (reflections - centroid)
+        inside = centroid + beta * (simplex[worst] - centroid)
+
+        if speculative:
+            batch = np.concatenate([reflections, expansions, outside, inside])
+            batch_values = np.asarray(
+                evaluate_batch(list(batch), **batch_kwargs), dtype=float
+            )
+            nfev += len(batch)
+            f_r, f_e, f_oc, f_ic = batch_values.reshape(4, n_parallel)
+        else:
+            f_r = np.asarray(
+                evaluate_batch(list(reflections), **batch_kwargs), dtype=float
+            )
+            nfev += n_parallel
+            f_e = np.full(n_parallel, np.nan)
+            f_oc = np.full(n_parallel, np.nan)
+            f_ic = np.full(n_parallel, np.nan)
+            expand = f_r < values[0]
+            contract_out = ~expand & (f_r >= f_kept) & (f_r < values[worst])
+            contract_in = ~expand & (f_r >= f_kept) & (f_r >= values[worst])
+            batch = np.concatenate(
+                [expansions[expand], outside[contract_out], inside[contract_in]]
+            )
+            if len(batch) > 0:
+                batch_values = np.asarray(
+                    evaluate_batch(list(batch), **batch_kwargs), dtype=float
+                )
+                nfev += len(batch)
+                n_e, n_oc = expand.sum(), contract_out.sum()
+                f_e[expand] = batch_values[:n_e]
+                f_oc[contract_out] = batch_values[n_e : n_e + n_oc]
+                f_ic[contract_in] = batch_values[n_e + n_oc :]
+
+        improved = False
+        for k, j in enumerate(worst):
+            if f_r[k] < values[0]:
+                if f_e[k] < f_r[k]:
+                    simplex[j], values[j] = expansions[k], f_e[k]
+                else:
+                    simplex[j], values[j] = reflections[k], f_r[k]
+                improved = True
+            elif f_r[k] < f_kept:
+                simplex[j], values[j] = reflections[k], f_r[k]
+                improved = True
+            elif f_r[k] < values[j]:
+                if f_oc[k] <= f_r[k]:
+                    simplex[j], values[j] = outside[k], f_oc[k]
+                    improved = True
+            elif f_ic[k] < values[j]:
+                simplex[j], values[j] = inside[k], f_ic[k]
+                improved = True
+
+        if not improved:
+            simplex[1:] = simplex[0] + delta * (simplex[1:] - simplex[0])
+            values[1:] = evaluate_batch(list(simplex[1:]))
+            nfev += n
+
+        if disp:
+            print(
+                "Iteration {}: best error {:.4e}, {} evaluations".format(
+                    nit, values.min(), nfev
+                )
+            )
+
+    order = np.argsort(values)
+    simplex, values = simplex[order], values[order]
+    message = "Optimization terminated successfully."
+    if not success:
+        message = "Maximum number of iterations has been exceeded."
+    if disp:
+        print(message)
+
+    return OptimizeResult(
+        x=simplex[0],
+        fun=values[0],
+        nit=nit,
+        nfev=nfev,
+        success=success,
+        message=message,
+        final_simplex=(simplex, values),
+    )
@@ -3,6 +3,17 @@ import sympy as sp
 
 from compute_profile_depth import automatic_vertices
 
+import inspect
+import os
+import sys
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+parent2dir = os.path.dirname(parentdir)
+sys.path.insert(0, parent2dir)
+from result_cache import cache_key, cache_restore, cache_store, cached_data, cache_data
+from run_profile import ProfiledComputation, ProfiledStepsize, RunProfile
+from solution_state import restore_checkpoint, run_with_checkpoint
+
 flux = 5.6e19
 implantation_time = 1.5e25/flux
 resting_time = 1*24*3600
@@ -19,7 +30,16 @@ width = 0.5e-9
 distribution = 1/(width*(2*3.14)**0.5) * sp.exp(-0.5*((F.x-center)/width)**2)
 
 
-def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500):
+class DerivedQuantities(ProfiledComputation, F.DerivedQuantities):
+    pass
+
+
+class Stepsize(ProfiledStepsize, F.Stepsize):
+    pass
+
+
+def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500, cache_folder=None,
+               folder_results="Results/", mesh_tolerance=None, profile=True):
     """Runs a FESTIM simulation
 
     Args:
@@ -29,10 +49,53 @@ def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500):
         k_02 (_type_): _description_
         E_p2 (_type_): _description_
         n2 (_type_): _description_
+        cache_folder (str, optional): if given, results are looked up in and
+            stored to this cache folder, see result_cache. The state at the
+            end of the resting phase is cached too, and simulations with the
+            same trap parameters restart from it whatever their mesh.
+            Defaults to None
+        folder_results (str, optional): folder of the exports and of the
+            checkpoint, one per concurrent simulation. Defaults to "Results/"
+        mesh_tolerance (float, optional): if given, the mesh is graded to
+            this tolerance, see compute_profile_depth.automatic_vertices.
+            Defaults to None
+        profile (bool, optional): write the run profile (see run_profile) to
+            folder_results + "derived_quantities/profile.json". Defaults to
+            True
 
     Returns:
         _type_: _description_
     """
+    inputs = {"E_p1": E_p1, "n1": n1, "E_p2": E_p2, "n2": n2}
+    checkpoint_time = implantation_time + resting_time
+    checkpoint_file = folder_results + "checkpoint.npz"
+    restored = False
+    if cache_folder is not None:
+        key = cache_key(
+            inputs={
+                **inputs,
+                "initial_number_cells": initial_number_cells,
+                "mesh_tolerance": mesh_tolerance,
+            },
+            source_files=[__file__, inspect.getsourcefile(automatic_vertices)]
+        )
+        data = cached_data(cache_folder, key)
+        if data is not None:
+            return data
+
+        # the checkpoint doesn't depend on the mesh, e.g. for the retries with
+        # a finer mesh
+        checkpoint_key = cache_key(
+            inputs={**inputs, "checkpoint_time": checkpoint_time},
+            source_files=[__file__]
+        )
+        restored = cache_restore(cache_folder, checkpoint_key, folder_results)
+        if not restored and os.path.exists(checkpoint_file):
+            # left by the previous simulation of this folder
+            os.remove(checkpoint_file)
+
+    my_profile = RunProfile()
+
     my_model = F.Simulation(log_level=30)
 
     # define materials
@@ -84,17 +147,19 @@ def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500):
             ])
 
     # define mesh
-    vertices = automatic_vertices(
-        r_p=center,
-        size=size,
-        mat=tungsten,
-        traps=my_model.traps.traps,
-        nb_cells=initial_number_cells,
-        T=exposure_temp,
-        implantation_time=implantation_time,
-        flux=flux
-    )
-    my_model.mesh = F.MeshFromVertices(vertices)
+    with my_profile.phase("mesh"):
+        vertices = automatic_vertices(
+            r_p=center,
+            size=size,
+            mat=tungsten,
+            traps=my_model.traps.traps,
+            nb_cells=initial_number_cells,
+            T=exposure_temp,
+            implantation_time=implantation_time,
+            flux=flux,
+            mesh_tolerance=mesh_tolerance
+        )
+        my_model.mesh = F.MeshFromVertices(vertices)
 
     # define temperature
     my_model.T = F.Temperature(
@@ -122,9 +187,10 @@ def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500):
     ]
 
     # define exports
-    my_derived_quantities = F.DerivedQuantities(
+    my_derived_quantities = DerivedQuantities(
         file="last.csv",
-        folder="Results/derived_quantities",
+        folder=folder_results + "derived_quantities",
+        profile=my_profile,
         # nb_iterations_between_exports=1,
         )
 
@@ -155,12 +221,13 @@ def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500):
     my_model.exports = my_exports
 
     # define settings
-    my_model.dt = F.Stepsize(
+    my_model.dt = Stepsize(
         1,
         stepsize_change_ratio=1.1,
         t_stop=implantation_time + resting_time*0.75,
         dt_min=1e-5,
-        stepsize_stop_max=50
+        stepsize_stop_max=50,
+        profile=my_profile
         )
 
     my_model.settings = F.Settings(
@@ -170,9 +237,34 @@ def festim_sim(E_p1, n1, E_p2, n2, initial_number_cells=500):
         transient=True
     )
 
-    my_model.initialise()
-    output = my_model.run()
-    return output["derived_quantities"]
+    with my_profile.phase("initialise"):
+        my_model.initialise()
+    write_checkpoint = cache_folder is not None and not restored
+    if restored:
+        # only the TDS is simulated
+        restore_checkpoint(my_model, checkpoint_file)
+    elif write_checkpoint:
+        os.makedirs(os.path.dirname(checkpoint_file), exist_ok=True)
+
+    try:
+        with my_profile.phase("run"):
+            run_with_checkpoint(
+                my_model,
+                checkpoint_time=checkpoint_time,
+                checkpoint_file=checkpoint_file if write_checkpoint else None
+            )
+    finally:
+        # cached even if the TDS fails, for the retry
+        if write_checkpoint and os.path.exists(checkpoint_file):
+            cache_store(cache_folder, checkpoint_key, [checkpoint_file])
+        if profile:
+            os.makedirs(folder_results + "derived_quantities", exist_ok=True)
+            my_profile.save(folder_results + "derived_quantities/profile.json")
+
+    if cache_folder is not None:
+        cache_data(cache_folder, key, my_derived_quantities.data)
+
+    return my_derived_quantities.data
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+import numpy as np
+import os
+import sys
+
+from optimisation_TDS import mean_absolute_error, simulate_tds
+
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+from parallel_optimisation import PoolEvaluator, parallel_nelder_mead
+from evaluation_database import best_simplex, lookup_evaluation, store_evaluation
+
+# DPA LEVELS FITTED JOINTLY AND INITIAL GUESSES OF THEIR TRAP DENSITIES
+initial_densities = {
+    0.001: [3.5e24, 5e23, 5e23, 1e24],
+    0.005: [5.3e24, 1.9e24, 1.0e24, 2.0e24],
+    0.023: [2.0e25, 9.5e24, 6e24, 1.7e25],
+    0.1: [4.2e25, 2.6e25, 2.0e25, 3.2e25],
+    0.23: [4.5e25, 3.4e25, 2.7e25, 3.4e25],
+    0.5: [4.7e25, 3.6e25, 3.2e25, 3.8e25],
+    2.5: [5.3e25, 4.5e25, 3.9e25, 4.2e25],
+}
+dpa_levels = list(initial_densities)
+
+# detrapping energies shared by all the dpa levels
+initial_detrapping_energies = [1.15, 1.35, 1.65, 1.85]
+
+
+def read_reference(dpa):
+    """
+    Reads the TDS of a dpa level
+
+    Args:
+        dpa (float): the dpa level
+
+    Returns:
+        numpy.ndarray: the temperatures (K)
+        numpy.ndarray: the desorption flux (D m-2 s-1)
+    """
+    data_ref = np.genfromtxt("tds_data/{}_dpa.csv".format(dpa), delimiter=",")
+    # data in D/s, needs to convert to D/(m2 s)
+    return data_ref[:, 0], data_ref[:, 1] / (12e-03 * 15e-03)
+
+
+def level_error(task):
+    """
+    Error of a single dpa level, the evaluations being stored in the database
+    of the level
+
+    Args:
+        task (tuple): the dpa level, its trap densities (m-3) and the
+            detrapping energies (eV)
+
+    Returns:
+        float: the error
+    """
+    dpa, densities, detrapping_energies = task
+    parameters = [*densities, *detrapping_energies]
+
+    # if any parameter is negative, return a very high error
+    # this is a way to artificially constrain Nelder-Mead
+    if any([e < 0 for e in parameters]):
+        return 1e30
+
+    database = level_database_file.format(dpa)
+    err = lookup_evaluation(database, parameters)
+    if err is not None:
+        return err
+
+    T_ref, desorption_ref = references[dpa]
+    simulated_desorption = simulate_tds(
+        parameters,
+        T_ref,
+        folder_results="Results/joint/dpa_{}/worker_{}/".format(dpa, os.getpid()),
+    )
+    err = mean_absolute_error(
+        desorption_ref / desorption_ref.max(),
+        simulated_desorption / desorption_ref.max(),
+        T_ref,
+    )
+    print("dpa = {}, error: {:.2e}".format(dpa, err))
+
+    store_evaluation(database, parameters, err, T=T_ref, flux=simulated_desorption)
+
+    return err
+
+
+def split_parameters(x):
+    """
+    Splits the joint parameter vector: the shared detrapping energies (eV)
+    followed by the trap densities of each dpa level, normalised by their
+    initial guess
+
+    Args:
+        x (numpy.ndarray): the joint parameters
+
+    Returns:
+        numpy.ndarray: the detrapping energies (eV)
+        numpy.ndarray: the trap densities of each dpa level (m-3), shape
+            (n_levels, 4)
+    """
+    n_energies = len(initial_detrapping_energies)
+    detrapping_energies = np.asarray(x[:n_energies])
+    densities = np.reshape(x[n_energies:], (len(dpa_levels), -1))
+    densities = densities * np.array([initial_densities[dpa] for dpa in dpa_levels])
+    return detrapping_energies, densities
+
+
+class JointEvaluator(PoolEvaluator):
+    """
+    Evaluates the joint error (mean of the errors of the dpa levels) of
+    batches of points, the simulations of all the levels of all the points
+    of a batch running concurrently in a process pool
+    """
+
+    def __init__(self, n_workers=None):
+        super().__init__(level_error, n_workers=n_workers)
+
+    def __call__(self, points):
+        tasks = []
+        for point in points:
+            detrapping_energies, densities = split_parameters(point)
+            for dpa, densities_level in zip(dpa_levels, densities):
+                tasks.append((dpa, densities_level, detrapping_energies))
+        errors = np.array(self.pool.map(self.function, tasks, chunksize=1))
+        errors = errors.reshape(len(points), len(dpa_levels)).mean(axis=1)
+
+        for point, err in zip(points, errors):
+            store_evaluation(joint_database_file, point, err)
+
+        return errors
+
+
+references = {dpa: read_reference(dpa) for dpa in dpa_levels}
+
+# DATABASES OF EVALUATED POINTS, THE OPTIMISATION RESTARTS FROM THE BEST SIMPLEX
+level_database_file = "Results/joint/dpa_{}/evaluations.sqlite"
+joint_database_file = "Results/joint/evaluations.sqlite"
+
+if __name__ == "__main__":
+    # number of simulations run concurrently
+    n_workers = 14
+
+    initial_guess = np.concatenate(
+        [initial_detrapping_energies, np.ones(4 * len(dpa_levels))]
+    )
+
+    # tolerances
+    fatol = 1e-03
+    xatol = 1e-03
+
+    # each vertex updated concurrently runs one simulation per dpa level
+    with JointEvaluator(n_workers=n_workers) as evaluate_batch:
+        res = parallel_nelder_mead(
+            evaluate_batch,
+            initial_guess,
+            initial_simplex=best_simplex(joint_database_file, len(initial_guess)),
+            n_parallel=max(1, n_workers // len(dpa_levels)),
+            xatol=xatol,
+            fatol=fatol,
+        )
+
+    detrapping_energies, densities = split_parameters(res.x)
+    print("Detrapping energies are: " + str(detrapping_energies))
+    for dpa, densities_level in zip(dpa_levels, densities):
+        print("Trap densities at {} dpa are: {}".format(dpa, densities_level))
@@ -1,9 +1,17 @@
 from scipy.interpolate import interp1d
-from scipy.optimize import minimize
 import numpy as np
+import os
+import sys
 
 from sim import festim_sim, implantation_time, resting_time, atom_density_W
 
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+from parallel_optimisation import parallel_nelder_mead, pool_evaluator
+from evaluation_database import best_simplex, lookup_evaluation, store_evaluation
+from surrogate_optimisation import surrogate_minimise
+
 
 def mean_absolute_error(y1, y2, x=None, bounds=None, weight=None):
     """computes the mean absolute error between y1 and y2
@@ -59,78 +67,78 @@ def mean_absolute_error(y1, y2, x=None, bounds=None, weight=None):
     return err
 
 
-def error(p, norms=None, restart_data=None):
-    """
-    Compute average absolute error between simulation and reference
+def tds_flux(res):
     """
-    print("-" * 40)
-    global j
-    j += 1
-    print("i = " + str(j))
-    print("New simulation.")
-    print("Point is:")
-    print(p)
-
-    # RUN FESTIM SIMULATION
-
-    # scale parameters
-    p_real = []
-    for prm, norm in zip(p, norms):
-        if norm == "linear":
-            p_real.append(prm)
-        elif norm == "log":
-            p_real.append(10**prm)
-        else:
-            raise ValueError("Unknown {} norm".format(norm))
-
-    print("Real parameters are:")
-    print(
-        "[{:.4e}, {:.4e}, {:.4e}, {:.4e}]".format(
-            p_real[0], p_real[1], p_real[2], p_real[3]
-        )
-    )
-
-    # if any parameter is negative, return a very high error
-    # this is a way to artificially constrain Nelder-Mead
-    if any([e < 0 for e in p_real]):
-        return 1e30
-
-    if restart_data is not None:
-        # try to find point in database
-        index_sim = np.where(np.all(np.isclose(restart_data[:, :-1], p_real), axis=1))
-        if len(index_sim[0]) > 0:
-            err = restart_data[index_sim][0][-1]
-            return err
-
-    # run FESTIM sim
-    try:
-        res = festim_sim(*p_real, initial_number_cells=500)
-    except ValueError:
-        print("Re-running sim with 4000 cells")
-        res = festim_sim(*p_real, initial_number_cells=4000)
+    Extracts the TDS from the derived quantities of festim_sim
 
-    # COMPUTE DIFFERENCE WITH REFERENCE
+    Args:
+        res (list): the derived quantities data, header first
 
+    Returns:
+        numpy.ndarray: the temperatures of the TDS ramp (K)
+        numpy.ndarray: the desorption flux (D m-2 s-1)
+    """
     # find the indexes of the columns based on the column name
     index_temperature = res[0].index("Average T volume 1")
     index_flux_1 = res[0].index("Flux surface 1: solute")
     index_flux_2 = res[0].index("Flux surface 2: solute")
-    res.pop(0)  # remove header
-    res = np.array(res)
+    res = np.array(res[1:])  # remove header
     times = res[:, 0]
     tds_indexes = np.where(times > implantation_time + resting_time)
 
     # retrieve temperature and desorption flux
     T = res[:, index_temperature][tds_indexes]
     flux = -(res[:, index_flux_1] + res[:, index_flux_2])[tds_indexes]
+    return T, flux
+
+
+def simulate_tds(parameters, T_values, folder_results="Results/", stop_criterion=None):
+    """
+    Runs a TDS simulation and interpolates the simulated desorption flux
+
+    Args:
+        parameters (list): the arguments of festim_sim (n1, n2, n3, n4 and
+            optionally E_p1, E_p2, E_p3, E_p4)
+        T_values (numpy.ndarray): temperatures at which the desorption flux is
+            interpolated (K)
+        folder_results (str, optional): folder of the exports. Defaults to
+            "Results/"
+        stop_criterion (callable, optional): see festim_sim. Defaults to None
+
+    Returns:
+        numpy.ndarray: the simulated desorption flux
+    """
+    try:
+        res = festim_sim(
+            *parameters,
+            initial_number_cells=500,
+            cache_folder=cache_folder,
+            folder_results=folder_results,
+            stop_criterion=stop_criterion,
+        )
+    except ValueError:
+        print("Re-running sim with 4000 cells")
+        res = festim_sim(
+            *parameters,
+            initial_number_cells=4000,
+            cache_folder=cache_folder,
+            folder_results=folder_results,
+            stop_criterion=stop_criterion,
+        )
+
+    T, flux = tds_flux(res)
 
     # interpolate simulated tds
     interp_tds = interp1d(T, flux, fill_value="extrapolate")
-    # match to reference data
-    simulated_desorption = interp_tds(T_ref)
+    # match to the requested temperatures
+    return interp_tds(T_values)
 
-    # compute error
 
+def tds_error(simulated_desorption):
+    """
+    Error between a simulated desorption flux, interpolated on T_ref, and
+    the reference
+    """
     # desorptions are normalised
     normalised_desorption_ref = desorption_ref / desorption_ref.max()
     normalised_desorption_sim = simulated_desorption / desorption_ref.max()
@@ -151,10 +159,105 @@ def error(p, norms=None, restart_data=None):
     # diff = normalised_desorption_ref - normalised_desorption_sim
     # err = (diff**2).mean()
 
+    return err
+
+
+def partial_tds_error(T, flux):
+    """
+    Lower bound of tds_error from the part of the TDS simulated so far: the
+    reference points not reached yet are counted with no error, the others
+    with their final error since the flux interpolated on them won't change
+
+    Args:
+        T (numpy.ndarray): the temperatures simulated so far (K), increasing
+        flux (numpy.ndarray): the desorption flux
+
+    Returns:
+        float: the lower bound of the error
+    """
+    simulated_desorption = np.array(desorption_ref)
+    if len(T) > 1:
+        reached = (T_ref >= T[0]) & (T_ref <= T[-1])
+        simulated_desorption[reached] = interp1d(T, flux)(T_ref[reached])
+    return tds_error(simulated_desorption)
+
+
+def error(p, norms=None, database=None, bound=None):
+    """
+    Compute average absolute error between simulation and reference.
+
+    If bound is given, the simulation stops as soon as the error is known to
+    exceed it (see parallel_nelder_mead early_termination) and the lower bound
+    of the error is returned instead, without being stored in the database.
+    """
+    print("-" * 40)
+    print("New simulation.")
+    print("Point is:")
+    print(p)
+
+    # RUN FESTIM SIMULATION
+
+    # scale parameters
+    p_real = []
+    for prm, norm in zip(p, norms):
+        if norm == "linear":
+            p_real.append(prm)
+        elif norm == "log":
+            p_real.append(10**prm)
+        else:
+            raise ValueError("Unknown {} norm".format(norm))
+
+    print("Real parameters are:")
+    print(
+        "[{:.4e}, {:.4e}, {:.4e}, {:.4e}]".format(
+            p_real[0], p_real[1], p_real[2], p_real[3]
+        )
+    )
+
+    # if any parameter is negative, return a very high error
+    # this is a way to artificially constrain Nelder-Mead
+    if any([e < 0 for e in p_real]):
+        return 1e30
+
+    if database is not None:
+        # the point may have been evaluated before a restart
+        err = lookup_evaluation(database, p)
+        if err is not None:
+            print("Found in database, error: {:.2e}".format(err))
+            return err
+
+    stopped = []
+
+    def stop_criterion(data):
+        # nothing to compare before the TDS ramp
+        if data[-1][0] <= implantation_time + resting_time:
+            return False
+        lower_bound = partial_tds_error(*tds_flux(data))
+        if lower_bound > bound:
+            stopped.append(lower_bound)
+            return True
+        return False
+
+    # run FESTIM sim, in a folder per worker process
+    simulated_desorption = simulate_tds(
+        p_real,
+        T_ref,
+        folder_results="Results/worker_{}/".format(os.getpid()),
+        stop_criterion=None if bound is None else stop_criterion,
+    )
+
+    if stopped:
+        print("Stopped early, error > {:.2e}".format(stopped[0]))
+        return stopped[0]
+
+    # compute error
+    err = tds_error(simulated_desorption)
+
     # print error
     print("Error: {:.2e}".format(err))
-    print("Absolute tolerance: {:.2e}".format(fatol))
-    print("Absolute tolerance: {:.2e}".format(xatol))
+
+    if database is not None:
+        store_evaluation(database, p, err, T=T_ref, flux=simulated_desorption)
 
     # add parameters and error to csv file
     # with open("simulations_results_scaled.csv", "a") as f:
@@ -171,19 +274,21 @@ def error(p, norms=None, restart_data=None):
 
 # READ REFERENCE DATA
 
-data_ref = np.genfromtxt("tds_data/0.5_dpa.csv", delimiter=",")
+dpa = 0.5
+data_ref = np.genfromtxt("tds_data/{}_dpa.csv".format(dpa), delimiter=",")
 T_ref = data_ref[:, 0]
 # data in D/s, needs to convert to D/(m2 s)
 desorption_ref = data_ref[:, 1] / (12e-03 * 15e-03)
 
 
-# LOAD EARLIER RESULTS FOR RESTART
-data_earlier = None  # np.genfromtxt('simulations_results.csv', delimiter=',')
+# DATABASE OF EVALUATED POINTS, THE OPTIMISATION RESTARTS FROM ITS BEST SIMPLEX
+# one per reference data, the errors depending on it
+database_file = "Results/dpa_{}/evaluations.sqlite".format(dpa)
 
-if __name__ == "__main__":
-    # initialise counter j
-    j = 0
+# CACHE OF SIMULATION RESULTS, SEE result_cache
+cache_folder = "Results/cache/"
 
+if __name__ == "__main__":
     # build initial guess
     n1 = 4.9e25
     n2 = 3.6e25
@@ -198,37 +303,38 @@ if __name__ == "__main__":
     fatol = 1e-03
     xatol = 1e-03
 
-    # recursive minimise function, useful for restart
-    def minimise_with_neldermead(ftol, xtol, initial_guess):
-        global fatol
-        global xatol
-        fatol = ftol
-        xatol = xtol
-        res = minimize(
-            error,
-            initial_guess,
-            args=(norms, data_earlier),
-            method="Nelder-Mead",
-            options={"disp": True, "fatol": ftol, "xatol": xtol},
-        )
-        print("Solution is: " + str(res.x))
-        goon = True
-        while goon:
-            a = input("Do you wish to restart ?")
-            if a == "no" or a == "No":
-                goon = False
-            elif a == "Yes" or a == "yes":
-                new_fatol = fatol
-                new_xatol = xatol
-                b = input("Choose fatol :")
-                if b != "":
-                    new_fatol = float(b)
-                c = input("Choose xatol :")
-                if c != "":
-                    new_xatol = float(c)
-                # FIXME I doubt that this will work with more that 2 parameters
-                initial_guess = np.array([res.x[0], res.x[1]])
-                minimise_with_neldermead(new_fatol, new_xatol, initial_guess)
-
-    # start optimising!
-    minimise_with_neldermead(fatol, xatol, initial_guess)
+    # number of simulations run concurrently
+    n_workers = 4
+
+    # fit a surrogate of the simulated TDS and only simulate its minima,
+    # instead of the Nelder-Mead simplex
+    use_surrogate = False
+    # search space of the surrogate: trap densities from 0 to 1e26 m-3
+    surrogate_bounds = [(0, 1e26)] * len(initial_guess)
+
+    with pool_evaluator(
+        error, n_workers=n_workers, norms=norms, database=database_file
+    ) as evaluate_batch:
+        if use_surrogate:
+            res = surrogate_minimise(
+                evaluate_batch,
+                tds_error,
+                database_file,
+                initial_guess,
+                bounds=surrogate_bounds,
+                n_candidates=n_workers,
+                fatol=fatol,
+            )
+        else:
+            # up to n_workers vertices of the simplex are updated concurrently
+            res = parallel_nelder_mead(
+                evaluate_batch,
+                initial_guess,
+                initial_simplex=best_simplex(database_file, len(initial_guess)),
+                n_parallel=min(n_workers, len(initial_guess) - 1),
+                xatol=xatol,
+                fatol=fatol,
+                # simulations stop once worse than the worst vertex
+                early_termination=True,
+            )
+    print("Solution is: " + str(res.x))
@@ -2,6 +2,22 @@ import sympy as sp
 from compute_profile_depth import automatic_vertices
 import FESTIM as F
 import numpy as np
+import inspect
+import os
+import sys
+
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+parent2dir = os.path.dirname(parentdir)
+sys.path.insert(0, parent2dir)
+from result_cache import cache_key, cache_restore, cache_store, cached_data, cache_data
+from solution_state import restore_checkpoint, run_with_checkpoint
+from run_profile import (
+    ProfiledComputation,
+    ProfiledExport,
+    ProfiledStepsize,
+    RunProfile,
+)
 
 fluence = 1.5e25
 implantation_time = 72 * 3600
@@ -15,7 +31,34 @@ size = 8e-04
 atom_density_W = 6.3222e28
 
 
-def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
+class DerivedQuantities(ProfiledComputation, F.DerivedQuantities):
+    pass
+
+
+class XDMFExport(ProfiledExport, F.XDMFExport):
+    pass
+
+
+class Stepsize(ProfiledStepsize, F.Stepsize):
+    pass
+
+
+def festim_sim(
+    n1=1,
+    n2=1,
+    n3=1,
+    n4=1,
+    E_p1=1.15,
+    E_p2=1.35,
+    E_p3=1.65,
+    E_p4=1.85,
+    initial_number_cells=500,
+    cache_folder=None,
+    folder_results="Results/",
+    stop_criterion=None,
+    mesh_tolerance=None,
+    profile=True,
+):
     """Runs a FESTIM simulation
 
     Args:
@@ -24,17 +67,71 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
         E_p2 (_type_): _description_
         n2 (_type_): _description_
         initial
+        cache_folder (str, optional): if given, results are looked up in and
+            stored to this cache folder, see result_cache. The state at the
+            end of the resting phase is cached too, and simulations with the
+            same trap parameters restart from it whatever their mesh.
+            Defaults to None
+        folder_results (str, optional): folder of the exports, one per
+            concurrent simulation. Defaults to "Results/"
+        stop_criterion (callable, optional): called with the derived
+            quantities data after each time step, the simulation stops when it
+            returns True. Stopped simulations are not cached. Defaults to None
+        mesh_tolerance (float, optional): if given, the mesh is graded to
+            this tolerance, see compute_profile_depth.automatic_vertices.
+            Defaults to None
+        profile (bool, optional): write the run profile (see run_profile) to
+            folder_results + "profile.json". Defaults to True
 
     Returns:
         _type_: _description_
     """
+    inputs = {
+        "n1": n1,
+        "n2": n2,
+        "n3": n3,
+        "n4": n4,
+        "E_p1": E_p1,
+        "E_p2": E_p2,
+        "E_p3": E_p3,
+        "E_p4": E_p4,
+    }
+    checkpoint_time = implantation_time + resting_time
+    checkpoint_file = folder_results + "checkpoint.npz"
+    restored = False
+    if cache_folder is not None:
+        key = cache_key(
+            inputs={
+                **inputs,
+                "initial_number_cells": initial_number_cells,
+                "mesh_tolerance": mesh_tolerance,
+            },
+            source_files=[__file__, inspect.getsourcefile(automatic_vertices)],
+        )
+        data = cached_data(cache_folder, key)
+        if data is not None:
+            return data
+
+        # the checkpoint doesn't depend on the mesh, e.g. for the retries with
+        # a finer mesh
+        checkpoint_key = cache_key(
+            inputs={**inputs, "checkpoint_time": checkpoint_time},
+            source_files=[__file__],
+        )
+        restored = cache_restore(cache_folder, checkpoint_key, folder_results)
+        if not restored and os.path.exists(checkpoint_file):
+            # left by the previous simulation of this folder
+            os.remove(checkpoint_file)
+
+    my_profile = RunProfile()
+
     r = 0
     center = 0.7e-9
     width = 0.5e-9
     distribution = (
         1 / (width * (2 * 3.14) ** 0.5) * sp.exp(-0.5 * ((F.x - center) / width) ** 2)
     )
- 
+
     my_model = F.Simulation(log_level=30)
 
     # define materials
@@ -61,7 +158,7 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
                 k_0=4.1e-7 / (1.1e-10**2 * 6 * atom_density_W),
                 E_k=0.39,
                 p_0=1e13,
-                E_p=1.15,
+                E_p=E_p1,
                 density=n1 / (1 + sp.exp((F.x - 3e-06) / 5e-07)),
                 materials=tungsten,
             ),
@@ -69,7 +166,7 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
                 k_0=4.1e-7 / (1.1e-10**2 * 6 * atom_density_W),
                 E_k=0.39,
                 p_0=1e13,
-                E_p=1.35,
+                E_p=E_p2,
                 density=n2 / (1 + sp.exp((F.x - 3e-06) / 5e-07)),
                 materials=tungsten,
             ),
@@ -77,7 +174,7 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
                 k_0=4.1e-7 / (1.1e-10**2 * 6 * atom_density_W),
                 E_k=0.39,
                 p_0=1e13,
-                E_p=1.65,
+                E_p=E_p3,
                 density=n3 / (1 + sp.exp((F.x - 3e-06) / 5e-07)),
                 materials=tungsten,
             ),
@@ -85,7 +182,7 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
                 k_0=2.4e-7 / (1.1e-10**2 * 6 * atom_density_W),
                 E_k=0.39,
                 p_0=1e13,
-                E_p=1.85,
+                E_p=E_p4,
                 density=n4 / (1 + sp.exp((F.x - 3e-06) / 5e-07)),
                 materials=tungsten,
             ),
@@ -93,17 +190,19 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
     )
 
     # define mesh
-    vertices = automatic_vertices(
-        r_p=center,
-        size=size,
-        mat=tungsten,
-        traps=my_model.traps.traps,
-        nb_cells=initial_number_cells,
-        T=exposure_temp,
-        implantation_time=implantation_time,
-        flux=flux,
-    )
-    my_model.mesh = F.MeshFromVertices(vertices)
+    with my_profile.phase("mesh"):
+        vertices = automatic_vertices(
+            r_p=center,
+            size=size,
+            mat=tungsten,
+            traps=my_model.traps.traps,
+            nb_cells=initial_number_cells,
+            T=exposure_temp,
+            implantation_time=implantation_time,
+            flux=flux,
+            mesh_tolerance=mesh_tolerance,
+        )
+        my_model.mesh = F.MeshFromVertices(vertices)
 
     # define temperature
     my_model.T = F.Temperature(
@@ -128,9 +227,9 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
     ]
 
     # define exports
-    folder_results = "Results/"
-    my_derived_quantities = F.DerivedQuantities(
+    my_derived_quantities = DerivedQuantities(
         filename=folder_results + "last.csv",
+        profile=my_profile,
     )
 
     average_T = F.AverageVolume("T", volume=1)
@@ -158,47 +257,54 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
 
     my_exports = F.Exports(
         [
-            F.XDMFExport(
+            XDMFExport(
                 "solute",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
-            F.XDMFExport(
+            XDMFExport(
                 "retention",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
-            F.XDMFExport(
+            XDMFExport(
                 "1",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
-            F.XDMFExport(
+            XDMFExport(
                 "2",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
-            F.XDMFExport(
+            XDMFExport(
                 "3",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
-            F.XDMFExport(
+            XDMFExport(
                 "4",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
-            F.XDMFExport(
+            XDMFExport(
                 "5",
                 folder=folder_results,
                 checkpoint=False,
                 mode=1,
+                profile=my_profile,
             ),
             my_derived_quantities,
         ]
@@ -206,12 +312,13 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
     my_model.exports = my_exports
 
     # define settings
-    my_model.dt = F.Stepsize(
+    my_model.dt = Stepsize(
         1,
         stepsize_change_ratio=1.1,
         t_stop=implantation_time + resting_time * 0.5,
         dt_min=1e-4,
         stepsize_stop_max=50,
+        profile=my_profile,
     )
 
     my_model.settings = F.Settings(
@@ -223,8 +330,38 @@ def festim_sim(n1=1, n2=1, n3=1, n4=1, initial_number_cells=500):
         # linear_solver="mumps",
     )
 
-    my_model.initialise()
-    my_model.run()
+    with my_profile.phase("initialise"):
+        my_model.initialise()
+    write_checkpoint = cache_folder is not None and not restored
+    if restored:
+        # only the TDS is simulated
+        restore_checkpoint(my_model, checkpoint_file)
+    elif write_checkpoint:
+        os.makedirs(folder_results, exist_ok=True)
+
+    check_results = None
+    if stop_criterion is not None:
+        check_results = lambda: stop_criterion(my_derived_quantities.data)
+
+    try:
+        with my_profile.phase("run"):
+            completed = run_with_checkpoint(
+                my_model,
+                checkpoint_time=checkpoint_time,
+                checkpoint_file=checkpoint_file if write_checkpoint else None,
+                stop_criterion=check_results,
+            )
+    finally:
+        # cached even if the TDS fails, for the retry
+        if write_checkpoint and os.path.exists(checkpoint_file):
+            cache_store(cache_folder, checkpoint_key, [checkpoint_file])
+        if profile:
+            os.makedirs(folder_results, exist_ok=True)
+            my_profile.save(folder_results + "profile.json")
+
+    if cache_folder is not None and completed:
+        cache_data(cache_folder, key, my_derived_quantities.data)
+
     return my_derived_quantities.data
 
 
@@ -0,0 +1,221 @@
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+from scipy.optimize import OptimizeResult, minimize
+from scipy.stats import qmc
+
+from evaluation_database import load_evaluations, lookup_evaluation
+
+
+class TDSSurrogate:
+    """
+    Cheap model of the simulated TDS as a function of the fitted parameters.
+    The spectra are compressed by principal component analysis and the
+    coefficients of the retained components are interpolated with radial
+    basis functions.
+
+    Args:
+        points (numpy.ndarray): evaluated parameters, shape
+            (n_points, n_parameters)
+        fluxes (numpy.ndarray): simulated desorption fluxes, shape
+            (n_points, n_temperatures)
+        lower (numpy.ndarray): lower bounds of the parameters, used to
+            normalise them
+        upper (numpy.ndarray): upper bounds of the parameters
+        variance (float, optional): fraction of the variance of the spectra
+            kept by the principal components. Defaults to 0.999
+        smoothing (float, optional): smoothing of the RBF interpolant, 0
+            interpolates the evaluated spectra exactly. Defaults to 0
+    """
+
+    def __init__(self, points, fluxes, lower, upper, variance=0.999, smoothing=0):
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+
+        self.mean = fluxes.mean(axis=0)
+        _, singular_values, components = np.linalg.svd(
+            fluxes - self.mean, full_matrices=False
+        )
+        energy = singular_values**2
+        if energy.sum() > 0:
+            ratio = np.cumsum(energy) / energy.sum()
+            n_components = np.searchsorted(ratio, variance) + 1
+        else:
+            n_components = 1
+        self.components = components[:n_components]
+
+        coefficients = (fluxes - self.mean) @ self.components.T
+        self.interpolant = RBFInterpolator(
+            self.normalise(points),
+            coefficients,
+            kernel="thin_plate_spline",
+            smoothing=smoothing,
+        )
+
+    def normalise(self, points):
+        return (np.asarray(points) - self.lower) / (self.upper - self.lower)
+
+    def __call__(self, points):
+        """
+        Predicted desorption fluxes
+
+        Args:
+            points (array_like): parameters, shape (n_points, n_parameters)
+
+        Returns:
+            numpy.ndarray: the fluxes, shape (n_points, n_temperatures)
+        """
+        coefficients = self.interpolant(self.normalise(np.atleast_2d(points)))
+        return self.mean + coefficients @ self.components
+
+
+def surrogate_minimise(
+    evaluate_batch,
+    error_from_flux,
+    database_file,
+    x0,
+    bounds=None,
+    relative_bounds=0.5,
+    n_initial=None,
+    n_candidates=4,
+    min_distance=1e-03,
+    fatol=1e-04,
+    patience=3,
+    max_evaluations=200,
+    seed=0,
+    disp=True,
+):
+    """
+    Surrogate-assisted minimisation. A TDSSurrogate is fitted to the spectra
+    of the evaluation database, and its minima, found from the best
+    evaluated points, are the only candidates simulated. The new spectra are
+    added to the database and the surrogate is refitted, until the
+    candidates no longer improve the best error or are too close to
+    evaluated points.
+
+    evaluate_batch must store its evaluations in database_file (see
+    optimisation_TDS.error), the surrogate being fitted from the database.
+
+    Args:
+        evaluate_batch (callable): returns the errors of a list of points,
+            e.g. a parallel_optimisation.PoolEvaluator
+        error_from_flux (callable): error of a desorption flux, e.g.
+            optimisation_TDS.tds_error
+        database_file (str): path to the sqlite evaluation database
+        x0 (array_like): initial guess
+        bounds (list, optional): (lower, upper) bounds of each parameter,
+            the candidates being searched within them. Defaults to
+            x0 * (1 -/+ relative_bounds)
+        relative_bounds (float, optional): see bounds. Defaults to 0.5
+        n_initial (int, optional): number of points of the initial design
+            (x0 and a latin hypercube), used if the database holds fewer
+            points. The design points already in the database are not
+            simulated again. Defaults to 2 * (len(x0) + 1)
+        n_candidates (int, optional): maximum number of points simulated per
+            iteration, e.g. the number of workers. Defaults to 4
+        min_distance (float, optional): candidates closer than this to an
+            evaluated point (in parameters normalised by the bounds) are not
+            simulated. Defaults to 1e-03
+        fatol (float, optional): improvement of the best error below which an
+            iteration is unsuccessful. Defaults to 1e-04
+        patience (int, optional): number of successive unsuccessful
+            iterations before stopping. Defaults to 3
+        max_evaluations (int, optional): maximum number of simulations.
+            Defaults to 200
+        seed (int, optional): seed of the initial design. Defaults to 0
+        disp (bool, optional): print the progress. Defaults to True
+
+    Returns:
+        scipy.optimize.OptimizeResult: the result, with the fields x, fun,
+            nit, nfev (number of simulations), success and message
+    """
+    x0 = np.asarray(x0, dtype=float)
+    n = len(x0)
+    if bounds is None:
+        bounds = np.sort(
+            [x0 * (1 - relative_bounds), x0 * (1 + relative_bounds)], axis=0
+        ).T
+    lower, upper = np.asarray(bounds, dtype=float).T
+    if n_initial is None:
+        n_initial = 2 * (n + 1)
+
+    points, errors, _ = load_evaluations(database_file, n)
+    nfev = 0
+    if len(points) < n_initial:
+        # the same design for a given seed, so that a restarted fit completes
+        # it
+        design = qmc.LatinHypercube(d=n, seed=seed).random(n_initial - 1)
+        design = np.concatenate([[x0], qmc.scale(design, lower, upper)])
+        missing = [x for x in design if lookup_evaluation(database_file, x) is None]
+        if len(missing) > 0:
+            evaluate_batch(missing)
+            nfev += len(missing)
+
+    best_error = np.inf
+    n_unsuccessful = 0
+    nit = 0
+    success = False
+    message = "Maximum number of evaluations has been exceeded."
+    while nfev < max_evaluations:
+        nit += 1
+        points, errors, fluxes = load_evaluations(database_file, n)
+        surrogate = TDSSurrogate(points, fluxes, lower, upper)
+
+        def predicted_error(x_normalised):
+            x = lower + x_normalised * (upper - lower)
+            return error_from_flux(surrogate(x)[0])
+
+        # minima of the surrogate, starting from the best evaluated points
+        evaluated = surrogate.normalise(points)
+        candidates = []
+        for start in evaluated[np.argsort(errors)]:
+            res = minimize(
+                predicted_error,
+                np.clip(start, 0, 1),
+                method="Nelder-Mead",
+                bounds=[(0, 1)] * n,
+                options={"xatol": min_distance, "fatol": fatol / 10},
+            )
+            known = np.concatenate([evaluated, np.reshape(candidates, (-1, n))])
+            if np.min(np.linalg.norm(known - res.x, axis=1)) > min_distance:
+                candidates.append(res.x)
+            if len(candidates) == n_candidates:
+                break
+
+        if len(candidates) == 0:
+            success = True
+            message = "The surrogate minima have all been simulated."
+            break
+
+        candidates = [lower + x * (upper - lower) for x in candidates]
+        new_errors = np.asarray(evaluate_batch(candidates), dtype=float)
+        nfev += len(candidates)
+
+        if min(errors.min(), new_errors.min()) < best_error - fatol:
+            n_unsuccessful = 0
+        else:
+            n_unsuccessful += 1
+        best_error = min(best_error, errors.min(), new_errors.min())
+        if disp:
+            print(
+                "Iteration {}: {} candidates simulated, best error {:.4e}".format(
+                    nit, len(candidates), best_error
+                )
+            )
+        if n_unsuccessful >= patience:
+            success = True
+            message = "The best error no longer improves."
+            break
+
+    points, errors, _ = load_evaluations(database_file, n)
+    best = np.argmin(errors)
+    if disp:
+        print(message)
+
+    return OptimizeResult(
+        x=points[best],
+        fun=errors[best],
+        nit=nit,
+        nfev=nfev,
+        success=success,
+        message=message,
+    )
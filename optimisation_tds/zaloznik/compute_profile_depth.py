@@ -1,8 +1,16 @@
 import numpy as np
 from FESTIM import k_B
+import os
+import sys
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+parent2dir = os.path.dirname(parentdir)
+sys.path.insert(0, parent2dir)
+from graded_mesh import graded_vertices
 
 
-def automatic_vertices(r_p, size, mat, traps, nb_cells, T, implantation_time, flux):
+def automatic_vertices(r_p, size, mat, traps, nb_cells, T, implantation_time, flux,
+                       mesh_tolerance=None):
     """Generates an array of vertices for the TDS simulation
 
     Args:
@@ -14,6 +22,9 @@ def automatic_vertices(r_p, size, mat, traps, nb_cells, T, implantation_time, fl
         T (float): implantation temperature
         implantation_time (float): implantation time
         flux (float): implantation flux
+        mesh_tolerance (float, optional): if given, the mesh is graded to
+            this relative interpolation error of the predicted retention
+            profile, see graded_mesh.graded_vertices. Defaults to None
 
     Returns:
         numpy.array: the mesh vertices
@@ -28,6 +39,14 @@ def automatic_vertices(r_p, size, mat, traps, nb_cells, T, implantation_time, fl
     ks = k_0s*np.exp(-E_ks/k_B/T)
     cmax = r_p*flux/D
     max_penetration_depth = r_p + r_d(cmax, implantation_time, D, ns, ks, ps)
+
+    if mesh_tolerance is not None:
+        return graded_vertices(
+            r_p=r_p, depth=max_penetration_depth, size=size, c_max=cmax,
+            densities=lambda x: np.array(
+                [[trap.density[0](x_i) for x_i in x] for trap in traps]),
+            k=ks, p=ps, tolerance=mesh_tolerance, h_max=size/nb_cells)
+
     print("The estimated maximum penetration depth is: {:.2e} m".format(max_penetration_depth))
     dx = 3e-6/300
     tolerance = 1.6
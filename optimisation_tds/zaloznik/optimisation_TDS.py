@@ -1,10 +1,18 @@
 import csv
 from scipy.interpolate import interp1d
-from scipy.optimize import minimize
 import numpy as np
+import os
+import sys
 
 from sim import festim_sim, implantation_time, resting_time, atom_density_W
 
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+from parallel_optimisation import parallel_nelder_mead, pool_evaluator
+from evaluation_database import best_simplex, lookup_evaluation, store_evaluation
+from surrogate_optimisation import surrogate_minimise
+
 
 def mean_absolute_error(y1, y2, x=None, bounds=None, weight=None):
     """computes the mean absolute error between y1 and y2
@@ -60,14 +68,31 @@ def mean_absolute_error(y1, y2, x=None, bounds=None, weight=None):
     return err
 
 
-def error(p, scaling_factors=None, restart_data=None):
+def tds_error(simulated_desorption):
+    '''
+    Error between a simulated desorption flux, interpolated on T_ref, and
+    the reference
+    '''
+    # desorptions are normalised
+    normalised_desorption_ref = desorption_ref/desorption_ref.max()
+    normalised_desorption_sim = simulated_desorption/desorption_ref.max()
+
+    err = mean_absolute_error(
+        normalised_desorption_ref, normalised_desorption_sim, T_ref,
+        bounds=[[550, 600], [770, 810]], weight=[5, 10]
+    )
+    # uncomment to compute MSE
+    # diff = normalised_desorption_ref - normalised_desorption_sim
+    # err = (diff**2).mean()
+
+    return err
+
+
+def error(p, scaling_factors=None, database=None):
     '''
     Compute average absolute error between simulation and reference
     '''
     print('-' * 40)
-    global j
-    j += 1
-    print('i = ' + str(j))
     print('New simulation.')
     print('Point is:')
     print(p)
@@ -88,24 +113,26 @@ def error(p, scaling_factors=None, restart_data=None):
         raise ValueError("scaling_factors doesn't have the same length as p")
     p_real = [prm*factor for prm, factor in zip(p, scaling_factors)]
 
-    if restart_data is not None:
-        # try to find point in database
-        index_sim = np.where(
-            np.all(
-                np.isclose(restart_data[:, :-1], p_real),
-                axis=1
-                )
-            )
-        if len(index_sim[0]) > 0:
-            err = restart_data[index_sim][0][-1]
+    if database is not None:
+        # the point may have been evaluated before a restart
+        err = lookup_evaluation(database, p)
+        if err is not None:
+            print("Found in database, error: {:.2e}".format(err))
             return err
 
-    # run FESTIM sim
+    # run FESTIM sim, in a folder per worker process
+    folder_results = "Results/worker_{}/".format(os.getpid())
     try:
-        res = festim_sim(*p_real, initial_number_cells=1500)
+        res = festim_sim(
+            *p_real, initial_number_cells=1500, cache_folder=cache_folder,
+            folder_results=folder_results
+        )
     except ValueError:
         print("Re-running sim with 4000 cells")
-        res = festim_sim(*p_real, initial_number_cells=4000)
+        res = festim_sim(
+            *p_real, initial_number_cells=4000, cache_folder=cache_folder,
+            folder_results=folder_results
+        )
 
     # COMPUTE DIFFERENCE WITH REFERENCE
 
@@ -128,30 +155,21 @@ def error(p, scaling_factors=None, restart_data=None):
     simulated_desorption = interp_tds(T_ref)
 
     # compute error
-
-    # desorptions are normalised
-    normalised_desorption_ref = desorption_ref/desorption_ref.max()
-    normalised_desorption_sim = simulated_desorption/desorption_ref.max()
-
-    err = mean_absolute_error(
-        normalised_desorption_ref, normalised_desorption_sim, T_ref,
-        bounds=[[550, 600], [770, 810]], weight=[5, 10]
-    )
-    # uncomment to compute MSE
-    # diff = normalised_desorption_ref - normalised_desorption_sim
-    # err = (diff**2).mean()
+    err = tds_error(simulated_desorption)
 
     # print error
     print('Error: {:.2e}'.format(err))
-    print('Absolute tolerance: {:.2e}'.format(fatol))
-    print('Absolute tolerance: {:.2e}'.format(xatol))
 
-    # add parameters and error to csv file
-    with open('simulations_results_scaled.csv', 'a') as f:
+    if database is not None:
+        store_evaluation(database, p, err, T=T_ref, flux=simulated_desorption)
+
+    # add parameters and error to the csv files of the worker
+    os.makedirs(folder_results, exist_ok=True)
+    with open(folder_results + 'simulations_results_scaled.csv', 'a') as f:
         writer = csv.writer(f, lineterminator='\n', delimiter=',')
         writer.writerow([*p, err])
 
-    with open('simulations_results.csv', 'a') as f:
+    with open(folder_results + 'simulations_results.csv', 'a') as f:
         writer = csv.writer(f, lineterminator='\n', delimiter=',')
         writer.writerow([*p_real, err])
 
@@ -171,13 +189,14 @@ T_ref = data_ref[:, 0]
 desorption_ref = data_ref[:, 1]
 
 
-# LOAD EARLIER RESULTS FOR RESTART
-data_earlier = None  # np.genfromtxt('simulations_results.csv', delimiter=',')
+# DATABASE OF EVALUATED POINTS, THE OPTIMISATION RESTARTS FROM ITS BEST SIMPLEX
+# one per reference data, the errors depending on it
+database_file = "Results/{}_damaged/evaluations.sqlite".format(data_to_use)
 
-if __name__ == "__main__":
-    # initialise counter j
-    j = 0
+# CACHE OF SIMULATION RESULTS, SEE result_cache
+cache_folder = "Results/cache/"
 
+if __name__ == "__main__":
     # build initial guess
     # k_01 = 1
     E_p1 = 1
@@ -203,34 +222,37 @@ if __name__ == "__main__":
     fatol = 1e-02
     xatol = 1e-02
 
-    # recursive minimise function, useful for restart
-    def minimise_with_neldermead(ftol, xtol, initial_guess):
-        global fatol
-        global xatol
-        fatol = ftol
-        xatol = xtol
-        res = minimize(
-            error, initial_guess, args=(scaling_factors, data_earlier),
-            method='Nelder-Mead',
-            options={'disp': True, 'fatol': ftol, 'xatol': xtol})
-        print('Solution is: ' + str(res.x))
-        goon = True
-        while goon:
-            a = input('Do you wish to restart ?')
-            if a == 'no' or a == 'No':
-                goon = False
-            elif a == 'Yes' or a == 'yes':
-                new_fatol = fatol
-                new_xatol = xatol
-                b = input('Choose fatol :')
-                if b != '':
-                    new_fatol = float(b)
-                c = input('Choose xatol :')
-                if c != '':
-                    new_xatol = float(c)
-                # FIXME I doubt that this will work with more that 2 parameters
-                initial_guess = np.array([res.x[0], res.x[1]])
-                minimise_with_neldermead(new_fatol, new_xatol, initial_guess)
-
-    # start optimising!
-    minimise_with_neldermead(fatol, xatol, initial_guess)
+    # number of simulations run concurrently
+    n_workers = 4
+
+    # fit a surrogate of the simulated TDS and only simulate its minima,
+    # instead of the Nelder-Mead simplex
+    use_surrogate = False
+    # search space of the surrogate (scaled parameters): detrapping energies
+    # within 30% of the scaling factors, densities up to 3 times them
+    surrogate_bounds = [(0.7, 1.3), (0, 3), (0, 3), (0.7, 1.3), (0, 3), (0, 3)]
+
+    with pool_evaluator(
+        error, n_workers=n_workers, scaling_factors=scaling_factors, database=database_file
+    ) as evaluate_batch:
+        if use_surrogate:
+            res = surrogate_minimise(
+                evaluate_batch,
+                tds_error,
+                database_file,
+                initial_guess,
+                bounds=surrogate_bounds,
+                n_candidates=n_workers,
+                fatol=fatol,
+            )
+        else:
+            # up to n_workers vertices of the simplex are updated concurrently
+            res = parallel_nelder_mead(
+                evaluate_batch,
+                initial_guess,
+                initial_simplex=best_simplex(database_file, len(initial_guess)),
+                n_parallel=min(n_workers, len(initial_guess) - 1),
+                xatol=xatol,
+                fatol=fatol,
+            )
+    print("Solution is: " + str(res.x))
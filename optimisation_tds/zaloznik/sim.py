@@ -3,6 +3,17 @@ import sympy as sp
 
 from compute_profile_depth import automatic_vertices
 
+import inspect
+import os
+import sys
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+parent2dir = os.path.dirname(parentdir)
+sys.path.insert(0, parent2dir)
+from result_cache import cache_key, cached_data, cache_data
+from run_profile import (
+    ProfiledComputation, ProfiledExport, ProfiledStepsize, RunProfile)
+
 flux = 2.6e19
 implantation_time = 1.3e25/flux
 resting_time = 1*24*3600
@@ -21,17 +32,56 @@ distribution = 1/(width*(2*3.14)**0.5) * sp.exp(-0.5*((F.x-center)/width)**2)
 # ##### NEED TO FIND THESE ##### #
 
 
-def festim_sim(E_p1, n1, initial_number_cells=500):
+class DerivedQuantities(ProfiledComputation, F.DerivedQuantities):
+    pass
+
+
+class XDMFExport(ProfiledExport, F.XDMFExport):
+    pass
+
+
+class Stepsize(ProfiledStepsize, F.Stepsize):
+    pass
+
+
+def festim_sim(E_p1, n1, initial_number_cells=500, cache_folder=None,
+               folder_results="Results/", mesh_tolerance=None, profile=True):
     """Runs a FESTIM simulation
 
     Args:
         k_01 (float, list): trapping rate pre-exponential factor (m3/s)
         E_p1 (float, list): trapping rate actiavtion energy (eV)
         n1 (float, list): trap density (m-3)
+        cache_folder (str, optional): if given, results are looked up in and
+            stored to this cache folder, see result_cache. Defaults to None
+        folder_results (str, optional): folder of the exports, one per
+            concurrent simulation. Defaults to "Results/"
+        mesh_tolerance (float, optional): if given, the mesh is graded to
+            this tolerance, see compute_profile_depth.automatic_vertices.
+            Defaults to None
+        profile (bool, optional): write the run profile (see run_profile) to
+            folder_results + "derived_quantities/profile.json". Defaults to
+            True
 
     Returns:
         .XDMF file: Simulation outputs
     """
+    if cache_folder is not None:
+        key = cache_key(
+            inputs={
+                "E_p1": E_p1,
+                "n1": n1,
+                "initial_number_cells": initial_number_cells,
+                "mesh_tolerance": mesh_tolerance,
+            },
+            source_files=[__file__, inspect.getsourcefile(automatic_vertices)]
+        )
+        data = cached_data(cache_folder, key)
+        if data is not None:
+            return data
+
+    my_profile = RunProfile()
+
     my_model = F.Simulation(log_level=30)
 
     # define materials
@@ -76,17 +126,19 @@ def festim_sim(E_p1, n1, initial_number_cells=500):
             ])
 
     # define mesh
-    vertices = automatic_vertices(
-        r_p=center,
-        size=size,
-        mat=tungsten,
-        traps=my_model.traps.traps,
-        nb_cells=initial_number_cells,
-        T=exposure_temp,
-        implantation_time=implantation_time,
-        flux=flux
-    )
-    my_model.mesh = F.MeshFromVertices(vertices)
+    with my_profile.phase("mesh"):
+        vertices = automatic_vertices(
+            r_p=center,
+            size=size,
+            mat=tungsten,
+            traps=my_model.traps.traps,
+            nb_cells=initial_number_cells,
+            T=exposure_temp,
+            implantation_time=implantation_time,
+            flux=flux,
+            mesh_tolerance=mesh_tolerance
+        )
+        my_model.mesh = F.MeshFromVertices(vertices)
 
     # define temperature
     my_model.T = F.Temperature(
@@ -114,9 +166,10 @@ def festim_sim(E_p1, n1, initial_number_cells=500):
     ]
 
     # define exports
-    my_derived_quantities = F.DerivedQuantities(
+    my_derived_quantities = DerivedQuantities(
         file="last.csv",
-        folder="Results/derived_quantities",
+        folder=folder_results + "derived_quantities",
+        profile=my_profile,
         # nb_iterations_between_exports=1,
         )
     my_derived_quantities.derived_quantities = [
@@ -129,21 +182,24 @@ def festim_sim(E_p1, n1, initial_number_cells=500):
         F.TotalVolume("2", volume=1),
         ]
     my_exports = F.Exports([
-        F.XDMFExport("solute", label="solute", folder="Results",
-                     checkpoint=False, nb_iterations_between_exports=1),
-        F.XDMFExport("retention", label="retention", folder="Results",
-                     checkpoint=False, nb_iterations_between_exports=2),
+        XDMFExport("solute", label="solute", folder=folder_results,
+                   checkpoint=False, nb_iterations_between_exports=1,
+                   profile=my_profile),
+        XDMFExport("retention", label="retention", folder=folder_results,
+                   checkpoint=False, nb_iterations_between_exports=2,
+                   profile=my_profile),
         my_derived_quantities
     ])
     my_model.exports = my_exports
 
     # define settings
-    my_model.dt = F.Stepsize(
+    my_model.dt = Stepsize(
         1,
         stepsize_change_ratio=1.1,
         t_stop=implantation_time + resting_time*0.75,
         dt_min=1e-5,
-        stepsize_stop_max=50
+        stepsize_stop_max=50,
+        profile=my_profile
         )
 
     my_model.settings = F.Settings(
@@ -153,8 +209,19 @@ def festim_sim(E_p1, n1, initial_number_cells=500):
         transient=True
     )
 
-    my_model.initialise()
-    output = my_model.run()
+    try:
+        with my_profile.phase("initialise"):
+            my_model.initialise()
+        with my_profile.phase("run"):
+            output = my_model.run()
+    finally:
+        if profile:
+            os.makedirs(folder_results + "derived_quantities", exist_ok=True)
+            my_profile.save(folder_results + "derived_quantities/profile.json")
+
+    if cache_folder is not None:
+        cache_data(cache_folder, key, output["derived_quantities"])
+
     return output["derived_quantities"]
 
 
@@ -6,8 +6,14 @@ import numpy as np
 from scipy.integrate import odeint
 from scipy.optimize import fsolve
 from scipy.interpolate import interp1d
+import os
+import sys
 
+currentdir = os.path.dirname(os.path.abspath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
 
+from trap_table import damage_traps
 from neutron_trap_creation_models import (
     neutron_trap_creation_numerical,
     trap1,
@@ -29,6 +35,19 @@ pewter_blue = (113 / 255, 162 / 255, 182 / 255)
 blue_jeans = (96 / 255, 178 / 255, 229 / 255)
 electric_blue = (83 / 255, 244 / 255, 255 / 255)
 
+
+def latex_scientific(value):
+    r"""value as a LaTeX a.b \cdot 10^{c} string"""
+    mantissa, exponent = "{:.1e}".format(value).split("e")
+    return r"{} \cdot 10^{{{}}}".format(mantissa, int(exponent))
+
+
+def fitting_label(number, K, n_max):
+    return r"Trap {} fitting ($K = {}$ s$^{{-1}}$, $n_{{max, \phi}} =  {}$ m$^{{-3}}$)".format(
+        number, latex_scientific(K), latex_scientific(n_max)
+    )
+
+
 data_dmg = np.genfromtxt("damage_dpa_t_selinger.csv", delimiter=",", names=True)
 x_data = np.array(data_dmg["x"])
 dpa_data = np.array(data_dmg["dpa"])
@@ -43,25 +62,25 @@ E_A = E_A_optimised
 T = 800
 n_0 = 0
 
-trap1_K = 1.5e28
-trap1_n_max = 5.2e25
-trap1_label = r"Trap D1"
-trap1_fitting_label = r"Trap 2 fitting ($K = 1.5 \cdot 10^{28}$ s$^{-1}$, $n_{max, \phi} =  5.2 \cdot 10^{25}$ m$^{-3}$)"
-
-trap2_K = 4e27
-trap2_n_max = 4.5e25
-trap2_label = r"Trap D2"
-trap2_fitting_label = r"Trap 3 fitting ($K = 4.0 \cdot 10^{27}$ s$^{-1}$, $n_{max, \phi} =  4.5 \cdot 10^{25}$ m$^{-3}$)"
-
-trap3_K = 3e27
-trap3_n_max = 4e25
-trap3_label = r"Trap D3"
-trap3_fitting_label = r"Trap 4 fitting ($K = 3.0 \cdot 10^{27}$ s$^{-1}$, $n_{max, \phi} =  4.0 \cdot 10^{25}$ m$^{-3}$)"
-
-trap4_K = 9e27
-trap4_n_max = 4.2e25
-trap4_label = r"Trap D4"
-trap4_fitting_label = r"Trap 5 fitting ($K = 9.0 \cdot 10^{27}$ s$^{-1}$, $n_{max, \phi} =  4.2 \cdot 10^{25}$ m$^{-3}$)"
+trap1_K = damage_traps["K"][0]
+trap1_n_max = damage_traps["n_max"][0]
+trap1_label = r"Trap {}".format(damage_traps["name"][0])
+trap1_fitting_label = fitting_label(2, trap1_K, trap1_n_max)
+
+trap2_K = damage_traps["K"][1]
+trap2_n_max = damage_traps["n_max"][1]
+trap2_label = r"Trap {}".format(damage_traps["name"][1])
+trap2_fitting_label = fitting_label(3, trap2_K, trap2_n_max)
+
+trap3_K = damage_traps["K"][2]
+trap3_n_max = damage_traps["n_max"][2]
+trap3_label = r"Trap {}".format(damage_traps["name"][2])
+trap3_fitting_label = fitting_label(4, trap3_K, trap3_n_max)
+
+trap4_K = damage_traps["K"][3]
+trap4_n_max = damage_traps["n_max"][3]
+trap4_label = r"Trap {}".format(damage_traps["name"][3])
+trap4_fitting_label = fitting_label(5, trap4_K, trap4_n_max)
 
 phi = 2.5 / t_damage
 K = 5e21
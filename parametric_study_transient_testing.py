@@ -1,47 +1,92 @@
 from neutron_induced_traps_model import festim_sim
 import numpy as np
 from os.path import exists
-
+from adaptive_sampling import adaptive_study, hybrid_study
+from reference_cases import run_reference_cases
+from result_cache import default_cache_folder
+from study_runner import run_continuation, run_study
+from study_store import create_store
 
 dpa_values = np.geomspace(1e-03, 1e03, num=50)
 temperature_values = np.linspace(1300, 400, num=50)
 
 
 def case_steady():
-    for temperature in temperature_values:
-        for dpa in dpa_values:
-            print("Running case: dpa={:.2e}, T={:.0f}".format(dpa, temperature))
-            festim_sim(
-                T=temperature,
-                dpa=dpa,
-                results_folder_name="Results/parametric_studies/case_steady/dpa={:.2e}/T={:.0f}/".format(
-                    dpa, temperature
-                ),
-                transient_run=False,
-            )
-
-
-def case_1e09s():
+    results_folder = "Results/parametric_studies/case_steady/"
+
+    cases = [
+        {
+            "T": temperature,
+            "dpa": dpa,
+            "results_folder_name": results_folder
+            + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
+            "transient_run": False,
+        }
+        for temperature in temperature_values
+        for dpa in dpa_values
+    ]
+    run_continuation(cases, report_file=results_folder + "continuation.csv")
+
+
+def case_steady_hybrid(threshold=0.05):
+    """case_steady with festim_sim only where analytical_model is not
+    accurate enough, see adaptive_sampling.hybrid_study. The log10
+    inventories, the method of each case and the discrepancies are written
+    to the results folder."""
+    results_folder = "Results/parametric_studies/case_steady/"
+
+    def make_case(dpa, temperature):
+        return {
+            "T": temperature,
+            "dpa": dpa,
+            "results_folder_name": results_folder
+            + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
+            "transient_run": False,
+        }
+
+    study = hybrid_study(
+        dpa_values,
+        temperature_values,
+        make_case,
+        run_continuation,
+        threshold=threshold,
+    )
+    np.savetxt(results_folder + "log_inventories_hybrid", study["log_inventories"])
+    np.savetxt(results_folder + "method_hybrid", study["method"], fmt="%s")
+    np.savetxt(results_folder + "discrepancy_hybrid", study["discrepancy"])
+
+
+def case_1e09s(n_workers=None, timeout=None):
     results_folder = "Results/parametric_studies/case_1e09s_alt/"
 
-    for temperature in temperature_values:
-        for dpa in dpa_values:
-            filename_test = (
-                results_folder
-                + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, temperature)
-            )
-            if exists(filename_test):
-                continue
-            else:
-                print("Running case: dpa={:.2e}, T={:.0f}".format(dpa, temperature))
-                festim_sim(
-                    T=temperature,
-                    dpa=dpa,
-                    results_folder_name=results_folder
-                    + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
-                    transient_run=True,
-                    total_time=1e09,
-                )
+    cases = [
+        {
+            "T": temperature,
+            "dpa": dpa,
+            "results_folder_name": results_folder
+            + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
+            "transient_run": True,
+            "total_time": 1e09,
+            "cache_folder": default_cache_folder,
+        }
+        for temperature in temperature_values
+        for dpa in dpa_values
+    ]
+    run_study(
+        cases,
+        manifest_file=results_folder + "manifest.json",
+        store_folder=results_folder + "store/",
+        n_workers=n_workers,
+        timeout=timeout,
+    )
+    run_reference_cases(
+        temperature_values,
+        total_time=1e09,
+        link_folder=results_folder,
+        n_workers=n_workers,
+        timeout=timeout,
+        cache_folder=default_cache_folder,
+    )
 
 
 def case_1fpy():
@@ -59,33 +104,98 @@ def case_1fpy():
         )
 
 
-def case_24h():
+def case_24h(n_workers=None, timeout=None):
     dpa_values = np.geomspace(1e-05, 1e03, num=17)
     temperature_values = np.linspace(400, 1300, num=50)
 
     results_folder = "Results/parametric_studies/case_24h/"
 
-    for temperature in temperature_values:
-        for dpa in dpa_values:
-            filename_test = (
-                results_folder
-                + "dpa={:.2e}/T={:.0f}/derived_quantities.csv".format(dpa, temperature)
-            )
-            if exists(filename_test):
-                continue
-            else:
-                print("Running case: dpa={:.2e}, T={:.0f}".format(dpa, temperature))
-                festim_sim(
-                    T=temperature,
-                    dpa=dpa,
-                    results_folder_name=results_folder
-                    + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
-                    transient_run=True,
-                    total_time=24 * 3600,
-                )
-
-
-# case_steady()
-case_1e09s()
-# case_1fpy()
-# case_24h()
+    cases = [
+        {
+            "T": temperature,
+            "dpa": dpa,
+            "results_folder_name": results_folder
+            + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
+            "transient_run": True,
+            "total_time": 24 * 3600,
+            "cache_folder": default_cache_folder,
+        }
+        for temperature in temperature_values
+        for dpa in dpa_values
+    ]
+    run_study(
+        cases,
+        manifest_file=results_folder + "manifest.json",
+        store_folder=results_folder + "store/",
+        n_workers=n_workers,
+        timeout=timeout,
+    )
+    run_reference_cases(
+        temperature_values,
+        total_time=24 * 3600,
+        link_folder=results_folder,
+        n_workers=n_workers,
+        timeout=timeout,
+        cache_folder=default_cache_folder,
+    )
+
+
+def case_24h_adaptive(n_workers=None, timeout=None, tolerance=0.05):
+    """case_24h with adaptive sampling of the (dpa, T) grid, see
+    adaptive_sampling. The reconstructed log10 inventories and the cases run
+    are written to the results folder."""
+    dpa_values = np.geomspace(1e-05, 1e03, num=17)
+    temperature_values = np.linspace(400, 1300, num=50)
+
+    results_folder = "Results/parametric_studies/case_24h/"
+    store_folder = results_folder + "store/"
+    if not exists(store_folder):
+        create_store(store_folder, dpa_values=dpa_values, T_values=temperature_values)
+
+    def make_case(dpa, temperature):
+        return {
+            "T": temperature,
+            "dpa": dpa,
+            "results_folder_name": results_folder
+            + "dpa={:.2e}/T={:.0f}/".format(dpa, temperature),
+            "transient_run": True,
+            "total_time": 24 * 3600,
+            "cache_folder": default_cache_folder,
+        }
+
+    def run_cases(cases):
+        run_study(
+            cases,
+            manifest_file=results_folder + "manifest.json",
+            store_folder=store_folder,
+            n_workers=n_workers,
+            timeout=timeout,
+        )
+
+    study = adaptive_study(
+        dpa_values,
+        temperature_values,
+        make_case,
+        run_cases,
+        tolerance=tolerance,
+        initial_spacing=4,
+        # the analytical model is a steady state, far from the 24 h inventories
+        analytical_prior=False,
+    )
+    np.savetxt(results_folder + "log_inventories_adaptive", study["log_inventories"])
+    np.savetxt(results_folder + "sampled_adaptive", study["sampled"], fmt="%d")
+    run_reference_cases(
+        temperature_values,
+        total_time=24 * 3600,
+        link_folder=results_folder,
+        n_workers=n_workers,
+        timeout=timeout,
+        cache_folder=default_cache_folder,
+    )
+
+
+if __name__ == "__main__":
+    # case_steady()
+    case_1e09s()
+    # case_1fpy()
+    # case_24h()
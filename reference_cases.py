@@ -0,0 +1,158 @@
+import os
+from os.path import exists
+
+import numpy as np
+
+# the analytical baseline of the reference cases
+from analytical_model import analytical_reference_inventories  # noqa: F401
+
+default_registry_folder = "Results/reference_cases/"
+
+# final values already read in this process
+festim_references = {}
+
+
+def reference_folder(
+    T, total_time=1e05, transient_run=True, registry_folder=default_registry_folder
+):
+    """
+    Results folder of the undamaged festim_sim case of the registry. The
+    mesh of the undamaged cases doesn't depend on the case, see
+    neutron_induced_traps_model.festim_sim, so a case is identified by its
+    temperature and its simulated time (transient runs only).
+
+    Args:
+        T (float): temperature (K)
+        total_time (float, optional): simulated time (s). Defaults to 1e05
+        transient_run (bool, optional): transient or steady state case.
+            Defaults to True
+        registry_folder (str, optional): the registry. Defaults to
+            "Results/reference_cases/"
+
+    Returns:
+        str: the results folder
+    """
+    if transient_run:
+        return registry_folder + "transient/time={:.1e}/T={:.0f}/".format(total_time, T)
+    return registry_folder + "steady/T={:.0f}/".format(T)
+
+
+def run_reference_cases(
+    T_values,
+    total_time=1e05,
+    transient_run=True,
+    registry_folder=default_registry_folder,
+    link_folder=None,
+    n_workers=None,
+    timeout=None,
+    **kwargs
+):
+    """
+    Runs the undamaged festim_sim cases of the registry that have not been
+    run yet, in parallel with study_runner.run_study. If link_folder is
+    given, its dpa=0/T={:.0f}/ case folders are linked to the registry, so
+    that several studies share the same undamaged cases. Cases that failed
+    or timed out are not linked.
+
+    Args:
+        T_values (array_like): temperatures (K)
+        total_time (float, optional): simulated time (s). Defaults to 1e05
+        transient_run (bool, optional): transient or steady state cases.
+            Defaults to True
+        registry_folder (str, optional): the registry. Defaults to
+            "Results/reference_cases/"
+        link_folder (str, optional): results folder of a study. Defaults to
+            None
+        n_workers (int, optional): number of simultaneous processes, see
+            run_study. Defaults to the number of CPUs
+        timeout (float, optional): maximum wall time of a case (s), see
+            run_study. Defaults to None
+        **kwargs: other festim_sim arguments, e.g. cache_folder
+
+    Returns:
+        list: the results folder of each temperature
+    """
+    from study_runner import run_study
+
+    folders = [
+        reference_folder(T, total_time, transient_run, registry_folder)
+        for T in T_values
+    ]
+    cases = [
+        {
+            **kwargs,
+            "dpa": 0,
+            "T": T,
+            "results_folder_name": folder,
+            "transient_run": transient_run,
+            "total_time": total_time,
+        }
+        for T, folder in zip(T_values, folders)
+        if not exists(folder + "derived_quantities.csv")
+    ]
+    if len(cases) > 0:
+        run_study(
+            cases,
+            manifest_file=registry_folder + "manifest.json",
+            n_workers=n_workers,
+            timeout=timeout,
+        )
+
+    if link_folder is not None:
+        for T, folder in zip(T_values, folders):
+            link = link_folder + "dpa=0/T={:.0f}".format(T)
+            if not exists(folder + "derived_quantities.csv"):
+                # failed or timed out
+                continue
+            if exists(link) or os.path.islink(link):
+                continue
+            os.makedirs(os.path.dirname(link), exist_ok=True)
+            os.symlink(
+                os.path.relpath(folder, os.path.dirname(link)),
+                link,
+                target_is_directory=True,
+            )
+
+    return folders
+
+
+def reference_inventories(
+    T_values,
+    total_time=1e05,
+    transient_run=True,
+    registry_folder=default_registry_folder,
+    field="Total_retention_volume_1",
+):
+    """
+    Final value of a derived quantity of the undamaged cases of the
+    registry, e.g. to normalise the inventories of a study. The files are
+    read once per process.
+
+    Args:
+        T_values (array_like): temperatures (K)
+        total_time (float, optional): simulated time (s). Defaults to 1e05
+        transient_run (bool, optional): transient or steady state cases.
+            Defaults to True
+        registry_folder (str, optional): the registry. Defaults to
+            "Results/reference_cases/"
+        field (str, optional): the derived quantity. Defaults to
+            "Total_retention_volume_1"
+
+    Returns:
+        numpy.ndarray: the final values, nan for the cases not run yet
+    """
+    values = []
+    for T in np.atleast_1d(T_values):
+        data_file = (
+            reference_folder(T, total_time, transient_run, registry_folder)
+            + "derived_quantities.csv"
+        )
+        if (data_file, field) not in festim_references:
+            if not exists(data_file):
+                values.append(np.nan)
+                continue
+            data = np.genfromtxt(data_file, delimiter=",", names=True)
+            festim_references[(data_file, field)] = np.atleast_1d(data[field])[-1]
+        values.append(festim_references[(data_file, field)])
+
+    return np.array(values)
@@ -0,0 +1,192 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+default_cache_folder = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "Results", "cache"
+)
+
+
+def cache_key(inputs, source_files=()):
+    """
+    Computes the key of a simulation from its inputs and from the content of
+    the files defining the model, so that editing a hard-coded parameter or
+    a solver setting in these files invalidates the cached results
+
+    Args:
+        inputs (dict): the simulation inputs, json serialisable. Floats are
+            hashed at full precision
+        source_files (list, optional): paths of the files defining the model
+            (scripts, parameter tables)
+
+    Returns:
+        str: the sha256 hex digest
+    """
+    key = hashlib.sha256()
+    key.update(json.dumps(inputs, sort_keys=True, default=repr).encode())
+    for filename in source_files:
+        with open(filename, "rb") as f:
+            key.update(f.read())
+
+    return key.hexdigest()
+
+
+def cache_lookup(cache_folder, key):
+    """
+    Finds the cache entry of a key and marks it as recently used
+
+    Args:
+        cache_folder (str): the cache folder
+        key (str): the key, see cache_key
+
+    Returns:
+        str: the entry folder, None if the key is not cached
+    """
+    entry = os.path.join(cache_folder, key)
+    try:
+        os.utime(entry)
+    except FileNotFoundError:
+        return None
+
+    return entry
+
+
+def cache_store(cache_folder, key, filenames, max_size=None):
+    """
+    Copies result files in the cache entry of a key. The entry is written in
+    a temporary folder then renamed, so that concurrent workers never see a
+    partial entry. If the key is already cached, the existing entry is kept.
+
+    Args:
+        cache_folder (str): the cache folder
+        key (str): the key, see cache_key
+        filenames (list): paths of the files to store
+        max_size (int, optional): if given, the least recently used entries
+            are evicted until the cache is smaller than max_size (bytes).
+            Defaults to None
+
+    Returns:
+        str: the entry folder
+    """
+    entry = os.path.join(cache_folder, key)
+    tmp_entry = os.path.join(cache_folder, ".tmp-" + uuid.uuid4().hex)
+    os.makedirs(tmp_entry)
+    for filename in filenames:
+        shutil.copy(filename, tmp_entry)
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # another worker stored the same key in the meantime
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    if max_size is not None:
+        cache_evict(cache_folder, max_size)
+
+    return entry
+
+
+def cache_restore(cache_folder, key, destination):
+    """
+    Copies the files of a cache entry to a destination folder
+
+    Args:
+        cache_folder (str): the cache folder
+        key (str): the key, see cache_key
+        destination (str): the destination folder, created if needed
+
+    Returns:
+        bool: True if the key was cached and restored, False otherwise
+    """
+    entry = cache_lookup(cache_folder, key)
+    if entry is None:
+        return False
+    try:
+        filenames = [os.path.join(entry, name) for name in os.listdir(entry)]
+        os.makedirs(destination, exist_ok=True)
+        for filename in filenames:
+            shutil.copy(filename, destination)
+    except FileNotFoundError:
+        # evicted by another worker
+        return False
+
+    return True
+
+
+def cache_evict(cache_folder, max_size):
+    """
+    Removes the least recently used entries until the cache is smaller than
+    max_size. Only one worker evicts at a time.
+
+    Args:
+        cache_folder (str): the cache folder
+        max_size (int): maximum size of the cache (bytes)
+    """
+    with open(os.path.join(cache_folder, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        entries = []
+        for name in os.listdir(cache_folder):
+            entry = os.path.join(cache_folder, name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry, filename))
+                for filename in os.listdir(entry)
+            )
+            entries.append((os.path.getmtime(entry), size, entry))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= max_size:
+                break
+            # renaming first makes the removal atomic for readers
+            trash = os.path.join(cache_folder, ".trash-" + uuid.uuid4().hex)
+            os.rename(entry, trash)
+            shutil.rmtree(trash, ignore_errors=True)
+            total_size -= size
+
+
+def cached_data(cache_folder, key):
+    """
+    Reads the data stored with cache_data
+
+    Args:
+        cache_folder (str): the cache folder
+        key (str): the key, see cache_key
+
+    Returns:
+        list: the stored data, None if the key is not cached
+    """
+    entry = cache_lookup(cache_folder, key)
+    if entry is None:
+        return None
+    try:
+        with open(os.path.join(entry, "data.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # evicted by another worker
+        return None
+
+
+def cache_data(cache_folder, key, data, max_size=None):
+    """
+    Stores json serialisable data (e.g. the data of F.DerivedQuantities) in
+    the cache
+
+    Args:
+        cache_folder (str): the cache folder
+        key (str): the key, see cache_key
+        data (list): the data to store
+        max_size (int, optional): maximum size of the cache (bytes). Defaults
+            to None
+    """
+    os.makedirs(cache_folder, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=cache_folder, prefix=".data-") as tmp:
+        filename = os.path.join(tmp, "data.json")
+        with open(filename, "w") as f:
+            json.dump(data, f, default=float)
+        cache_store(cache_folder, key, [filename], max_size=max_size)
@@ -0,0 +1,258 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+from os.path import exists
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process
+
+    Returns:
+        int: the peak RSS (bytes), None if unavailable
+    """
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def count_newton_iterations(my_model):
+    """
+    Counts the Newton iterations of an initialised festim.Simulation, read
+    with newton_iterations. festim.HTransportProblem.solve_once returns the
+    number of iterations of each solve (steady state or time step attempt)
+    but doesn't keep it, so it is wrapped.
+
+    Args:
+        my_model (festim.Simulation): the simulation, after initialise()
+    """
+    problem = my_model.h_transport_problem
+    solve_once = problem.solve_once
+    problem.newton_iterations = 0
+
+    def counted_solve_once():
+        nb_it, converged = solve_once()
+        problem.newton_iterations += nb_it
+        return nb_it, converged
+
+    problem.solve_once = counted_solve_once
+
+
+def newton_iterations(my_model):
+    """
+    Total number of Newton iterations of a simulation, see
+    count_newton_iterations, None if they were not counted
+    """
+    problem = getattr(my_model, "h_transport_problem", None)
+    return getattr(problem, "newton_iterations", None)
+
+
+class RunProfile:
+    """
+    Profile of a simulation run: the time spent in each phase, and the step
+    size, number of Newton iterations and convergence of each solve attempt
+    (a rejected step being an attempt that did not converge). Filled by the
+    Profiled* festim mixins below and by the phase context manager, e.g.
+
+        profile = RunProfile()
+        my_model.dt = Stepsize(1, stepsize_change_ratio=1.1, profile=profile)
+        with profile.phase("initialise"):
+            my_model.initialise()
+        with profile.phase("run"):
+            my_model.run()
+        profile.save("Results/profile.json")
+
+    Phases may be nested, e.g. the derived_quantities phase is part of the
+    run phase, the remainder being the time stepping itself.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = {}
+        self.attempts = []
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent in the with block to the phase name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0) + duration
+
+    def record_attempt(self, t, dt, iterations, converged):
+        """
+        Records a solve attempt
+
+        Args:
+            t (float): the time at the beginning of the step (s), None for a
+                steady state solve
+            dt (float): the step size (s), None for a steady state solve
+            iterations (int): the number of Newton iterations
+            converged (bool): True if the Newton solver converged
+        """
+        self.attempts.append(
+            {"t": t, "dt": dt, "iterations": iterations, "converged": converged}
+        )
+
+    def summary(self):
+        """
+        Returns:
+            dict: the wall time, peak RSS, phase timings, numbers of steps,
+                rejected steps and Newton iterations, and step size range
+        """
+        steps = [attempt for attempt in self.attempts if attempt["converged"]]
+        iterations = [
+            attempt["iterations"]
+            for attempt in self.attempts
+            if attempt["iterations"] is not None
+        ]
+        step_sizes = [step["dt"] for step in steps if step["dt"] is not None]
+        return {
+            "wall_time": time.perf_counter() - self.start_time,
+            "peak_rss": peak_rss(),
+            "phases": dict(self.phases),
+            "steps": len(steps),
+            "rejected_steps": len(self.attempts) - len(steps),
+            "newton_iterations": sum(iterations),
+            "max_newton_iterations": max(iterations, default=None),
+            "dt_min": min(step_sizes, default=None),
+            "dt_max": max(step_sizes, default=None),
+        }
+
+    def save(self, filename):
+        """Writes the summary and the solve attempts to a json file"""
+        with open(filename, "w") as f:
+            json.dump({"summary": self.summary(), "attempts": self.attempts}, f)
+
+
+def load_profile(filename):
+    """
+    Reads a profile written by RunProfile.save
+
+    Args:
+        filename (str): path to the json file
+
+    Returns:
+        dict: the summary and the solve attempts
+    """
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def aggregate_profiles(profile_files, report_file=None):
+    """
+    Gathers the summaries of the profiles of a study, one row per run, and
+    prints the totals of the study. Missing files (e.g. cases restored from
+    a cache) are skipped.
+
+    Args:
+        profile_files (list): paths to the profile json files
+        report_file (str, optional): path to the csv report. Defaults to None
+
+    Returns:
+        list: the summary of each run, with its profile file
+    """
+    rows = []
+    for filename in profile_files:
+        if not exists(filename):
+            continue
+        summary = load_profile(filename)["summary"]
+        phases = summary.pop("phases")
+        rows.append(
+            {
+                "profile": filename,
+                **summary,
+                **{"time_" + name: value for name, value in phases.items()},
+            }
+        )
+
+    if report_file is not None:
+        fieldnames = []
+        for row in rows:
+            fieldnames += [name for name in row if name not in fieldnames]
+        with open(report_file, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    if rows:
+        wall_time = sum(row["wall_time"] for row in rows)
+        print(
+            "{} runs, {:.0f} s, {} steps, {} rejected steps, "
+            "{} Newton iterations".format(
+                len(rows),
+                wall_time,
+                sum(row["steps"] for row in rows),
+                sum(row["rejected_steps"] for row in rows),
+                sum(row["newton_iterations"] for row in rows),
+            )
+        )
+        phase_names = sorted(
+            set(name for row in rows for name in row if name.startswith("time_"))
+        )
+        for name in phase_names:
+            total = sum(row.get(name, 0) for row in rows)
+            print(
+                "    {}: {:.0f} s ({:.0%})".format(name[5:], total, total / wall_time)
+            )
+        slowest = max(rows, key=lambda row: row["wall_time"])
+        print(
+            "slowest run: {} ({:.0f} s)".format(
+                slowest["profile"], slowest["wall_time"]
+            )
+        )
+
+    return rows
+
+
+class Profiled:
+    """Base of the festim mixins below, taking a RunProfile as profile"""
+
+    def __init__(self, *args, profile=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile = profile
+
+
+class ProfiledStepsize(Profiled):
+    """
+    Records every solve attempt in the profile. Used as a mixin before
+    festim.Stepsize, whose adapt method is called after each attempt when
+    the step size is adaptive.
+    """
+
+    def adapt(self, t, nb_it, converged):
+        if self.profile is not None:
+            self.profile.record_attempt(float(t), float(self.value), nb_it, converged)
+        super().adapt(t, nb_it, converged)
+
+
+class ProfiledComputation(Profiled):
+    """Times the computation of festim.DerivedQuantities (derived_quantities
+    phase)"""
+
+    def compute(self, *args, **kwargs):
+        if self.profile is None:
+            return super().compute(*args, **kwargs)
+        with self.profile.phase("derived_quantities"):
+            return super().compute(*args, **kwargs)
+
+
+class ProfiledExport(Profiled):
+    """Times the writing of festim.XDMFExport (exports phase)"""
+
+    def write(self, *args, **kwargs):
+        if self.profile is None:
+            return super().write(*args, **kwargs)
+        with self.profile.phase("exports"):
+            return super().write(*args, **kwargs)
@@ -0,0 +1,73 @@
+class TimeSampling:
+    """
+    Restricts a festim export to time windows, with a minimum time between
+    two samples. Used as a mixin before the festim class, e.g.
+
+        class DerivedQuantities(SampledComputation, F.DerivedQuantities):
+            pass
+
+        my_derived_quantities = DerivedQuantities(
+            filename="last.csv", time_windows=[(t_tds, None)], time_stride=10
+        )
+
+    The mixins override the export hooks of festim 0.10.2, where
+    festim.Exports.write calls DerivedQuantities.compute(t) and
+    XDMFExport.is_export(t, final_time, nb_iterations). They are not checked
+    against the older FESTIM package imported by optimisation_tds.
+
+    Args:
+        time_windows (list, optional): (start, end) times of the windows (s),
+            end None for an open window. Defaults to None (the whole
+            simulation)
+        time_stride (float, optional): minimum time between two samples (s).
+            Defaults to None (every time step)
+    """
+
+    def __init__(self, *args, time_windows=None, time_stride=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.time_windows = time_windows
+        self.time_stride = time_stride
+        self.last_sample = None
+
+    def is_sampled(self, t):
+        """
+        Checks if time t is sampled, and records it as the last sample if so
+
+        Args:
+            t (float): the time (s)
+
+        Returns:
+            bool: True if t is sampled
+        """
+        if self.time_windows is not None and not any(
+            start <= t and (end is None or t <= end) for start, end in self.time_windows
+        ):
+            return False
+        if (
+            self.time_stride is not None
+            and self.last_sample is not None
+            and t - self.last_sample < self.time_stride
+        ):
+            return False
+        self.last_sample = t
+        return True
+
+
+class SampledComputation(TimeSampling):
+    """
+    TimeSampling of festim.DerivedQuantities: the quantities are only
+    computed at the sampled times. The rows are kept in memory and the file
+    is written once, at the end of the simulation.
+    """
+
+    def compute(self, t):
+        if self.is_sampled(t):
+            super().compute(t)
+
+
+class SampledExport(TimeSampling):
+    """TimeSampling of festim.XDMFExport: the field is only written at the
+    sampled times"""
+
+    def is_export(self, t, *args, **kwargs):
+        return super().is_export(t, *args, **kwargs) and self.is_sampled(t)
@@ -0,0 +1,217 @@
+import numpy as np
+
+from analytical_model import (
+    D_0,
+    E_D,
+    analytical_model_vectorised,
+    fpy,
+    imp_flux,
+    mobile_H_concentration,
+    r_p,
+)
+
+
+def _function_values(function, dofs=None):
+    """Dof coordinates and values of a (sub)function, sorted by depth"""
+    V = function.function_space()
+    x = V.tabulate_dof_coordinates()[:, 0]
+    values = function.vector().get_local()
+    if dofs is not None:
+        x, values = x[dofs], values[dofs]
+    order = np.argsort(x)
+
+    return x[order], values[order]
+
+
+def _set_function_values(function, state_x, state_values, dofs=None):
+    """Interpolates a depth profile on the dofs of a (sub)function"""
+    V = function.function_space()
+    x = V.tabulate_dof_coordinates()[:, 0]
+    values = function.vector().get_local()
+    if dofs is None:
+        dofs = np.arange(len(values))
+    values[dofs] = np.interp(x[dofs], state_x, state_values)
+    function.vector().set_local(values)
+    function.vector().apply("insert")
+
+
+def _field_dofs(V):
+    """Dof indices of each field of the hydrogen transport function space"""
+    if V.num_sub_spaces() == 0:
+        return [None]
+    return [V.sub(i).dofmap().dofs() for i in range(V.num_sub_spaces())]
+
+
+def get_state(my_model):
+    """
+    Depth profiles of the fields of an initialised festim.Simulation: the
+    solute ("0") and trapped ("1", "2", ...) concentrations, and the density
+    ("density_2", ...) of the traps whose density is solved for, e.g.
+    festim.NeutronInducedTrap
+
+    Args:
+        my_model (festim.Simulation): the simulation
+
+    Returns:
+        dict: the (x, values) profile of each field
+    """
+    problem = my_model.h_transport_problem
+    state = {}
+    for i, dofs in enumerate(_field_dofs(problem.V)):
+        state[str(i)] = _function_values(problem.u, dofs)
+    for i, trap in enumerate(my_model.traps.traps, start=1):
+        if hasattr(trap, "density_previous_solution"):
+            state["density_{}".format(i)] = _function_values(trap.density[0])
+
+    return state
+
+
+def set_state(my_model, state):
+    """
+    Sets the fields of an initialised festim.Simulation (current and previous
+    solutions) from depth profiles, interpolated on the mesh of the
+    simulation. Fields missing from the state are left untouched.
+
+    Args:
+        my_model (festim.Simulation): the simulation
+        state (dict): the (x, values) profile of each field, see get_state
+    """
+    problem = my_model.h_transport_problem
+    for i, dofs in enumerate(_field_dofs(problem.V)):
+        if str(i) in state:
+            _set_function_values(problem.u, *state[str(i)], dofs=dofs)
+    problem.u_n.assign(problem.u)
+
+    for i, trap in enumerate(my_model.traps.traps, start=1):
+        name = "density_{}".format(i)
+        if name in state and hasattr(trap, "density_previous_solution"):
+            _set_function_values(trap.density[0], *state[name])
+            trap.density_previous_solution.assign(trap.density[0])
+
+
+def save_state(my_model, filename):
+    """
+    Writes the depth profiles of the fields of a festim.Simulation, see
+    get_state
+
+    Args:
+        my_model (festim.Simulation): the simulation
+        filename (str): path to the .npz file
+    """
+    arrays = {}
+    for name, (x, values) in get_state(my_model).items():
+        arrays["x_" + name] = x
+        arrays["values_" + name] = values
+    np.savez(filename, **arrays)
+
+
+def load_state(filename):
+    """
+    Reads depth profiles written by save_state
+
+    Args:
+        filename (str): path to the .npz file
+
+    Returns:
+        dict: the (x, values) profile of each field
+    """
+    with np.load(filename) as data:
+        names = [key[2:] for key in data.files if key.startswith("x_")]
+        return {name: (data["x_" + name], data["values_" + name]) for name in names}
+
+
+def save_checkpoint(my_model, filename):
+    """
+    Writes the depth profiles of the fields of a festim.Simulation (see
+    save_state) with its time and stepsize, to restart it later
+
+    Args:
+        my_model (festim.Simulation): the simulation
+        filename (str): path to the .npz file
+    """
+    arrays = {"t": my_model.t, "dt": float(my_model.dt.value)}
+    for name, (x, values) in get_state(my_model).items():
+        arrays["x_" + name] = x
+        arrays["values_" + name] = values
+    np.savez(filename, **arrays)
+
+
+def restore_checkpoint(my_model, filename):
+    """
+    Restarts an initialised festim.Simulation from a checkpoint written by
+    save_checkpoint, possibly on another mesh
+
+    Args:
+        my_model (festim.Simulation): the simulation
+        filename (str): path to the .npz file
+    """
+    set_state(my_model, load_state(filename))
+    with np.load(filename) as data:
+        my_model.t = float(data["t"])
+        my_model.dt.value.assign(float(data["dt"]))
+
+
+def run_with_checkpoint(
+    my_model, checkpoint_time=None, checkpoint_file=None, stop_criterion=None
+):
+    """
+    Time stepping of festim.Simulation.run, writing a checkpoint (see
+    save_checkpoint) before the step that goes past checkpoint_time, so that
+    a restart computes all the steps after checkpoint_time
+
+    Args:
+        my_model (festim.Simulation): the initialised simulation
+        checkpoint_time (float, optional): time of the checkpoint (s).
+            Defaults to None
+        checkpoint_file (str, optional): path to the .npz file, no checkpoint
+            is written if None. Defaults to None
+        stop_criterion (callable, optional): called without arguments after
+            each time step, the simulation stops when it returns True.
+            Defaults to None
+
+    Returns:
+        bool: True if the simulation reached its final time, False if it was
+            stopped
+    """
+    final_time = my_model.settings.final_time
+    my_model.exports.final_time = final_time
+    while my_model.t < final_time and not np.isclose(my_model.t, final_time, atol=0):
+        if (
+            checkpoint_file is not None
+            and my_model.t <= checkpoint_time < my_model.t + float(my_model.dt.value)
+        ):
+            save_checkpoint(my_model, checkpoint_file)
+        my_model.iterate()
+        if stop_criterion is not None and stop_criterion():
+            return False
+
+    return True
+
+
+def analytical_state(dpa, T, L=0.002):
+    """
+    Uniform steady state profiles given by the analytical model, with the
+    same field names as get_state (intrinsic trap first, then the damage
+    traps of the trap table)
+
+    Args:
+        dpa (float): damage rate (dpa fpy-1)
+        T (float): temperature (K)
+        L (float, optional): length of the material (m). Defaults to 0.002
+
+    Returns:
+        dict: the (x, values) profile of each field
+    """
+    _, densities, filling_ratios = analytical_model_vectorised(phi=dpa / fpy, T=T, L=L)
+    x = np.array([0, L])
+    c_m = mobile_H_concentration(T=T, imp_flux=imp_flux, r_p=r_p, D_0=D_0, E_D=E_D)
+
+    state = {"0": (x, np.full(2, c_m))}
+    for i, (density, filling_ratio) in enumerate(
+        zip(densities, filling_ratios), start=1
+    ):
+        state[str(i)] = (x, np.full(2, density * filling_ratio))
+        if i > 1:
+            state["density_{}".format(i)] = (x, np.full(2, density))
+
+    return state
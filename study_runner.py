@@ -0,0 +1,291 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from os.path import exists
+
+import numpy as np
+
+from run_profile import aggregate_profiles, newton_iterations
+from study_store import create_store, ingest_case
+
+# solver settings used for the successive retries of a failed case
+default_retry_settings = [
+    {"initial_stepsize": 1e-02, "stepsize_change_ratio": 1.02},
+    {
+        "initial_stepsize": 1e-03,
+        "stepsize_change_ratio": 1.01,
+        "maximum_iterations": 50,
+    },
+]
+
+
+def _run_case(case):
+    """Runs a single festim_sim case, called in a dedicated process"""
+    from neutron_induced_traps_model import festim_sim
+
+    festim_sim(**case)
+
+
+def load_manifest(filename):
+    """
+    Reads a study manifest
+
+    Args:
+        filename (str): path to the manifest json file
+
+    Returns:
+        dict: the status of each case, empty if the file does not exist
+    """
+    if not exists(filename):
+        return {}
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, filename):
+    """
+    Writes a study manifest, replacing the previous file atomically so that a
+    crash never leaves a truncated manifest behind
+
+    Args:
+        manifest (dict): the status of each case
+        filename (str): path to the manifest json file
+    """
+    folder = os.path.dirname(filename)
+    if folder != "":
+        os.makedirs(folder, exist_ok=True)
+    with open(filename + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(filename + ".tmp", filename)
+
+
+def run_study(
+    cases,
+    manifest_file,
+    n_workers=None,
+    timeout=None,
+    retry_settings=default_retry_settings,
+    poll_interval=1,
+    store_folder=None,
+    profile_report_file=None,
+):
+    """
+    Runs festim_sim cases in parallel, one process per case with at most
+    n_workers processes at a time. Cases are identified by their
+    results_folder_name. Cases already completed in the manifest, or whose
+    derived_quantities.csv exists, are skipped. A case that fails is run again
+    with the next entry of retry_settings merged into its arguments, a case
+    that exceeds timeout is terminated and not retried. If store_folder is
+    given, the results of each case are written to this study store (see
+    study_store) as soon as the case is completed. If profile_report_file is
+    given, the run profiles of the cases (see run_profile) are gathered in
+    this csv report at the end of the study.
+
+    Args:
+        cases (list): festim_sim keyword arguments for each case, each one
+            with a results_folder_name
+        manifest_file (str): path to the json file recording the status,
+            number of attempts and wall time of each case
+        n_workers (int, optional): number of simultaneous processes. Defaults
+            to the number of CPUs
+        timeout (float, optional): maximum wall time of a case (s). Defaults
+            to None
+        retry_settings (list, optional): festim_sim keyword arguments
+            overriding the case arguments for each retry
+        poll_interval (float, optional): time between two checks of the
+            running processes (s). Defaults to 1
+        store_folder (str, optional): the study store folder, created with
+            the dpa and T values of the cases if it does not exist. Defaults
+            to None
+        profile_report_file (str, optional): path to the csv report of the
+            run profiles. Defaults to None
+
+    Returns:
+        dict: the manifest
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    manifest = load_manifest(manifest_file)
+
+    new_store = store_folder is not None and not exists(store_folder)
+    if new_store:
+        create_store(
+            store_folder,
+            dpa_values=sorted(set(case["dpa"] for case in cases)),
+            T_values=sorted(set(case["T"] for case in cases)),
+        )
+
+    pending = deque()
+    for case in cases:
+        case_id = case["results_folder_name"]
+        entry = manifest.get(case_id, {})
+        data_file = case_id + "derived_quantities.csv"
+        if entry.get("status") == "completed" or (exists(data_file) and entry == {}):
+            if entry == {}:
+                manifest[case_id] = {
+                    "case": case,
+                    "status": "completed",
+                    "attempts": 0,
+                    "wall_time": None,
+                }
+            if new_store and exists(data_file):
+                ingest_case(store_folder, case["dpa"], case["T"], data_file)
+            continue
+        manifest[case_id] = {
+            "case": case,
+            "status": "pending",
+            "attempts": 0,
+            "wall_time": None,
+        }
+        pending.append((case_id, case))
+    save_manifest(manifest, manifest_file)
+
+    running = {}
+    while pending or running:
+        while pending and len(running) < n_workers:
+            case_id, case = pending.popleft()
+            attempt = manifest[case_id]["attempts"]
+            if attempt > 0:
+                case = {**case, **retry_settings[attempt - 1]}
+            process = multiprocessing.Process(target=_run_case, args=(case,))
+            process.start()
+            running[case_id] = (process, time.perf_counter())
+            manifest[case_id]["status"] = "running"
+            manifest[case_id]["attempts"] = attempt + 1
+            print("Running case: {} (attempt {})".format(case_id, attempt + 1))
+            save_manifest(manifest, manifest_file)
+
+        time.sleep(poll_interval)
+
+        for case_id, (process, start_time) in list(running.items()):
+            wall_time = time.perf_counter() - start_time
+            if process.is_alive():
+                if timeout is None or wall_time < timeout:
+                    continue
+                process.terminate()
+                process.join()
+                status = "timeout"
+            elif process.exitcode == 0:
+                status = "completed"
+                if store_folder is not None:
+                    case = manifest[case_id]["case"]
+                    data_file = case_id + "derived_quantities.csv"
+                    ingest_case(store_folder, case["dpa"], case["T"], data_file)
+            elif manifest[case_id]["attempts"] <= len(retry_settings):
+                status = "pending"
+                pending.append((case_id, manifest[case_id]["case"]))
+            else:
+                status = "failed"
+
+            del running[case_id]
+            manifest[case_id]["status"] = status
+            manifest[case_id]["wall_time"] = wall_time
+            print("Case {}: {} after {:.0f} s".format(case_id, status, wall_time))
+            save_manifest(manifest, manifest_file)
+
+    if profile_report_file is not None:
+        aggregate_profiles(
+            [case_id + "profile.json" for case_id in manifest],
+            report_file=profile_report_file,
+        )
+
+    return manifest
+
+
+def continuation_path(cases):
+    """
+    Orders cases along a serpentine path through (T, dpa) space: by
+    increasing temperature, with the damage rate alternately increasing and
+    decreasing, so that consecutive cases are neighbours
+
+    Args:
+        cases (list): festim_sim keyword arguments for each case
+
+    Returns:
+        list: the ordered cases
+    """
+    T_values = sorted(set(case["T"] for case in cases))
+    path = []
+    for k, T in enumerate(T_values):
+        cases_T = sorted(
+            [case for case in cases if case["T"] == T],
+            key=lambda case: case["dpa"],
+            reverse=k % 2 == 1,
+        )
+        path.extend(cases_T)
+
+    return path
+
+
+def run_continuation(cases, report_file=None):
+    """
+    Runs steady state festim_sim cases one after the other along
+    continuation_path, the converged state of each case being the initial
+    guess of the next one. A case whose Newton solver diverges from this
+    initial guess is run again from zero. The number of Newton iterations of
+    each case is printed and written to report_file, along with the savings
+    estimated from the cold started cases.
+
+    Args:
+        cases (list): festim_sim keyword arguments for each case, each one
+            with a results_folder_name and transient_run=False
+        report_file (str, optional): path to the csv report. Defaults to None
+
+    Returns:
+        list: (dpa, T, start, iterations) of each case, start being "warm" or
+            "cold"
+    """
+    from neutron_induced_traps_model import festim_sim
+
+    report = []
+    previous_state = None
+    for case in continuation_path(cases):
+        print("Running case: dpa={:.2e}, T={:.0f}".format(case["dpa"], case["T"]))
+        start = "cold"
+        converged = False
+        if previous_state is not None:
+            try:
+                my_model = festim_sim(**case, initial_state=previous_state)
+                start = "warm"
+                converged = True
+            except ValueError:
+                # raised by festim when the Newton solver diverges
+                print("Diverged from the previous case, restarting from zero")
+        if not converged:
+            my_model = festim_sim(**case)
+            start = "cold"
+
+        # None for the cases restored from the cache (my_model is None)
+        iterations = newton_iterations(my_model)
+        report.append((case["dpa"], case["T"], start, iterations))
+        previous_state = case["results_folder_name"] + "state.npz"
+        if not exists(previous_state):
+            previous_state = None
+
+    iterations = {
+        start: [n for _, _, s, n in report if s == start and n is not None]
+        for start in ["warm", "cold"]
+    }
+    for start, values in iterations.items():
+        if len(values) > 0:
+            print(
+                "{} starts: {} cases, {:.1f} Newton iterations per case".format(
+                    start, len(values), np.mean(values)
+                )
+            )
+    if len(iterations["warm"]) > 0 and len(iterations["cold"]) > 0:
+        savings = len(iterations["warm"]) * np.mean(iterations["cold"]) - np.sum(
+            iterations["warm"]
+        )
+        print("Estimated Newton iterations saved: {:.0f}".format(savings))
+
+    if report_file is not None:
+        with open(report_file, "w") as f:
+            f.write("dpa,T,start,iterations\n")
+            for dpa, T, start, n in report:
+                f.write("{},{},{},{}\n".format(dpa, T, start, "" if n is None else n))
+
+    return report
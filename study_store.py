@@ -0,0 +1,225 @@
+import json
+import os
+from os.path import exists
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# FESTIM writes "t(s)" as the header of the time column, which genfromtxt
+# turns into "ts"
+time_field = "ts"
+
+
+def _index_file(folder):
+    return os.path.join(folder, "index.json")
+
+
+def _array_file(folder, name):
+    return os.path.join(folder, name + ".npy")
+
+
+def _save_index(index, folder):
+    with open(_index_file(folder) + ".tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(_index_file(folder) + ".tmp", _index_file(folder))
+
+
+def _case_index(values, value, name):
+    i = np.argmin(np.abs(np.asarray(values) - value))
+    if not np.isclose(values[i], value, rtol=1e-6, atol=0):
+        raise KeyError("{}={} is not in the study".format(name, value))
+    return i
+
+
+def create_store(folder, dpa_values, T_values):
+    """
+    Creates an empty study store. Each field of the derived quantities is
+    stored as a (dpa, T, time step) array in its own .npy file, padded with
+    nan after the last time step of each case, so that it can be memory
+    mapped and sliced without reading the rest of the study.
+
+    Args:
+        folder (str): the store folder
+        dpa_values (list): damage rates of the study (dpa fpy-1)
+        T_values (list): temperatures of the study (K)
+    """
+    os.makedirs(folder, exist_ok=True)
+    index = {
+        "dpa_values": [float(dpa) for dpa in dpa_values],
+        "T_values": [float(T) for T in T_values],
+        "fields": [],
+        "max_steps": 0,
+    }
+    n_steps = open_memmap(
+        _array_file(folder, "n_steps"),
+        mode="w+",
+        dtype=np.int64,
+        shape=(len(dpa_values), len(T_values)),
+    )
+    n_steps[:] = 0
+    n_steps.flush()
+    _save_index(index, folder)
+
+
+def _resize_fields(folder, index, fields, max_steps):
+    """Creates missing field arrays and grows all of them to max_steps"""
+    shape = (len(index["dpa_values"]), len(index["T_values"]), max_steps)
+    for name in fields:
+        filename = _array_file(folder, name)
+        new_array = open_memmap(
+            filename + ".tmp", mode="w+", dtype=np.float64, shape=shape
+        )
+        new_array[:] = np.nan
+        if name in index["fields"]:
+            old_array = np.load(filename, mmap_mode="r")
+            new_array[:, :, : index["max_steps"]] = old_array
+            del old_array
+        new_array.flush()
+        del new_array
+        os.replace(filename + ".tmp", filename)
+    index["fields"] = list(fields)
+    index["max_steps"] = max_steps
+
+
+def ingest_case(folder, dpa, T, data_file):
+    """
+    Writes the derived quantities of a single case in a study store. The
+    arrays are grown (doubling their number of time steps) when the case is
+    longer than the cases ingested so far.
+
+    Args:
+        folder (str): the store folder, see create_store
+        dpa (float): damage rate of the case (dpa fpy-1)
+        T (float): temperature of the case (K)
+        data_file (str): path to the derived_quantities.csv of the case
+    """
+    with open(_index_file(folder), "r") as f:
+        index = json.load(f)
+    i = _case_index(index["dpa_values"], dpa, "dpa")
+    j = _case_index(index["T_values"], T, "T")
+
+    data = np.atleast_1d(np.genfromtxt(data_file, delimiter=",", names=True))
+    fields = index["fields"] + [
+        name for name in data.dtype.names if name not in index["fields"]
+    ]
+    if len(data) > index["max_steps"] or fields != index["fields"]:
+        max_steps = index["max_steps"]
+        if len(data) > max_steps:
+            max_steps = max(len(data), 2 * max_steps)
+        _resize_fields(folder, index, fields, max_steps)
+        _save_index(index, folder)
+
+    for name in index["fields"]:
+        array = np.load(_array_file(folder, name), mmap_mode="r+")
+        array[i, j] = np.nan
+        if name in data.dtype.names:
+            array[i, j, : len(data)] = data[name]
+        array.flush()
+        del array
+
+    n_steps = np.load(_array_file(folder, "n_steps"), mmap_mode="r+")
+    n_steps[i, j] = len(data)
+    n_steps.flush()
+
+
+def pack_study(folder, results_folder, dpa_values, T_values):
+    """
+    Packs the derived_quantities.csv files of an existing study in a new
+    study store. Missing cases are left empty.
+
+    Args:
+        folder (str): the store folder
+        results_folder (str): the study folder, containing the
+            dpa={:.2e}/T={:.0f}/ case folders
+        dpa_values (list): damage rates of the study (dpa fpy-1)
+        T_values (list): temperatures of the study (K)
+    """
+    create_store(folder, dpa_values=dpa_values, T_values=T_values)
+    for dpa in dpa_values:
+        for T in T_values:
+            data_file = results_folder + "dpa={:.2e}/T={:.0f}/".format(dpa, T)
+            data_file += "derived_quantities.csv"
+            if exists(data_file):
+                ingest_case(folder, dpa=dpa, T=T, data_file=data_file)
+
+
+def load_study(folder):
+    """
+    Opens a study store in read-only mode. The fields are memory mapped, so
+    only the slices actually used are read from disk.
+
+    Args:
+        folder (str): the store folder
+
+    Returns:
+        dict: the dpa and T values of the study, the number of time steps of
+            each case ("n_steps", 0 for missing cases) and the (dpa, T, time
+            step) array of each derived quantity
+    """
+    with open(_index_file(folder), "r") as f:
+        index = json.load(f)
+
+    study = {
+        "dpa_values": np.array(index["dpa_values"]),
+        "T_values": np.array(index["T_values"]),
+        "n_steps": np.load(_array_file(folder, "n_steps"), mmap_mode="r"),
+    }
+    for name in index["fields"]:
+        study[name] = np.load(_array_file(folder, name), mmap_mode="r")
+
+    return study
+
+
+def _case_indices(study, dpa_values, T_values):
+    """(dpa, T) index grids of a subset of the cases of a study"""
+    if dpa_values is None:
+        dpa_values = study["dpa_values"]
+    if T_values is None:
+        T_values = study["T_values"]
+    i = [_case_index(study["dpa_values"], dpa, "dpa") for dpa in dpa_values]
+    j = [_case_index(study["T_values"], T, "T") for T in T_values]
+
+    return np.meshgrid(i, j, indexing="ij")
+
+
+def select_cases(study, field, dpa_values=None, T_values=None):
+    """
+    Time series of a field for a subset of the cases of a study
+
+    Args:
+        study (dict): the study, see load_study
+        field (str): the derived quantity, e.g. "Total_retention_volume_1"
+        dpa_values (list, optional): damage rates of the cases. Defaults to
+            all the damage rates of the study
+        T_values (list, optional): temperatures of the cases. Defaults to all
+            the temperatures of the study
+
+    Returns:
+        numpy.ndarray: the field, shape (n_dpa, n_T, max_steps) nan padded
+    """
+    i, j = _case_indices(study, dpa_values, T_values)
+    return study[field][i, j]
+
+
+def final_values(study, field, dpa_values=None, T_values=None):
+    """
+    Last value of a field for a subset of the cases of a study, e.g. the
+    inventory at the end of each simulation
+
+    Args:
+        study (dict): the study, see load_study
+        field (str): the derived quantity, e.g. "Total_retention_volume_1"
+        dpa_values (list, optional): damage rates of the cases. Defaults to
+            all the damage rates of the study
+        T_values (list, optional): temperatures of the cases. Defaults to all
+            the temperatures of the study
+
+    Returns:
+        numpy.ndarray: the final values, shape (n_dpa, n_T), nan for missing
+            cases
+    """
+    i, j = _case_indices(study, dpa_values, T_values)
+    last = np.maximum(study["n_steps"][i, j] - 1, 0)
+
+    values = study[field][i, j, last]
+    return np.where(study["n_steps"][i, j] > 0, values, np.nan)
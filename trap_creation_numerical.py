@@ -1,5 +1,6 @@
 import numpy as np
-from scipy.integrate import odeint
+from trap_table import damage_traps
+from trap_evolution import trap_density_stream, trap_density_transient
 import matplotlib.pyplot as plt
 
 plt.rc("text", usetex=True)
@@ -8,8 +9,6 @@ plt.rc("font", family="serif", size=12)
 
 # time points
 final_time = 86400 * 365 * 7
-num = int(1e07)
-t = np.linspace(0, final_time, num)
 
 k_B = 8.617333e-05
 fpy = 86400 * 365
@@ -24,25 +23,20 @@ n_0 = 0
 dpa_values = np.geomspace(1e-03, 1e03, num=7)
 T_values = np.linspace(1300, 400, num=50)
 
-traps_concs = []
-
-for dpa in dpa_values:
-    phi = dpa / fpy
-
-    def numerical_trap_creation_model_trap_1(n, t, phi=phi, A_0=A_0, E_A=E_A, T=T):
-        K = 1.5e28
-        n_max = 5.2e25
-
-        dndt = phi * K * (1 - (n / n_max)) - A_0 * np.exp(-E_A / (k_B * T)) * n
-
-        return dndt
-
-    trap_1 = odeint(
-        numerical_trap_creation_model_trap_1,
-        n_0,
-        t,
-    )
-    traps_concs.append(trap_1)
+# log-spaced samples, streamed rather than a dense time vector
+samples = trap_density_stream(
+    final_time,
+    T=T,
+    phi=dpa_values / fpy,
+    K=damage_traps["K"][0],
+    n_max=damage_traps["n_max"][0],
+    A_0=A_0,
+    E_A=E_A,
+    n_0=n_0,
+    points_per_decade=50,
+)
+t, traps_concs = (np.array(values) for values in zip(*samples))
+traps_concs = traps_concs.T
 
 plt.rc("text", usetex=True)
 plt.rc("font", family="serif", size=12)
@@ -66,10 +60,22 @@ ax.spines["right"].set_visible(False)
 ax.spines["top"].set_visible(False)
 
 
-t_plot = t / (3600)
+# first 15 h on a linear axis, linearly spaced
+t_short = np.linspace(0, 15 * 3600, num=1000)
+traps_concs_short = trap_density_transient(
+    t=t_short,
+    T=T,
+    phi=dpa_values[:, np.newaxis] / fpy,
+    K=damage_traps["K"][0],
+    n_max=damage_traps["n_max"][0],
+    A_0=A_0,
+    E_A=E_A,
+    n_0=n_0,
+)
+t_plot = t_short / (3600)
 
 plt.figure()
-for case, dpa in zip(traps_concs, dpa_values):
+for case, dpa in zip(traps_concs_short, dpa_values):
     plt.plot(t_plot, case, label="{:.0e} dpa/fpy".format(dpa))
 h, l = plt.gca().get_legend_handles_labels()
 plt.legend(
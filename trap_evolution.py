@@ -0,0 +1,264 @@
+import numpy as np
+
+k_B = 8.617333e-05
+
+# annealing parameters
+A_0 = 6.1838e-03
+E_A = 0.2792
+
+
+def relaxation_rate(T, phi, K, n_max, A_0=A_0, E_A=E_A):
+    """
+    Rate at which the trap density relaxes towards its saturation value,
+    phi*K/n_max + A
+
+    Args:
+        T (float, array_like): temperature (K)
+        phi (float, array_like): damage rate (dpa s-1)
+        K (float, array_like): trap creation factor (m-3 dpa-1)
+        n_max (float, array_like): maximum trap density (m-3)
+        A_0 (float, array_like): trap annealing factor (s-1)
+        E_A (float, array_like): annealing activation energy (eV)
+
+    Returns:
+        numpy.ndarray: the relaxation rate (s-1)
+    """
+    A = A_0 * np.exp(-E_A / (k_B * np.asarray(T, dtype=float)))
+    return phi * K / n_max + A
+
+
+def trap_density_transient(t, T, phi, K, n_max, A_0=A_0, E_A=E_A, n_0=0):
+    """
+    Closed form solution of dn/dt = phi*K*(1 - n/n_max) - A*n for a constant
+    temperature and damage rate. All arguments broadcast against each other,
+    so that whole (T, dpa, t) tensors are evaluated in one call
+
+    Args:
+        t (float, array_like): time (s)
+        T (float, array_like): temperature (K)
+        phi (float, array_like): damage rate (dpa s-1)
+        K (float, array_like): trap creation factor (m-3 dpa-1)
+        n_max (float, array_like): maximum trap density (m-3)
+        A_0 (float, array_like): trap annealing factor (s-1)
+        E_A (float, array_like): annealing activation energy (eV)
+        n_0 (float, array_like): initial trap density (m-3). Defaults to 0
+
+    Returns:
+        numpy.ndarray: the trap density (m-3)
+    """
+    rate = relaxation_rate(T=T, phi=phi, K=K, n_max=n_max, A_0=A_0, E_A=E_A)
+    n_inf = phi * K / rate
+    decay = np.exp(-rate * np.asarray(t, dtype=float))
+
+    # expm1 keeps the accuracy at times much shorter than 1/rate
+    return -n_inf * np.expm1(-rate * np.asarray(t, dtype=float)) + n_0 * decay
+
+
+def trap_density_stream(
+    final_time,
+    T,
+    phi,
+    K,
+    n_max,
+    A_0=A_0,
+    E_A=E_A,
+    n_0=0,
+    t_min=1.0,
+    points_per_decade=20,
+    max_points=None,
+    rtol=1e-03,
+    chunk_size=1000,
+):
+    """
+    Generator of (t, n) samples of trap_density_transient from t = 0 to
+    final_time, log-spaced from t_min, so that long histories (e.g. several
+    fpy) are sampled without a dense time vector. The closed form is
+    evaluated chunk_size candidate times at a time, and a candidate is only
+    yielded if the trap density changed by more than rtol (relative) since
+    the last sample, e.g. not on the saturation plateau. The first and last
+    samples are always yielded. T, phi, K, n_max, A_0, E_A and n_0 broadcast
+    against each other, n having their broadcast shape, e.g.
+
+        samples = trap_density_stream(7 * fpy, T=761, phi=dpa_values / fpy, ...)
+        t, n = (np.array(values) for values in zip(*samples))
+
+    Args:
+        final_time (float): last time (s)
+        T (float, array_like): temperature (K)
+        phi (float, array_like): damage rate (dpa s-1)
+        K (float, array_like): trap creation factor (m-3 dpa-1)
+        n_max (float, array_like): maximum trap density (m-3)
+        A_0 (float, array_like): trap annealing factor (s-1)
+        E_A (float, array_like): annealing activation energy (eV)
+        n_0 (float, array_like): initial trap density (m-3). Defaults to 0
+        t_min (float, optional): first time after t = 0 (s). Defaults to 1
+        points_per_decade (float, optional): number of candidate times per
+            decade. Defaults to 20
+        max_points (int, optional): maximum number of samples, t = 0
+            included, overriding points_per_decade. Defaults to None
+        rtol (float, optional): relative change of n below which a candidate
+            is skipped, 0 to yield all of them. Defaults to 1e-03
+        chunk_size (int, optional): number of candidate times evaluated at
+            once. Defaults to 1000
+
+    Yields:
+        tuple: the time (s) and the trap density (m-3)
+    """
+    if not 0 < t_min < final_time:
+        raise ValueError("t_min must be between 0 and final_time")
+    if max_points is not None and max_points < 2:
+        raise ValueError("max_points must be at least 2")
+
+    if max_points is None:
+        decades = np.log10(final_time / t_min)
+        num = max(int(np.ceil(decades * points_per_decade)), 1) + 1
+    else:
+        num = max_points - 1
+    shape = np.broadcast(T, phi, K, n_max, A_0, E_A, n_0).shape
+    t_axis = (slice(None),) + (np.newaxis,) * len(shape)
+
+    n_last = np.broadcast_to(np.asarray(n_0, dtype=float), shape)
+    yield 0.0, n_last
+    for start in range(0, num, chunk_size):
+        indices = np.arange(start, min(start + chunk_size, num))
+        t_chunk = t_min * (final_time / t_min) ** (indices / max(num - 1, 1))
+        t_chunk[indices == num - 1] = final_time
+        n_chunk = trap_density_transient(
+            t=t_chunk[t_axis],
+            T=T,
+            phi=phi,
+            K=K,
+            n_max=n_max,
+            A_0=A_0,
+            E_A=E_A,
+            n_0=n_0,
+        )
+        n_chunk = np.broadcast_to(n_chunk, (len(indices),) + shape)
+        for index, t, n in zip(indices, t_chunk, n_chunk):
+            changed = np.any(np.abs(n - n_last) > rtol * np.abs(n_last))
+            if changed or rtol == 0 or index == num - 1:
+                n_last = n
+                yield float(t), n
+
+
+def trap_density_history(
+    t, t_starts, T_values, phi_values, K, n_max, A_0=A_0, E_A=E_A, n_0=0
+):
+    """
+    Trap density for a piecewise constant history of temperature and damage
+    rate, e.g. damaging followed by annealing. Phase i starts at t_starts[i]
+    with temperature T_values[i] and damage rate phi_values[i], the last phase
+    lasting indefinitely. The trap density is continuous between phases.
+
+    Args:
+        t (float, array_like): time (s)
+        t_starts (list): starting time of each phase (s), increasing, the
+            first one being the time at which n = n_0
+        T_values (list): temperature of each phase (K)
+        phi_values (list): damage rate of each phase (dpa s-1)
+        K (float, array_like): trap creation factor (m-3 dpa-1)
+        n_max (float, array_like): maximum trap density (m-3)
+        A_0 (float, array_like): trap annealing factor (s-1)
+        E_A (float, array_like): annealing activation energy (eV)
+        n_0 (float, array_like): initial trap density (m-3). Defaults to 0
+
+    Returns:
+        numpy.ndarray: the trap density (m-3), nan for t < t_starts[0]
+    """
+    if not len(t_starts) == len(T_values) == len(phi_values):
+        raise ValueError("t_starts, T_values and phi_values have different lengths")
+    if np.any(np.diff(t_starts) <= 0):
+        raise ValueError("t_starts must be strictly increasing")
+
+    t = np.asarray(t, dtype=float)
+    t_ends = list(t_starts[1:]) + [np.inf]
+
+    n = np.nan
+    n_start = n_0
+    for t_start, t_end, T, phi in zip(t_starts, t_ends, T_values, phi_values):
+        n_phase = trap_density_transient(
+            t=t - t_start,
+            T=T,
+            phi=phi,
+            K=K,
+            n_max=n_max,
+            A_0=A_0,
+            E_A=E_A,
+            n_0=n_start,
+        )
+        n = np.where((t >= t_start) & (t < t_end), n_phase, n)
+        if np.isfinite(t_end):
+            n_start = trap_density_transient(
+                t=t_end - t_start,
+                T=T,
+                phi=phi,
+                K=K,
+                n_max=n_max,
+                A_0=A_0,
+                E_A=E_A,
+                n_0=n_start,
+            )
+
+    return n
+
+
+def saturation_time(T, phi, K, n_max, threshold=0.99, A_0=A_0, E_A=E_A):
+    """
+    Time for a trap density starting from zero to reach a given fraction of
+    its saturation value, -ln(1 - threshold) / (phi*K/n_max + A). All
+    arguments broadcast against each other
+
+    Args:
+        T (float, array_like): temperature (K)
+        phi (float, array_like): damage rate (dpa s-1)
+        K (float, array_like): trap creation factor (m-3 dpa-1)
+        n_max (float, array_like): maximum trap density (m-3)
+        threshold (float, array_like): fraction of the saturation value.
+            Defaults to 0.99
+        A_0 (float, array_like): trap annealing factor (s-1)
+        E_A (float, array_like): annealing activation energy (eV)
+
+    Returns:
+        numpy.ndarray: the saturation time (s)
+    """
+    rate = relaxation_rate(T=T, phi=phi, K=K, n_max=n_max, A_0=A_0, E_A=E_A)
+    return -np.log1p(-np.asarray(threshold, dtype=float)) / rate
+
+
+def saturation_time_maps(
+    T_values, phi_values, traps, threshold=0.99, A_0=A_0, E_A=E_A, filename=None
+):
+    """
+    Saturation times of each trap over a (T, phi) grid. If filename is given,
+    the map of each trap is written with numpy.savetxt (one row per
+    temperature, one column per damage rate) to filename.format(trap name)
+
+    Args:
+        T_values (array_like): temperatures (K)
+        phi_values (array_like): damage rates (dpa s-1)
+        traps (numpy.ndarray): trap table with the fields name, K and n_max,
+            see trap_table.load_trap_table
+        threshold (float): fraction of the saturation value. Defaults to 0.99
+        A_0 (float): trap annealing factor (s-1)
+        E_A (float): annealing activation energy (eV)
+        filename (str, optional): output file, e.g.
+            "saturation_times_{}.txt". Defaults to None
+
+    Returns:
+        numpy.ndarray: the saturation times (s), shape (n_traps, n_T, n_phi)
+    """
+    saturation_times = saturation_time(
+        T=np.asarray(T_values, dtype=float)[np.newaxis, :, np.newaxis],
+        phi=np.asarray(phi_values, dtype=float)[np.newaxis, np.newaxis, :],
+        K=traps["K"][:, np.newaxis, np.newaxis],
+        n_max=traps["n_max"][:, np.newaxis, np.newaxis],
+        threshold=threshold,
+        A_0=A_0,
+        E_A=E_A,
+    )
+
+    if filename is not None:
+        for trap, saturation_times_trap in zip(traps, saturation_times):
+            np.savetxt(filename.format(trap["name"]), saturation_times_trap)
+
+    return saturation_times
@@ -0,0 +1,41 @@
+import numpy as np
+import os
+
+default_trap_table_file = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "damage_traps.csv"
+)
+
+trap_table_dtype = [
+    ("name", "U16"),
+    ("K", float),
+    ("n_max", float),
+    ("E_p", float),
+]
+
+
+def load_trap_table(filename=default_trap_table_file):
+    """
+    Reads the damage trap parameters from a csv file with a header line and
+    one row per trap
+
+    Args:
+        filename (str): path to the csv file, with columns name, K (m-3 dpa-1),
+            n_max (m-3) and E_p (eV). Defaults to damage_traps.csv
+
+    Returns:
+        numpy.ndarray: structured array with one entry per damage trap and the
+            fields name, K, n_max and E_p
+    """
+    table = np.genfromtxt(
+        filename,
+        delimiter=",",
+        skip_header=1,
+        dtype=trap_table_dtype,
+        encoding="utf-8",
+        autostrip=True,
+    )
+
+    return np.atleast_1d(table)
+
+
+damage_traps = load_trap_table()